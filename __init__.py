@@ -1,14 +1,17 @@
 import os
 import json
-import base64
-import shutil
+import asyncio
+import functools
+import mimetypes
 import server
+from email.utils import formatdate
 from aiohttp import web
-from .laoli_node import NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS
+from .laoli_node import NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS, start_warmup, warmup_status
+from .laoli_library import LIBRARY, POSE_DIR, PAGE_SIZE, IO_POOL
+from .laoli_search import SEARCH_INDEX
 
 # ================= 路径配置 =================
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-POSE_DIR = os.path.join(CURRENT_DIR, "pose")
 JS_DIR = os.path.join(CURRENT_DIR, "js")
 ASSETS_DIR = os.path.join(JS_DIR, "assets")
 
@@ -17,101 +20,115 @@ ASSETS_DIR = os.path.join(JS_DIR, "assets")
 os.makedirs(os.path.join(POSE_DIR, "Body", "Default"), exist_ok=True)
 os.makedirs(os.path.join(POSE_DIR, "Hands", "Default"), exist_ok=True)
 os.makedirs(ASSETS_DIR, exist_ok=True)
+# 部分 Python 版本的 mimetypes 不认识 .webp
+mimetypes.add_type("image/webp", ".webp")
 
 WEB_DIRECTORY = "./js"
 
+# 动作库变化 (本接口、节点自动保存或外部改动) 经 ComfyUI 的 websocket 推送给所有打开的编辑器
+def on_library_changed(lib_type, categories):
+    server.PromptServer.instance.send_sync("laoli.library_changed", {"libType": lib_type, "categories": categories})
+
+LIBRARY.listeners.append(on_library_changed)
+LIBRARY.start_watcher()
+
+# 可选：启动时后台预热模型 (设置环境变量 LAOLI_WARMUP=1)
+if os.environ.get("LAOLI_WARMUP", "0").lower() in ("1", "true", "yes"):
+    start_warmup()
+
 # ================= 接口 =================
+# 接口运行在 ComfyUI 的事件循环上：文件读写、JSON / base64 编解码、目录扫描与 SQLite 查询都交给
+# IO_POOL (有界线程池，LAOLI_IO_WORKERS)，动作库很大时 websocket 进度推送等也不会被卡住
+async def run_io(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(IO_POOL, functools.partial(fn, *args, **kwargs))
+
 @server.PromptServer.instance.routes.post("/laoli/save_pose")
 async def save_pose(request):
     try:
-        data = await request.json()
+        # 请求体里带着 base64 截图，解析也放到线程池
+        data = await run_io(json.loads, await request.read())
         # 获取库类型：'Body' 或 'Hands'，默认为 Body
         lib_type = data.get("libType", "Body") 
-        cat = data.get("category", "Default")
-        name = data.get("name", "NewPose")
-        
-        # 路径指向对应的子文件夹 (pose/Body/... 或 pose/Hands/...)
-        path = os.path.join(POSE_DIR, lib_type, cat)
-        if not os.path.exists(path): os.makedirs(path, exist_ok=True)
-        
-        with open(os.path.join(path, f"{name}.json"), "w", encoding="utf-8") as f:
-            json.dump(data.get("poseData"), f)
-            
-        img_data = data.get("image")
-        if img_data:
-            if "," in img_data: img_data = img_data.split(",")[1]
-            with open(os.path.join(path, f"{name}.png"), "wb") as f:
-                f.write(base64.b64decode(img_data))
-                
+        await run_io(LIBRARY.save_pose, lib_type, data.get("category", "Default"), data.get("name", "NewPose"), data.get("poseData"), data.get("image"))
         return web.json_response({"status": "success"})
     except Exception as e: return web.json_response({"status": "error", "message": str(e)})
 
+def list_library(query):
+    # 不带 category：分类列表与各自的数量；带 category：该分类按名称倒序的一页 (offset / limit)
+    # 每个动作只返回名称、缩略图 URL 与动作数据 URL；refresh=1 时先与磁盘重新对账
+    lib_type = query.get("libType", "Body")
+    LIBRARY.ensure_synced(lib_type, force=query.get("refresh") == "1")
+    if "category" not in query: return {"categories": LIBRARY.categories(lib_type)}
+    return LIBRARY.page(lib_type, query["category"], query.get("offset", 0), query.get("limit", PAGE_SIZE))
+
 @server.PromptServer.instance.routes.get("/laoli/get_library")
 async def get_library(request):
-    lib = {}
-    # 获取库类型参数，决定读取哪个文件夹
-    lib_type = request.rel_url.query.get("libType", "Body")
-    
-    target_dir = os.path.join(POSE_DIR, lib_type)
-    
-    if os.path.exists(target_dir):
-        for cat in os.listdir(target_dir):
-            p = os.path.join(target_dir, cat)
-            if os.path.isdir(p):
-                lib[cat] = []
-                for f in os.listdir(p):
-                    if f.endswith(".json"):
-                        img_path = os.path.join(p, f"{f[:-5]}.png")
-                        img_url = None
-                        if os.path.exists(img_path):
-                            with open(img_path, "rb") as ifile:
-                                img_url = "data:image/png;base64," + base64.b64encode(ifile.read()).decode('utf-8')
-                        try:
-                            with open(os.path.join(p, f), "r", encoding="utf-8") as jf:
-                                lib[cat].append({"name": f[:-5], "thumbnail": img_url, "data": json.load(jf)})
-                        except: pass
-    return web.json_response(lib)
+    try: return web.json_response(await run_io(list_library, request.rel_url.query))
+    except ValueError as e: return web.json_response({"status": "error", "message": str(e)}, status=400)
+
+async def cached_file(request, path):
+    # ETag (与 aiohttp 相同的 mtime_ns-size 格式) + Last-Modified，条件请求命中时回 304。
+    # 列表里的 URL 带 ?v=<mtime>，文件一变 URL 就变，所以带 v 的请求可以长期缓存。
+    # 文件内容由 FileResponse 发送 (aiohttp 自己在线程池里读)
+    try: st = await run_io(os.stat, path)
+    except OSError: raise web.HTTPNotFound()
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": "public, max-age=31536000, immutable" if "v" in request.rel_url.query else "no-cache",
+    }
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        not_modified = etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+    else:
+        not_modified = request.if_modified_since is not None and int(st.st_mtime) <= request.if_modified_since.timestamp()
+    if not_modified: return web.Response(status=304, headers=headers)
+    return web.FileResponse(path, headers=headers)
+
+def library_args(request):
+    info = request.match_info
+    return info["libType"], info["category"], info["name"]
+
+@server.PromptServer.instance.routes.get("/laoli/thumb/{libType}/{category}/{name}")
+async def get_thumbnail(request):
+    # ?w=<像素宽> 返回缩小的 WebP 版本，不带时返回原 PNG
+    try:
+        width = int(request.rel_url.query.get("w", 0))
+        path = await run_io(LIBRARY.thumbnail, *library_args(request), width)
+    except ValueError: raise web.HTTPBadRequest()
+    return await cached_file(request, path)
+
+@server.PromptServer.instance.routes.get("/laoli/pose/{libType}/{category}/{name}")
+async def get_pose(request):
+    try: path = LIBRARY.path(*library_args(request), ".json")
+    except ValueError: raise web.HTTPBadRequest()
+    return await cached_file(request, path)
 
 @server.PromptServer.instance.routes.post("/laoli/manage_library")
 async def manage_library(request):
     try:
         data = await request.json()
-        act = data.get("action")
-        # 获取库类型，确定操作根目录
-        lib_type = data.get("libType", "Body") 
-        root = os.path.join(POSE_DIR, lib_type)
-        
-        # 确保根目录存在
-        if not os.path.exists(root): os.makedirs(root, exist_ok=True)
-        
-        if act == "create_cat":
-            p = os.path.join(root, data.get("name"))
-            if not os.path.exists(p): os.makedirs(p)
-        elif act == "rename_cat":
-            os.rename(os.path.join(root, data.get("old")), os.path.join(root, data.get("new")))
-        elif act == "del_cat":
-            shutil.rmtree(os.path.join(root, data.get("category")))
-        elif act == "rename_pose":
-            d = os.path.join(root, data.get("category"))
-            base = os.path.join(d, data.get("old"))
-            new_base = os.path.join(d, data.get("new"))
-            if os.path.exists(base+".json"): os.rename(base+".json", new_base+".json")
-            if os.path.exists(base+".png"): os.rename(base+".png", new_base+".png")
-        elif act == "del_pose":
-            d = os.path.join(root, data.get("category"))
-            n = data.get("name")
-            if os.path.exists(os.path.join(d, f"{n}.json")): os.remove(os.path.join(d, f"{n}.json"))
-            if os.path.exists(os.path.join(d, f"{n}.png")): os.remove(os.path.join(d, f"{n}.png"))
-        elif act == "move_pose":
-            src = os.path.join(root, data.get("src_category"))
-            tgt = os.path.join(root, data.get("tgt_category"))
-            n = data.get("name")
-            os.makedirs(tgt, exist_ok=True)
-            if os.path.exists(os.path.join(src, f"{n}.json")): shutil.move(os.path.join(src, f"{n}.json"), os.path.join(tgt, f"{n}.json"))
-            if os.path.exists(os.path.join(src, f"{n}.png")): shutil.move(os.path.join(src, f"{n}.png"), os.path.join(tgt, f"{n}.png"))
+        # 获取库类型，确定操作根目录；文件操作与索引更新见 laoli_library
+        await run_io(LIBRARY.manage, data.get("action"), data.get("libType", "Body"), data)
         return web.json_response({"status": "success"})
     except Exception as e: return web.json_response({"status": "error", "message": str(e)})
 
+@server.PromptServer.instance.routes.post("/laoli/search_pose")
+async def search_pose(request):
+    # {libType, pose: 当前骨骼 {meta, body: {bone: {q}}}, mode: body / hands, mirror, side (手势库：用哪只手), k}
+    # 第一次检索时读入整个库建索引，之后只增量更新
+    try:
+        data = await request.json()
+        result = await run_io(SEARCH_INDEX.search, data.get("libType", "Body"), data.get("pose"), data.get("mode", "body"),
+                              bool(data.get("mirror")), data.get("side"), data.get("k", 12))
+        return web.json_response({"status": "success", **result})
+    except Exception as e: return web.json_response({"status": "error", "message": str(e)})
+
+@server.PromptServer.instance.routes.get("/laoli/status")
+async def get_status(request):
+    return web.json_response(warmup_status())
+
 @server.PromptServer.instance.routes.get("/laoli/get_models")
 async def get_models(request):
     if not os.path.exists(ASSETS_DIR): return web.json_response([])
@@ -28,12 +28,21 @@ app.registerExtension({
             if (!detail || !detail.output || !detail.output.ui) return;
             const instance = LAOLI_INSTANCES[detail.node];
             if (instance && detail.output.ui.ai_pose) {
-                instance.scene.applyPose(detail.output.ui.ai_pose);
+                const aiPose = detail.output.ui.ai_pose;
+                // 多人识别：按顺序驱动场景中已加载的多个角色，其余情况只驱动当前角色
+                if (aiPose.people && aiPose.people.length > 1 && instance.scene.characters.length > 1) {
+                    aiPose.people.forEach((person, i) => { if (instance.scene.characters[i]) instance.scene.applyPoseToCharacter(instance.scene.characters[i], person); });
+                } else {
+                    instance.scene.applyPose(aiPose);
+                }
                 instance.updateOutput();
                 showToast("✅ AI 姿势已同步", "#2e7d32");
-                if (instance.refreshLibrary) { setTimeout(() => { instance.refreshLibrary(); showToast("📂 动作库已更新", "#1565c0"); }, 200); }
             }
         });
+        // 动作库有变化 (任一编辑器的保存 / 整理、AI 自动保存或直接改动 pose 目录) 时由后端推送，只重新拉变动的分类
+        api.addEventListener("laoli.library_changed", (event) => {
+            Object.values(LAOLI_INSTANCES).forEach(instance => { if (instance.onLibraryChanged) instance.onLibraryChanged(event.detail); });
+        });
     },
     async beforeRegisterNodeDef(nodeType, nodeData, app) {
         if (nodeData.name === "Laoli_3DPoseEditor") {
@@ -65,7 +74,11 @@ app.registerExtension({
                 mainNodeContainer._placeholder = placeholder;
                 
                 let currentLibType = "Body"; 
-                let currentLibData = {}; 
+                let currentLibData = { categories: [], poses: {}, totals: {} }; 
+                let libObservers = [];
+                let searchResults = null;
+                const LIB_PAGE_SIZE = 60;
+                const poseDataCache = new Map();
                 let activeCategory = "Default"; 
                 
                 const historyStack = [];
@@ -451,31 +464,86 @@ app.registerExtension({
                 if(ui.manY) ui.manY.oninput = (e) => { if(scene.activeCharacter) scene.activeCharacter.group.position.y = parseFloat(e.target.value); };
                 if(ui.manZ) ui.manZ.oninput = (e) => { if(scene.activeCharacter) scene.activeCharacter.group.position.z = parseFloat(e.target.value); };
 
-                const refreshLib = () => {
-                    fetch(`/laoli/get_library?libType=${currentLibType}&t=${Date.now()}`).then(r=>r.json()).then(lib => { 
-                        currentLibData = lib; 
+                // 动作库按需加载：先取分类列表，每个分类的动作在滚动到可见时按页拉取，缩略图与动作数据走各自的 URL
+                // changedCats：只丢弃这些分类已加载的页，其余分类沿用已加载的内容
+                const refreshLib = (force, changedCats) => {
+                    const libType = currentLibType;
+                    fetch(`/laoli/get_library?libType=${libType}${force === true ? "&refresh=1" : ""}`, { cache: "no-store" }).then(r=>r.json()).then(res => { 
+                        if (libType !== currentLibType) return;
+                        const prev = currentLibData;
+                        currentLibData = { libType, categories: res.categories || [], poses: {}, totals: {} }; 
+                        if (Array.isArray(changedCats) && prev.libType === libType) {
+                            currentLibData.categories.forEach(c => { if (!changedCats.includes(c.name) && prev.poses[c.name]) { currentLibData.poses[c.name] = prev.poses[c.name]; currentLibData.totals[c.name] = prev.totals[c.name]; } });
+                        }
                         renderLibrary(); 
                     });
                 };
 
-                const switchLib = (type) => { currentLibType = type; ui.tabBody.classList.toggle("active", type === "Body"); ui.tabHands.classList.toggle("active", type === "Hands"); ui.saveTypeDisplay.innerText = type === "Body" ? "全身动作" : "手部特写"; refreshLib(); };
+                const onLibraryChanged = (detail) => {
+                    if (detail && detail.libType === currentLibType) refreshLib(false, detail.categories || []);
+                };
+
+                const loadLibPage = (cat) => {
+                    const data = currentLibData;
+                    const poses = data.poses[cat] = data.poses[cat] || [];
+                    return fetch(`/laoli/get_library?libType=${currentLibType}&category=${encodeURIComponent(cat)}&offset=${poses.length}&limit=${LIB_PAGE_SIZE}`, { cache: "no-store" }).then(r=>r.json()).then(page => {
+                        if (data !== currentLibData || !page.poses) return [];
+                        data.totals[cat] = page.total; poses.push(...page.poses);
+                        return page.poses;
+                    });
+                };
+
+                const loadPoseData = (p) => {
+                    if (!poseDataCache.has(p.dataUrl)) poseDataCache.set(p.dataUrl, fetch(p.dataUrl).then(r => { if (!r.ok) throw new Error(r.status); return r.json(); }).catch(err => { poseDataCache.delete(p.dataUrl); throw err; }));
+                    return poseDataCache.get(p.dataUrl);
+                };
+
+                const fillPoseGrid = (grid, cat) => {
+                    (currentLibData.poses[cat] || []).forEach(p => grid.appendChild(createPoseCard(cat, p)));
+                    const isDone = () => currentLibData.totals[cat] !== undefined && currentLibData.poses[cat].length >= currentLibData.totals[cat];
+                    if (isDone()) return;
+                    // 末尾的哨兵进入视野时加载下一页；加载完仍可见则继续，直到取完
+                    const sentinel = document.createElement("div"); sentinel.style.cssText = "grid-column:1/-1; height:1px;";
+                    grid.appendChild(sentinel);
+                    let loading = false;
+                    const observer = new IntersectionObserver(entries => {
+                        if (loading || !entries.some(e => e.isIntersecting)) return;
+                        loading = true;
+                        loadLibPage(cat).then(poses => {
+                            poses.forEach(p => grid.insertBefore(createPoseCard(cat, p), sentinel));
+                            loading = false;
+                            if (isDone() || !poses.length) { observer.disconnect(); sentinel.remove(); }
+                            else { observer.unobserve(sentinel); observer.observe(sentinel); }
+                        }).catch(() => { loading = false; });
+                    }, { rootMargin: "200px" });
+                    observer.observe(sentinel);
+                    libObservers.push(observer);
+                };
+
+                const switchLib = (type) => { currentLibType = type; searchResults = null; ui.tabBody.classList.toggle("active", type === "Body"); ui.tabHands.classList.toggle("active", type === "Hands"); ui.saveTypeDisplay.innerText = type === "Body" ? "全身动作" : "手部特写"; refreshLib(); };
                 ui.tabBody.onclick = () => switchLib("Body"); ui.tabHands.onclick = () => switchLib("Hands");
-                const manageLibrary = (action, payload) => { fetch("/laoli/manage_library", { method: "POST", body: JSON.stringify({ action, libType: currentLibType, ...payload }) }).then(r => r.json()).then(res => { if(res.status === "success") refreshLib(); }); };
+                // 成功后由 laoli.library_changed 事件刷新
+                const manageLibrary = (action, payload) => { fetch("/laoli/manage_library", { method: "POST", body: JSON.stringify({ action, libType: currentLibType, ...payload }) }).then(r => r.json()).then(res => { if(res.status !== "success") showToast(`❌ ${res.message || "操作失败"}`, "#d32f2f"); }); };
 
                 const createPoseCard = (cat, p) => {
                     const c = document.createElement("div"); c.className="pose-card"; c.draggable = true;
-                    c.innerHTML=`<img src="${p.thumbnail}" class="pose-img"><div class="pose-info">${p.name}</div><div class="tools"><span class="icon-btn" data-act="ren">✏️</span><span class="icon-btn" data-act="del">🗑️</span></div>`;
+                    // srcset 里是按宽度缩小的 WebP，浏览器按卡片宽度挑选；src 的原 PNG 作兜底
+                    const thumbSizes = mainNodeContainer.classList.contains("fullscreen-mode") ? "160px" : "300px";
+                    c.innerHTML=`<img src="${p.thumbnail || ""}"${p.srcset ? ` srcset="${p.srcset}" sizes="${thumbSizes}"` : ""} loading="lazy" class="pose-img"><div class="pose-info">${p.name}</div><div class="tools"><span class="icon-btn" data-act="ren">✏️</span><span class="icon-btn" data-act="del">🗑️</span></div>`;
                     c.onclick=(e)=> { 
                         if(!e.target.dataset.act) { 
-                            saveState(`Apply ${p.name}`);
-                            if (currentLibType === "Hands") {
-                                const sel = scene.currentBone; let targetSide = null;
-                                if (sel) { if (sel.name.includes("Left")) targetSide = "Left"; else if (sel.name.includes("Right")) targetSide = "Right"; }
-                                if (!targetSide) targetSide = p.data.meta && p.data.meta.side ? p.data.meta.side : "Right";
-                                scene.applyPose({ meta: { source: "Laoli_Native", version: "2.0", type: "Hands", targetSide: targetSide, side: p.data.meta.side || "Right" }, body: p.data.body, hands: {} });
-                                showToast(`✋ 已应用到 ${targetSide === 'Left' ? '左手' : '右手'}`, "#2e7d32");
-                            } else { scene.applyPose(p.data); }
-                            updateOutput(); 
+                            const libType = currentLibType;
+                            loadPoseData(p).then(data => {
+                                saveState(`Apply ${p.name}`);
+                                if (libType === "Hands") {
+                                    const sel = scene.currentBone; let targetSide = null;
+                                    if (sel) { if (sel.name.includes("Left")) targetSide = "Left"; else if (sel.name.includes("Right")) targetSide = "Right"; }
+                                    if (!targetSide) targetSide = data.meta && data.meta.side ? data.meta.side : "Right";
+                                    scene.applyPose({ meta: { source: "Laoli_Native", version: "2.0", type: "Hands", targetSide: targetSide, side: data.meta.side || "Right" }, body: data.body, hands: {} });
+                                    showToast(`✋ 已应用到 ${targetSide === 'Left' ? '左手' : '右手'}`, "#2e7d32");
+                                } else { scene.applyPose(data); }
+                                updateOutput(); 
+                            }).catch(() => showToast("❌ 动作数据加载失败", "#d32f2f"));
                         } 
                     };
                     c.ondragstart = (e) => e.dataTransfer.setData("text", JSON.stringify({ cat: cat, name: p.name }));
@@ -484,12 +552,47 @@ app.registerExtension({
                     return c;
                 };
 
+                // 相似姿势检索：当前骨骼发给后端，结果显示在动作库顶部 (全身库比较躯干，手势库比较选中那只手的手指)
+                const searchSimilar = (mirror) => {
+                    const activeChar = scene.activeCharacter; if (!activeChar) return;
+                    const libType = currentLibType;
+                    let side = null;
+                    if (libType === "Hands") {
+                        const sel = scene.currentBone;
+                        if (sel) { if (sel.name.includes("Left")) side = "Left"; else if (sel.name.includes("Right")) side = "Right"; }
+                        if (!side) return alert("⚠️ 请先点击选中一只手，以便系统知道要查找哪只手的手势！");
+                    }
+                    const body = {}; activeChar.bones.forEach(b => body[b.name] = { q: b.quaternion.toArray() });
+                    const query = { libType, pose: { meta: { source: "Laoli_Native", version: "2.0" }, body }, mode: libType === "Hands" ? "hands" : "body", mirror, side, k: 12 };
+                    fetch("/laoli/search_pose", { method: "POST", body: JSON.stringify(query) }).then(r => r.json()).then(res => {
+                        if (res.status !== "success") return showToast(`❌ ${res.message || "检索失败"}`, "#d32f2f");
+                        if (libType !== currentLibType) return;
+                        searchResults = { mirror, results: res.results };
+                        renderLibrary();
+                        showToast(`🔍 找到 ${res.results.length} 个${mirror ? "镜像" : ""}相似动作 (${res.ms} ms)`, "#1565c0");
+                    });
+                };
+                if(ui.searchPoseBtn) ui.searchPoseBtn.onclick = () => searchSimilar(false);
+                if(ui.searchMirrorBtn) ui.searchMirrorBtn.onclick = () => searchSimilar(true);
+
+                const renderSearchResults = (container) => {
+                    const section = document.createElement("div"); section.className = "pose-category";
+                    const header = document.createElement("div"); header.className = "cat-header";
+                    header.innerHTML = `<span class="cat-title">🔍 ${searchResults.mirror ? "镜像" : ""}相似动作</span><span class="icon-btn" data-act="close">✖</span>`;
+                    header.querySelector('[data-act="close"]').onclick = () => { searchResults = null; renderLibrary(); };
+                    const grid = document.createElement("div"); grid.className = "pose-grid expanded";
+                    searchResults.results.forEach(p => grid.appendChild(createPoseCard(p.category, p)));
+                    section.appendChild(header); section.appendChild(grid); container.appendChild(section);
+                };
+
                 const renderLibrary = () => {
-                    const lib = currentLibData;
+                    libObservers.forEach(o => o.disconnect()); libObservers = [];
                     const container = ui.poseLib;
+                    const scrollTop = container.scrollTop;
                     container.innerHTML = "";
+                    if (searchResults) renderSearchResults(container);
                     ui.saveCatSelect.innerHTML = "";
-                    const cats = Object.keys(lib).sort();
+                    const cats = currentLibData.categories.map(c => c.name).sort();
                     cats.forEach(c => { const opt=document.createElement("option"); opt.value=c; opt.text=c; ui.saveCatSelect.appendChild(opt); });
                     
                     const isFullscreen = mainNodeContainer.classList.contains("fullscreen-mode");
@@ -517,14 +620,12 @@ app.registerExtension({
                             sidebar.appendChild(btn);
                         });
                         
-                        if (activeCategory && lib[activeCategory]) {
-                            const grid = document.createElement("div"); grid.className = "pose-grid"; 
-                            const sortedPoses = [...lib[activeCategory]].sort((a, b) => b.name.localeCompare(a.name));
-                            sortedPoses.forEach(p => grid.appendChild(createPoseCard(activeCategory, p)));
-                            content.appendChild(grid);
-                        }
+                        const grid = activeCategory && cats.includes(activeCategory) ? document.createElement("div") : null;
+                        if (grid) { grid.className = "pose-grid"; content.appendChild(grid); }
                         
                         wrapper.appendChild(sidebar); wrapper.appendChild(content); container.appendChild(wrapper);
+                        // 先挂到页面上再填充，哨兵才能被观察到
+                        if (grid) fillPoseGrid(grid, activeCategory);
                     } else {
                         cats.forEach(cat => {
                             const catDiv = document.createElement("div"); catDiv.className = "pose-category";
@@ -534,10 +635,7 @@ app.registerExtension({
                             const grid = document.createElement("div"); 
                             grid.className = "pose-grid expanded"; 
                             
-                            if (lib[cat]) {
-                                const sortedPoses = [...lib[cat]].sort((a, b) => b.name.localeCompare(a.name));
-                                sortedPoses.forEach(p => grid.appendChild(createPoseCard(cat, p)));
-                            }
+                            fillPoseGrid(grid, cat);
 
                             header.onclick = (e) => { 
                                 if(!e.target.dataset.act) {
@@ -553,9 +651,10 @@ app.registerExtension({
                             container.appendChild(catDiv);
                         });
                     }
+                    container.scrollTop = scrollTop;
                 };
                 
-                if(ui.refreshLibBtn) ui.refreshLibBtn.onclick = refreshLib;
+                if(ui.refreshLibBtn) ui.refreshLibBtn.onclick = () => refreshLib(true);
                 refreshLib(); 
                 
                 if(ui.createCatBtn) ui.createCatBtn.onclick = () => { const n = prompt("New Category:"); if(n) manageLibrary('create_cat', { name:n }); };
@@ -577,12 +676,12 @@ app.registerExtension({
                         activeChar.bones.forEach(b => { const n = b.name; if ((n.includes("Hand") || n.includes("Finger") || n.includes("Thumb") || n.includes("Index") || n.includes("Middle") || n.includes("Ring") || n.includes("Pinky")) && n.includes(saveSide)) { poseData.body[n] = { q: b.quaternion.toArray() }; } });
                         const snap = scene.getSnapshot(512, 512, null, saveSide);
                         const finalJson = { meta: { source: "Laoli_Native", version: "2.0", type: "Hands", side: saveSide }, body: poseData.body, hands: {} };
-                        fetch("/laoli/save_pose", { method:"POST", body:JSON.stringify({ libType: "Hands", category:cat, name, poseData:finalJson, image:snap.rgb }) }).then(()=>{ ui.saveModal.style.display="none"; refreshLib(); });
+                        fetch("/laoli/save_pose", { method:"POST", body:JSON.stringify({ libType: "Hands", category:cat, name, poseData:finalJson, image:snap.rgb }) }).then(()=>{ ui.saveModal.style.display="none"; });
                     } else {
                         activeChar.bones.forEach(b => poseData.body[b.name] = { q: b.quaternion.toArray() });
                         const snap = scene.getSnapshot(768, 1024);
                         const finalJson = { meta: { source: "Laoli_Native", version: "2.0", type: "Body" }, body: poseData.body, hands: {} };
-                        fetch("/laoli/save_pose", { method:"POST", body:JSON.stringify({ libType: "Body", category:cat, name, poseData:finalJson, image:snap.rgb }) }).then(()=>{ ui.saveModal.style.display="none"; refreshLib(); });
+                        fetch("/laoli/save_pose", { method:"POST", body:JSON.stringify({ libType: "Body", category:cat, name, poseData:finalJson, image:snap.rgb }) }).then(()=>{ ui.saveModal.style.display="none"; });
                     }
                 };
 
@@ -607,7 +706,7 @@ app.registerExtension({
                         ui.btns.full.innerText = "❌"; ui.btns.full.style.background = "#d32f2f"; 
                         if(ui.rightPanel) ui.rightPanel.style.width = "600px";
                     } 
-                    refreshLib(); 
+                    renderLibrary(); 
                     const r = mainNodeContainer.getBoundingClientRect(); 
                     if(scene.renderer && scene.camera) { scene.renderer.setSize(r.width, r.height); scene.camera.aspect = r.width/r.height; scene.camera.updateProjectionMatrix(); } 
                 };
@@ -615,7 +714,8 @@ app.registerExtension({
                 LAOLI_INSTANCES[node.id] = { 
                     scene, 
                     updateOutput,
-                    refreshLibrary: refreshLib
+                    refreshLibrary: refreshLib,
+                    onLibraryChanged
                 };
             };
         }
@@ -11,6 +11,7 @@ export class LaoliScene {
         this.characters = [];
         this.activeCharacter = null;
         this.currentBone = null;
+        this.animation = null; // 正在播放的动画 (视频模式)
 
         this.scene = new THREE.Scene(); 
         this.scene.background = new THREE.Color(0x222222);
@@ -97,6 +98,7 @@ export class LaoliScene {
 
     animate() { 
         requestAnimationFrame(this.animate); 
+        this.updateAnimation();
         this.orbit.update(); 
         this.renderer.render(this.scene, this.camera); 
     }
@@ -225,8 +227,48 @@ export class LaoliScene {
     }
 
     applyPose(data) { 
+        // 先停掉正在播放的动画，否则下一帧 updateAnimation 会把新姿势覆盖掉
+        this.stopAnimation();
+        // 视频模式输出的动画 JSON：按 fps 逐帧播放
+        if (data && data.meta && data.meta.type === "Animation") { this.playAnimation(data); return; }
         retargetPose(this.activeCharacter, data); 
     }
+
+    playAnimation(anim, loop = true) {
+        this.stopAnimation();
+        if (!anim.frames || !anim.frames.length) return;
+        this.animation = { data: anim, start: performance.now(), lastFrame: -1, loop: loop };
+    }
+
+    stopAnimation() { 
+        this.animation = null; 
+    }
+
+    updateAnimation() {
+        const a = this.animation;
+        if (!a) return;
+        const frames = a.data.frames;
+        let idx = Math.floor((performance.now() - a.start) / 1000 * (a.data.meta.fps || 24));
+        if (idx >= frames.length) {
+            if (a.loop) idx %= frames.length;
+            else { idx = frames.length - 1; this.animation = null; }
+        }
+        if (idx === a.lastFrame) return;
+        a.lastFrame = idx;
+        const frame = frames[idx];
+        // 多人轨迹按顺序驱动场景中的多个角色
+        if (frame.people && frame.people.length > 1 && this.characters.length > 1) {
+            frame.people.forEach((person, i) => { if (this.characters[i]) retargetPose(this.characters[i], person); });
+        } else {
+            retargetPose(this.activeCharacter, frame);
+        }
+    }
+
+    applyPoseToCharacter(c, data) { 
+        // 动画会驱动所有角色 (多人轨迹)，给任一角色套静态姿势前都要停掉
+        this.stopAnimation();
+        retargetPose(c, data); 
+    }
     
     setTransformMode(mode) { 
         if(this.transform) this.transform.setMode(mode); 
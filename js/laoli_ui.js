@@ -226,6 +226,8 @@ export function buildUI(container) {
                 <div style="padding:10px; background:#252525; display:flex; justify-content:space-between; border-bottom:1px solid #444; align-items:center;">
                     <span style="color:#ddd; font-weight:bold; font-size:13px;">📁 动作库</span>
                     <div style="display:flex;gap:6px">
+                        <button id="searchPoseBtn" class="laoli-btn" title="查找与当前姿势相似的动作">🔍</button>
+                        <button id="searchMirrorBtn" class="laoli-btn" title="查找与当前姿势镜像相似的动作">🪞</button>
                         <button id="refreshLibBtn" class="laoli-btn" title="刷新列表">🔄</button>
                         <button id="createCatBtn" class="laoli-btn" title="新建文件夹">➕ 文件夹</button>
                     </div>
@@ -322,7 +324,7 @@ export function buildUI(container) {
         rightPanel: container.querySelector("#rightPanel"),
 
         modelSelect: container.querySelector("#modelSelect"), addBtn: container.querySelector("#addCharBtn"), delBtn: container.querySelector("#delCharBtn"), snapBtn: container.querySelector("#snapBtn"),
-        refreshLibBtn: container.querySelector("#refreshLibBtn"), createCatBtn: container.querySelector("#createCatBtn"), 
+        refreshLibBtn: container.querySelector("#refreshLibBtn"), searchPoseBtn: container.querySelector("#searchPoseBtn"), searchMirrorBtn: container.querySelector("#searchMirrorBtn"), createCatBtn: container.querySelector("#createCatBtn"), 
         importPoseBtn: container.querySelector("#importPoseBtn"), fileInput: container.querySelector("#poseFileInput"),
         saveBtnShow: container.querySelector("#saveBtnShow"), saveModal: container.querySelector("#saveModal"),
         saveCatSelect: container.querySelector("#saveCatSelect"), saveCatInput: container.querySelector("#saveCatInput"), toggleCatInput: container.querySelector("#toggleCatInput"),
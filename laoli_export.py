@@ -0,0 +1,231 @@
+import os
+import json
+import inspect
+import hashlib
+import itertools
+import threading
+from contextlib import nullcontext
+import torch
+from torch import nn
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+# ================= 推理专用模型 =================
+# HMR2 / HAMER 是 LightningModule：初始化时会建判别器、损失、渲染器并保存超参数，推理都用不到。
+# 这里只保留 backbone + head + SMPL/MANO 层。checkpoint 首次使用时转换成只含这些权重的 safetensors
+# (models/cache 下按哈希命名)，之后 mmap 打开、逐个张量直接读到目标 device；主干与回归头建在 meta 设备上，
+# 不分配内存也不做随机初始化。可选 torch.compile 或 TorchScript。
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "cache")
+COMPILE_MODES = ["none", "torch.compile", "torchscript"]
+_HASH_LOCK = threading.Lock()
+# meta 设备构建 + load_state_dict(assign=True) 需要 torch >= 2.1，旧版本照常构建后拷贝权重
+LAZY_INIT = hasattr(torch.device, "__enter__") and "assign" in inspect.signature(nn.Module.load_state_dict).parameters
+
+def file_hash(path):
+    # checkpoint 的 sha256；按 (路径, 大小, 修改时间) 记在 hashes.json 里，大文件只完整读一次
+    stat = os.stat(path)
+    memo_key = f"{os.path.abspath(path)}|{stat.st_size}|{int(stat.st_mtime)}"
+    memo_path = os.path.join(CACHE_DIR, "hashes.json")
+    with _HASH_LOCK:
+        memo = {}
+        if os.path.exists(memo_path):
+            try:
+                with open(memo_path, "r", encoding="utf-8") as f: memo = json.load(f)
+            except Exception: memo = {}
+        if memo_key in memo: return memo[memo_key]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 24), b""): h.update(chunk)
+        memo[memo_key] = h.hexdigest()
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(memo_path, "w", encoding="utf-8") as f: json.dump(memo, f, indent=2)
+        return memo[memo_key]
+
+class HMR2Inference(nn.Module):
+    # 属性名与 HMR2 一致，直接复用 HMR2.forward_step，输出与原模型逐项相同
+    KIND = "hmr2"
+    PREFIXES = ("backbone.", "smpl_head.", "smpl.")
+
+    def __init__(self, cfg, backbone=None, head=None, body_model=None, lazy=False):
+        super().__init__()
+        from hmr2.models import SMPL
+        from hmr2.models.hmr2 import HMR2
+        from hmr2.models.backbones import create_backbone
+        from hmr2.models.heads import build_smpl_head
+        self.cfg = cfg
+        # lazy: 主干与回归头建在 meta 设备上，之后由 load_state_dict(assign=True) 换成磁盘上的权重
+        with torch.device("meta") if lazy else nullcontext():
+            self.backbone = backbone if backbone is not None else create_backbone(cfg)
+            self.smpl_head = head if head is not None else build_smpl_head(cfg)
+        self.smpl = body_model if body_model is not None else SMPL(**{k.lower(): v for k, v in dict(cfg.SMPL).items()})
+        self._forward_step = HMR2.forward_step
+
+    @classmethod
+    def from_lightning(cls, model):
+        return cls(model.cfg, model.backbone, model.smpl_head, model.smpl)
+
+    def forward(self, batch):
+        return self._forward_step(self, batch, train=False)
+
+class HAMERInference(nn.Module):
+    KIND = "hamer"
+    PREFIXES = ("backbone.", "mano_head.", "mano.")
+
+    def __init__(self, cfg, backbone=None, head=None, body_model=None, lazy=False):
+        super().__init__()
+        from hamer.models import MANO
+        from hamer.models.hamer import HAMER
+        from hamer.models.backbones import create_backbone
+        from hamer.models.heads import build_mano_head
+        self.cfg = cfg
+        with torch.device("meta") if lazy else nullcontext():
+            self.backbone = backbone if backbone is not None else create_backbone(cfg)
+            self.mano_head = head if head is not None else build_mano_head(cfg)
+        self.mano = body_model if body_model is not None else MANO(**{k.lower(): v for k, v in dict(cfg.MANO).items()})
+        self._forward_step = HAMER.forward_step
+
+    @classmethod
+    def from_lightning(cls, model):
+        return cls(model.cfg, model.backbone, model.mano_head, model.mano)
+
+    def forward(self, batch):
+        return self._forward_step(self, batch, train=False)
+
+def _load_checkpoint(path):
+    # Lightning checkpoint 里有超参数对象，需要 weights_only=False (本地模型文件)；新格式可 mmap，不整体读进内存
+    try:
+        return torch.load(path, map_location="cpu", mmap=True, weights_only=False)
+    except Exception:
+        return torch.load(path, map_location="cpu", weights_only=False)
+
+def convert_checkpoint(cls, checkpoint_path, cfg, lightning_loader, cache_path):
+    # 一次性转换：只取 backbone / head 权重与 SMPL/MANO buffer，优化器状态、判别器等全部丢弃。
+    # 优先直接读 checkpoint 的 state_dict (不经 Lightning 初始化)；键名对不上时退回 Lightning 加载。
+    # 旧版缓存 (<kind>-<hash>.pt) 直接迁移。
+    model = cls(cfg, lazy=LAZY_INIT)
+    reference = model.state_dict()
+    body_prefix = cls.PREFIXES[-1]
+    legacy_path = cache_path.replace(".safetensors", ".pt")
+    source = legacy_path if os.path.exists(legacy_path) else checkpoint_path
+    ckpt = _load_checkpoint(source)
+    state = ckpt.get("state_dict", ckpt)
+    weights = {k: state[k] for k in reference if k in state}
+    missing = [k for k in reference if k not in weights and not k.startswith(body_prefix)]
+    del ckpt, state
+    if missing:
+        print(f"[Laoli3D] checkpoint 键名不匹配 ({missing[0]} 等 {len(missing)} 项)，改用 Lightning 加载导出")
+        weights = {k: v for k, v in cls.from_lightning(lightning_loader()).state_dict().items() if k.startswith(cls.PREFIXES)}
+    # checkpoint 里没有的 SMPL/MANO buffer 取自刚由模型文件构建的层
+    for k, v in reference.items():
+        if k not in weights and k.startswith(body_prefix): weights[k] = v
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    save_file({k: v.detach().cpu().contiguous() for k, v in weights.items()}, cache_path + ".tmp")
+    os.replace(cache_path + ".tmp", cache_path)
+    del weights  # 释放对 mmap 的引用后才能删除旧缓存 (Windows)
+    if source == legacy_path:
+        try: os.remove(legacy_path)
+        except OSError: pass
+    print(f"[Laoli3D] 已转换推理权重: {os.path.basename(cache_path)}")
+
+def load_inference_model(cls, checkpoint_path, cfg, lightning_loader, device="cpu"):
+    digest = file_hash(checkpoint_path)[:16]
+    cache_path = os.path.join(CACHE_DIR, f"{cls.KIND}-{digest}.safetensors")
+    for attempt in range(2):
+        if not os.path.exists(cache_path): convert_checkpoint(cls, checkpoint_path, cfg, lightning_loader, cache_path)
+        try:
+            model = cls(cfg, lazy=LAZY_INIT)
+            # mmap 打开，逐个张量直接读到目标 device (GPU 时内存里不会同时存在整份权重)
+            with safe_open(cache_path, framework="pt", device=str(device)) as f:
+                state = {k: f.get_tensor(k) for k in f.keys()}
+            if LAZY_INIT:
+                model.load_state_dict(state, assign=True)
+                if any(t.is_meta for t in itertools.chain(model.parameters(), model.buffers())): raise RuntimeError("部分张量不在权重文件中")
+            else:
+                model.load_state_dict(state)
+            model.cache_digest = digest
+            return model
+        except Exception as e:
+            if attempt: raise
+            print(f"[Laoli3D] 推理权重缓存无效，重新转换: {e}")
+            os.remove(cache_path)
+
+# ================= 编译 =================
+# forward_step 返回嵌套字典；TorchScript 只能输出同类型容器，所以按固定顺序展平成元组再还原
+OUTPUT_KEYS = ["pred_cam", "pred_cam_t", "focal_length", "pred_keypoints_3d", "pred_vertices", "pred_keypoints_2d"]
+PARAM_KEYS = { "hmr2": ("pred_smpl_params", ["global_orient", "body_pose", "betas"]), "hamer": ("pred_mano_params", ["global_orient", "hand_pose", "betas"]) }
+
+class _FlatOutput(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.params_key, self.param_names = PARAM_KEYS[model.KIND]
+
+    def forward(self, img):
+        out = self.model({'img': img})
+        return tuple(out[k] for k in OUTPUT_KEYS) + tuple(out[self.params_key][k] for k in self.param_names)
+
+class TracedModel(nn.Module):
+    # TorchScript 版本：按输入尺寸 trace 一次，结果以 checkpoint 哈希 + device + 尺寸为名缓存到磁盘。
+    # trace 后换一个 batch 大小与 eager 结果对比，确认 batch 维没有被固化才写盘；否则退回按 batch
+    # 大小分别 trace (只留在内存里，避免每个 batch 大小都存一份完整权重)。trace 固定为 fp32。
+    def __init__(self, model, device):
+        super().__init__()
+        self.model = model
+        self.device_type = torch.device(device).type
+        self.dynamic_batch = True
+        self.traced = {}
+
+    def __getattr__(self, name):
+        # backbone / cfg 等属性转给原模型，节点里的 channels_last 等设置照常生效
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            return getattr(super().__getattr__("model"), name)
+
+    def _get_traced(self, img):
+        key = tuple(img.shape[1:]) if self.dynamic_batch else tuple(img.shape)
+        if key in self.traced: return self.traced[key]
+        path = os.path.join(CACHE_DIR, f"{self.model.KIND}-{self.model.cache_digest}-{self.device_type}-{'x'.join(map(str, img.shape[1:]))}.ts")
+        if self.dynamic_batch and os.path.exists(path):
+            self.traced[key] = torch.jit.load(path, map_location=img.device)
+            return self.traced[key]
+        flat = _FlatOutput(self.model).eval()
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(flat, (img,), check_trace=False))
+            if self.dynamic_batch:
+                probe = torch.cat([img, img[:1]])
+                try:
+                    ok = all(torch.allclose(a, b, rtol=1e-3, atol=1e-4) for a, b in zip(traced(probe), flat(probe)))
+                except Exception:
+                    ok = False
+                if ok:
+                    torch.jit.save(traced, path)
+                    print(f"[Laoli3D] 已缓存 TorchScript: {os.path.basename(path)}")
+                else:
+                    print("[Laoli3D] TorchScript 固化了 batch 大小，改为按 batch 分别 trace (不写盘)")
+                    self.dynamic_batch = False
+                    key = tuple(img.shape)
+        self.traced[key] = traced
+        return traced
+
+    def forward(self, batch):
+        img = batch['img'].contiguous()
+        values = self._get_traced(img)(img)
+        params_key, param_names = PARAM_KEYS[self.model.KIND]
+        out = dict(zip(OUTPUT_KEYS, values))
+        out[params_key] = dict(zip(param_names, values[len(OUTPUT_KEYS):]))
+        return out
+
+def compile_model(model, device, mode="none"):
+    # torch.compile 的产物由 inductor 自己缓存，缓存目录放在 models/cache/inductor 下
+    if mode == "torch.compile":
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(CACHE_DIR, "inductor"))
+        return torch.compile(model, dynamic=True)
+    if mode == "torchscript":
+        # trace 结果按 checkpoint 哈希缓存；推理模型加载失败、退回原始 LightningModule 时没有哈希，直接用 eager 模型
+        if getattr(model, "cache_digest", None) is None or getattr(model, "KIND", None) not in PARAM_KEYS:
+            print("[Laoli3D] 原始模型不支持 TorchScript 缓存，使用 eager 模式")
+            return model
+        return TracedModel(model, device)
+    return model
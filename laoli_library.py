@@ -0,0 +1,456 @@
+import os
+import json
+import time
+import base64
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from PIL import Image, features
+
+# ================= 动作库索引 =================
+# 动作库是 pose/<Body|Hands>/<分类>/<名称>.json + 同名 .png 缩略图。以前 get_library 每次遍历整棵目录，
+# 读出全部 JSON 并把 PNG 以 base64 内联，几千个动作时响应有几十 MB。现在目录结构记录在 pose/library.sqlite：
+# save_pose / manage_library 增量更新索引，列表接口按分类分页，只返回名称和 URL，缩略图与动作数据由浏览器按需加载。
+# 每个库第一次被访问 (或手动刷新) 时按文件 mtime 与磁盘对账，外部拷进来或删掉的文件也能同步。
+# 缩略图另存按宽度缩小的 WebP 版本 (pose/.thumbs/ 下，结构同动作库)，列表网格只下载几 KB；
+# 保存时生成，旧文件在第一次被请求时补生成，PNG 比它新时重新生成。
+# 查询结果缓存在内存里；索引有变化 (接口操作、节点自动保存、监视线程发现的外部改动) 时清掉对应库的缓存，
+# 并通知 listeners (__init__.py 经 ComfyUI 的 websocket 推送 laoli.library_changed，打开的编辑器只重新拉变动的分类)。
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+POSE_DIR = os.path.join(CURRENT_DIR, "pose")
+INDEX_PATH = os.path.join(POSE_DIR, "library.sqlite")
+LIB_TYPES = ("Body", "Hands")
+PAGE_SIZE = 60
+MAX_PAGE_SIZE = 500
+THUMB_WIDTHS = (160, 320)
+# 动作库文件读写用的线程数：aiohttp 接口把同步 I/O 交给 IO_POOL，不占用 ComfyUI 的事件循环
+IO_WORKERS = int(os.environ.get("LAOLI_IO_WORKERS", "4") or 4)
+IO_POOL = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="laoli-io")
+# 监视 pose/Body、pose/Hands：装了 watchdog 时用系统文件事件 (inotify 等)，否则每隔 LAOLI_LIBRARY_POLL 秒对账一次 (0 = 不监视)
+POLL_INTERVAL = float(os.environ.get("LAOLI_LIBRARY_POLL", "2") or 0)
+EVENT_DELAY = 0.5
+MAX_CACHED = 256
+# manage_library 各操作里表示分类名的字段
+MANAGE_CATEGORY_KEYS = {
+    "create_cat": ("name",), "rename_cat": ("old", "new"), "del_cat": ("category",),
+    "rename_pose": ("category",), "del_pose": ("category",), "move_pose": ("src_category", "tgt_category"),
+}
+HAS_WEBP = features.check("webp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (lib_type TEXT NOT NULL, name TEXT NOT NULL, PRIMARY KEY (lib_type, name));
+CREATE TABLE IF NOT EXISTS poses (
+    lib_type TEXT NOT NULL, category TEXT NOT NULL, name TEXT NOT NULL,
+    mtime REAL NOT NULL, thumb_mtime REAL,
+    PRIMARY KEY (lib_type, category, name)
+);
+"""
+
+def check_name(name):
+    # 分类名 / 动作名直接拼进路径，不允许跳出动作库目录
+    if not isinstance(name, str) or not name or name in (".", "..") or any(c in name for c in "/\\\0"):
+        raise ValueError(f"非法名称: {name!r}")
+    return name
+
+def check_lib_type(lib_type):
+    if lib_type not in LIB_TYPES: raise ValueError(f"未知的动作库: {lib_type!r}")
+    return lib_type
+
+def _mtime(path):
+    try: return os.stat(path).st_mtime
+    except OSError: return None
+
+def _version(mtime):
+    # URL 里带上 mtime，文件改动后浏览器自然拿到新地址
+    return str(int(mtime * 1000))
+
+class PoseLibrary:
+    def __init__(self, root=POSE_DIR, index_path=INDEX_PATH):
+        self.root = root
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._db = None
+        self._synced = set()
+        self._cache = {}
+        self._dirty = set()
+        # 本进程的写入：对账的目录扫描不持锁，扫描期间写入的条目以索引为准 (见 sync)
+        self._generation = 0
+        self._touched = {}      # (lib_type, 分类, 名称) -> 最后写入的代数；名称为 None 表示整个分类
+        self._writing = {}      # 正在写盘 (文件已改、索引还没更新) 的同样的 key -> 计数
+        self._wake = threading.Event()
+        self._watcher = None
+        self.listeners = []
+
+    def _conn(self):
+        # 第一次用到时才打开；连接在线程间共享，所有访问都在 _lock 内
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            db = sqlite3.connect(self.index_path, check_same_thread=False)
+            try:
+                db.executescript(SCHEMA)
+            except sqlite3.DatabaseError:
+                # 索引损坏：删掉重建，内容由磁盘对账恢复
+                db.close(); os.remove(self.index_path)
+                db = sqlite3.connect(self.index_path, check_same_thread=False)
+                db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def path(self, lib_type, category=None, name=None, ext=None):
+        parts = [self.root, check_lib_type(lib_type)]
+        if category is not None: parts.append(check_name(category))
+        if name is not None: parts.append(check_name(name) + ext)
+        return os.path.join(*parts)
+
+    # ---------- 对账 ----------
+    @staticmethod
+    def scan_category(path):
+        with os.scandir(path) as entries:
+            files = {e.name: e.stat().st_mtime for e in entries if e.is_file()}
+        return {f[:-5]: (mtime, files.get(f[:-5] + ".png")) for f, mtime in files.items() if f.endswith(".json")}
+
+    def scan(self, lib_type):
+        # 只 stat 不读文件：{分类: {名称: (json mtime, png mtime)}}；各分类目录并行扫描 (网络盘 / 机械盘上 stat 较慢)
+        root = self.path(lib_type)
+        if not os.path.isdir(root): return {}
+        with os.scandir(root) as entries:
+            cats = [e for e in entries if e.is_dir()]
+        # 独立的临时线程池：scan 本身可能就跑在 IO_POOL 里，等待同一个池的任务会互相卡住
+        with ThreadPoolExecutor(max_workers=IO_WORKERS) as pool:
+            return dict(zip((c.name for c in cats), pool.map(self.scan_category, (c.path for c in cats))))
+
+    def sync(self, lib_type):
+        # 只写有差异的行；有变化时按受影响的分类发出通知 (本进程第一次对账前还没有人拿到过列表，不通知)
+        with self._lock: start = self._generation
+        tree = self.scan(lib_type)
+        with self._lock:
+            known = lib_type in self._synced
+            # 扫描开始后本进程写过或正在写的条目，扫描结果可能比索引旧：保留索引，也不算作外部改动
+            skip = {(c, n) for (t, c, n), g in self._touched.items() if t == lib_type and g > start}
+            skip |= {(c, n) for t, c, n in self._writing if t == lib_type}
+            skip_cats = {c for c, _ in skip}
+            fresh = lambda c, n: (c, n) not in skip and (c, None) not in skip
+            db = self._conn()
+            with db:
+                cats = {c for c, in db.execute("SELECT name FROM categories WHERE lib_type = ?", (lib_type,))}
+                indexed = {(c, n): (m, t) for c, n, m, t in db.execute("SELECT category, name, mtime, thumb_mtime FROM poses WHERE lib_type = ?", (lib_type,))}
+                on_disk = {(c, n): v for c, poses in tree.items() for n, v in poses.items()}
+                removed = {k for k in indexed.keys() - on_disk.keys() if fresh(*k)}
+                updated = [(c, n) for (c, n), v in on_disk.items() if indexed.get((c, n)) != v and fresh(c, n)]
+                gone_cats, new_cats = cats - tree.keys() - skip_cats, tree.keys() - cats - skip_cats
+                db.executemany("DELETE FROM categories WHERE lib_type = ? AND name = ?", [(lib_type, c) for c in gone_cats])
+                db.executemany("INSERT INTO categories VALUES (?, ?)", [(lib_type, c) for c in new_cats])
+                db.executemany("DELETE FROM poses WHERE lib_type = ? AND category = ? AND name = ?", [(lib_type, c, n) for c, n in removed])
+                db.executemany("INSERT OR REPLACE INTO poses VALUES (?, ?, ?, ?, ?)", [(lib_type, c, n, *on_disk[(c, n)]) for c, n in updated])
+            self._synced.add(lib_type)
+            # 之后开始的对账都在这些写入之后扫描，用不到了 (对账由 ensure_synced 串行执行)
+            self._touched = {k: g for k, g in self._touched.items() if g > start}
+        changed = gone_cats | new_cats | {c for c, _ in removed} | {c for c, _ in updated}
+        if changed and known: self.notify(lib_type, changed)
+        elif changed: self.invalidate(lib_type)
+        return changed
+
+    def ensure_synced(self, lib_type, force=False):
+        check_lib_type(lib_type)
+        # 并发的首次请求只对账一次
+        with self._sync_lock:
+            if force or lib_type not in self._synced: self.sync(lib_type)
+
+    # ---------- 变化通知 / 内存缓存 ----------
+    def invalidate(self, lib_type):
+        with self._lock:
+            self._cache = {k: v for k, v in self._cache.items() if k[0] != lib_type}
+
+    def notify(self, lib_type, categories):
+        self.invalidate(lib_type)
+        for listener in list(self.listeners):
+            try: listener(lib_type, sorted(categories))
+            except Exception as e: print(f"[Laoli3D] 动作库变化通知失败: {e}")
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key not in self._cache:
+                if len(self._cache) >= MAX_CACHED: self._cache.clear()
+                self._cache[key] = compute()
+            return self._cache[key]
+
+    # ---------- 查询 ----------
+    def categories(self, lib_type):
+        self.ensure_synced(lib_type)
+        return self._cached((lib_type, None), lambda: self._categories(lib_type))
+
+    def _categories(self, lib_type):
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT c.name, COUNT(p.name) FROM categories c LEFT JOIN poses p ON p.lib_type = c.lib_type AND p.category = c.name "
+                "WHERE c.lib_type = ? GROUP BY c.name ORDER BY c.name", (lib_type,)).fetchall()
+        return [{"name": name, "count": count} for name, count in rows]
+
+    def page(self, lib_type, category, offset=0, limit=PAGE_SIZE):
+        # 与原来前端的排序一致：名称倒序 (自动保存的时间戳名称新的在前)
+        self.ensure_synced(lib_type)
+        check_name(category)
+        offset, limit = max(0, int(offset)), min(max(1, int(limit)), MAX_PAGE_SIZE)
+        return self._cached((lib_type, category, offset, limit), lambda: self._page(lib_type, category, offset, limit))
+
+    def _page(self, lib_type, category, offset, limit):
+        with self._lock:
+            db = self._conn()
+            total = db.execute("SELECT COUNT(*) FROM poses WHERE lib_type = ? AND category = ?", (lib_type, category)).fetchone()[0]
+            rows = db.execute("SELECT name, mtime, thumb_mtime FROM poses WHERE lib_type = ? AND category = ? ORDER BY name DESC LIMIT ? OFFSET ?",
+                              (lib_type, category, limit, offset)).fetchall()
+        return {"category": category, "total": total, "offset": offset, "poses": [self.entry(lib_type, category, *row) for row in rows]}
+
+    def entries(self, lib_type, categories=None):
+        # [(分类, 名称, json mtime, png mtime)]，categories 为 None 时取整个库
+        self.ensure_synced(lib_type)
+        with self._lock:
+            rows = self._conn().execute("SELECT category, name, mtime, thumb_mtime FROM poses WHERE lib_type = ?", (lib_type,)).fetchall()
+        return rows if categories is None else [r for r in rows if r[0] in categories]
+
+    def entry(self, lib_type, category, name, mtime, thumb_mtime):
+        url = f"{quote(lib_type)}/{quote(category, safe='')}/{quote(name, safe='')}"
+        item = {"name": name, "thumbnail": None, "dataUrl": f"/laoli/pose/{url}?v={_version(mtime)}"}
+        if thumb_mtime is not None:
+            item["thumbnail"] = f"/laoli/thumb/{url}?v={_version(thumb_mtime)}"
+            if HAS_WEBP: item["srcset"] = ", ".join(f"{item['thumbnail']}&w={w} {w}w" for w in THUMB_WIDTHS)
+        return item
+
+    # ---------- WebP 缩略图 ----------
+    def variant_path(self, lib_type, category=None, name=None, width=None):
+        parts = [self.root, ".thumbs", check_lib_type(lib_type)]
+        if category is not None: parts.append(check_name(category))
+        if name is not None: parts.append(f"{check_name(name)}.{width}.webp")
+        return os.path.join(*parts)
+
+    def make_variants(self, lib_type, category, name):
+        src = self.path(lib_type, category, name, ".png")
+        if not HAS_WEBP or not os.path.exists(src): return
+        os.makedirs(self.variant_path(lib_type, category), exist_ok=True)
+        with Image.open(src) as img:
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            # 从大到小依次缩小，小图以上一张为源；只缩小不放大，保持长宽比
+            for w in sorted(THUMB_WIDTHS, reverse=True):
+                img.thumbnail((w, w * 4), Image.LANCZOS if hasattr(Image, 'LANCZOS') else Image.Resampling.LANCZOS)
+                path = self.variant_path(lib_type, category, name, w)
+                img.save(path + ".tmp", "WEBP", quality=80, method=4)
+                os.replace(path + ".tmp", path)
+
+    def thumbnail(self, lib_type, category, name, width=None):
+        # 返回要发送的文件：请求了宽度时取不小于它的最小 WebP 版本 (缺失或过期则生成)，否则 / 失败时用原 PNG
+        src = self.path(lib_type, category, name, ".png")
+        src_mtime = _mtime(src)
+        if not width or not HAS_WEBP or src_mtime is None: return src
+        w = next((w for w in THUMB_WIDTHS if w >= width), THUMB_WIDTHS[-1])
+        path = self.variant_path(lib_type, category, name, w)
+        variant_mtime = _mtime(path)
+        if variant_mtime is None or variant_mtime < src_mtime:
+            try:
+                self.make_variants(lib_type, category, name)
+            except Exception as e:
+                print(f"[Laoli3D] WebP 缩略图生成失败: {e}")
+                return src
+        return path
+
+    def drop_variants(self, lib_type, category, name=None):
+        # 动作或分类改名 / 移动 / 删除后丢掉旧的 WebP，需要时按新位置重新生成
+        if name is None:
+            shutil.rmtree(self.variant_path(lib_type, category), ignore_errors=True)
+            return
+        for w in THUMB_WIDTHS:
+            try: os.remove(self.variant_path(lib_type, category, name, w))
+            except OSError: pass
+
+    # ---------- 增量更新 ----------
+    def _touch(self, lib_type, category, name=None):
+        with self._lock:
+            self._generation += 1
+            self._touched[(lib_type, category, name)] = self._generation
+
+    @contextmanager
+    def writing(self, lib_type, keys):
+        # 写盘期间标记 keys ([(分类, 名称或 None)])：监视线程此时对账会跳过它们，不会把写了一半的文件当成外部改动再通知一次
+        keys = [(lib_type, c, n) for c, n in keys]
+        with self._lock:
+            for k in keys: self._writing[k] = self._writing.get(k, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for k in keys:
+                    self._writing[k] -= 1
+                    if not self._writing[k]: del self._writing[k]
+                    self._touch(*k)
+
+    def put_pose(self, lib_type, category, name):
+        mtime = _mtime(self.path(lib_type, category, name, ".json"))
+        if mtime is None: return self.remove_pose(lib_type, category, name)
+        with self._lock:
+            with self._conn() as db:
+                db.execute("INSERT OR IGNORE INTO categories VALUES (?, ?)", (lib_type, category))
+                db.execute("INSERT OR REPLACE INTO poses VALUES (?, ?, ?, ?, ?)", (lib_type, category, name, mtime, _mtime(self.path(lib_type, category, name, ".png"))))
+            self._touch(lib_type, category, name)
+
+    def remove_pose(self, lib_type, category, name):
+        with self._lock:
+            with self._conn() as db:
+                db.execute("DELETE FROM poses WHERE lib_type = ? AND category = ? AND name = ?", (lib_type, category, name))
+            self._touch(lib_type, category, name)
+
+    def put_category(self, lib_type, category):
+        with self._lock:
+            with self._conn() as db:
+                db.execute("INSERT OR IGNORE INTO categories VALUES (?, ?)", (lib_type, category))
+            self._touch(lib_type, category)
+
+    def rename_category(self, lib_type, old, new):
+        with self._lock:
+            with self._conn() as db:
+                db.execute("UPDATE OR REPLACE categories SET name = ? WHERE lib_type = ? AND name = ?", (new, lib_type, old))
+                db.execute("UPDATE OR REPLACE poses SET category = ? WHERE lib_type = ? AND category = ?", (new, lib_type, old))
+            self._touch(lib_type, old); self._touch(lib_type, new)
+
+    def remove_category(self, lib_type, category):
+        with self._lock:
+            with self._conn() as db:
+                db.execute("DELETE FROM categories WHERE lib_type = ? AND name = ?", (lib_type, category))
+                db.execute("DELETE FROM poses WHERE lib_type = ? AND category = ?", (lib_type, category))
+            self._touch(lib_type, category)
+
+    # ---------- 文件操作 (写盘后同步索引) ----------
+    def save_pose(self, lib_type, category, name, pose_data, image=None):
+        # 先校验分类名 / 动作名 (self.path 把 None 当作省略这一级)，校验通过前不建目录、不写文件
+        check_name(category); check_name(name)
+        json_path, png_path = self.path(lib_type, category, name, ".json"), self.path(lib_type, category, name, ".png")
+        with self.writing(lib_type, [(category, name)]):
+            os.makedirs(os.path.dirname(json_path), exist_ok=True)
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(pose_data, f)
+            if image:
+                if "," in image: image = image.split(",")[1]
+                with open(png_path, "wb") as f:
+                    f.write(base64.b64decode(image))
+            self.add_pose(lib_type, category, name)
+
+    def add_pose(self, lib_type, category, name):
+        # 动作文件已写好 (接口保存或节点自动保存)：生成 WebP、更新索引并通知
+        try:
+            self.make_variants(lib_type, category, name)
+        except Exception as e:
+            print(f"[Laoli3D] WebP 缩略图生成失败: {e}")
+        self.put_pose(lib_type, category, name)
+        self.notify(lib_type, [category])
+
+    def manage(self, act, lib_type, data):
+        # 整理操作涉及的分类在写盘期间整体标记 (见 writing)
+        cats = [data.get(k) for k in MANAGE_CATEGORY_KEYS.get(act, ()) if isinstance(data.get(k), str)]
+        try:
+            with self.writing(lib_type, [(c, None) for c in cats]):
+                changed = self._manage(act, lib_type, data)
+        except Exception:
+            # 中途失败时索引可能已改了一部分
+            self.invalidate(lib_type)
+            raise
+        if changed: self.notify(lib_type, changed)
+
+    def _manage(self, act, lib_type, data):
+        # 返回受影响的分类
+        root = self.path(lib_type)
+        if not os.path.exists(root): os.makedirs(root, exist_ok=True)
+        if act == "create_cat":
+            p = self.path(lib_type, data.get("name"))
+            if not os.path.exists(p): os.makedirs(p)
+            self.put_category(lib_type, data.get("name"))
+            return [data.get("name")]
+        elif act == "rename_cat":
+            os.rename(self.path(lib_type, data.get("old")), self.path(lib_type, data.get("new")))
+            self.rename_category(lib_type, data.get("old"), data.get("new"))
+            self.drop_variants(lib_type, data.get("old"))
+            return [data.get("old"), data.get("new")]
+        elif act == "del_cat":
+            shutil.rmtree(self.path(lib_type, data.get("category")))
+            self.remove_category(lib_type, data.get("category"))
+            self.drop_variants(lib_type, data.get("category"))
+            return [data.get("category")]
+        elif act == "rename_pose":
+            cat, old, new = data.get("category"), data.get("old"), data.get("new")
+            for ext in (".json", ".png"):
+                if os.path.exists(self.path(lib_type, cat, old, ext)): os.rename(self.path(lib_type, cat, old, ext), self.path(lib_type, cat, new, ext))
+            self.remove_pose(lib_type, cat, old)
+            self.put_pose(lib_type, cat, new)
+            self.drop_variants(lib_type, cat, old); self.drop_variants(lib_type, cat, new)
+            return [cat]
+        elif act == "del_pose":
+            cat, n = data.get("category"), data.get("name")
+            for ext in (".json", ".png"):
+                if os.path.exists(self.path(lib_type, cat, n, ext)): os.remove(self.path(lib_type, cat, n, ext))
+            self.remove_pose(lib_type, cat, n)
+            self.drop_variants(lib_type, cat, n)
+            return [cat]
+        elif act == "move_pose":
+            src, tgt, n = data.get("src_category"), data.get("tgt_category"), data.get("name")
+            os.makedirs(self.path(lib_type, tgt), exist_ok=True)
+            for ext in (".json", ".png"):
+                if os.path.exists(self.path(lib_type, src, n, ext)): shutil.move(self.path(lib_type, src, n, ext), self.path(lib_type, tgt, n, ext))
+            self.remove_pose(lib_type, src, n)
+            self.put_pose(lib_type, tgt, n)
+            self.drop_variants(lib_type, src, n); self.drop_variants(lib_type, tgt, n)
+            return [src, tgt]
+        return []
+
+    # ---------- 目录监视 ----------
+    def start_watcher(self, interval=POLL_INTERVAL):
+        # 只对已经打开过的库对账；改动先合并 EVENT_DELAY 秒，连续写入只触发一次
+        if self._watcher is not None or interval <= 0: return
+        evented = self._start_observer()
+        self._watcher = threading.Thread(target=self._watch_loop, args=(interval, evented), name="laoli-library-watch", daemon=True)
+        self._watcher.start()
+        print(f"[Laoli3D] 动作库监视已启动 ({'文件事件' if evented else f'每 {interval:g} 秒轮询'})")
+
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+        library = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    parts = os.path.relpath(path, library.root).split(os.sep) if path else []
+                    # 缩略图缓存与索引文件本身的变化不用管
+                    if parts and parts[0] in LIB_TYPES:
+                        with library._lock: library._dirty.add(parts[0])
+                        library._wake.set()
+
+        try:
+            observer = Observer()
+            for lib_type in LIB_TYPES:
+                os.makedirs(self.path(lib_type), exist_ok=True)
+                observer.schedule(Handler(), self.path(lib_type), recursive=True)
+            observer.daemon = True
+            observer.start()
+        except Exception as e:
+            print(f"[Laoli3D] 文件事件监视不可用，改为轮询: {e}")
+            return False
+        return True
+
+    def _watch_loop(self, interval, evented):
+        while True:
+            if evented:
+                self._wake.wait(); time.sleep(EVENT_DELAY); self._wake.clear()
+                with self._lock: dirty, self._dirty = self._dirty, set()
+            else:
+                time.sleep(interval)
+                dirty = set(LIB_TYPES)
+            for lib_type in dirty & self._synced:
+                try: self.ensure_synced(lib_type, force=True)
+                except Exception as e: print(f"[Laoli3D] 动作库对账失败: {e}")
+
+LIBRARY = PoseLibrary()
@@ -1,6 +1,7 @@
 import os
 import sys
 import inspect 
+import importlib.util
 from collections import namedtuple
 from unittest.mock import MagicMock
 import traceback
@@ -9,11 +10,17 @@ from datetime import datetime
 import numpy as np
 import torch
 from PIL import Image
-from scipy.spatial.transform import Rotation as R
-import torchvision.transforms as transforms
 import base64
 import io
-import gc
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from .laoli_registry import MODEL_REGISTRY, model_key
+from .laoli_library import LIBRARY
+from .laoli_pose import smpl_to_pose_specs, mano_to_pose_specs
+from .laoli_video import IoUTracker, QuatSmoother, box_motion, keypoints_to_box
+from .laoli_export import COMPILE_MODES, HMR2Inference, HAMERInference, load_inference_model, compile_model
+from .laoli_onnx import CPU_BACKENDS, load_onnx_model
 
 # ================= 补丁区域 =================
 try:
@@ -34,9 +41,12 @@ except ImportError: pass
 if "HOME" not in os.environ:
     os.environ["HOME"] = os.environ.get("USERPROFILE", "C:/")
 
+# hmr2 / hamer 导入时会引用 pyrender / OpenGL (只用于训练可视化)，加载模型前才替换为 MagicMock，
+# 不识别的工作流不会影响其它节点的真实 pyrender
 MOCK_MODULES = ["pyrender", "pyrender.light", "pyrender.shader_cache", "pyrender.constants", "OpenGL", "OpenGL.GL", "OpenGL.EGL", "OpenGL.GLUT", "OpenGL.GLU", "OpenGL.platform", "OpenGL.platform.egl"]
-for mod_name in MOCK_MODULES:
-    sys.modules[mod_name] = MagicMock()
+def mock_render_modules():
+    for mod_name in MOCK_MODULES:
+        sys.modules[mod_name] = MagicMock()
 
 # ================= 路径配置 =================
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -57,19 +67,34 @@ if HAMER_ROOT not in sys.path: sys.path.insert(0, HAMER_ROOT)
 os.makedirs(MODEL_DIR, exist_ok=True)
 os.makedirs(DEBUG_DIR, exist_ok=True)
 os.environ["CACHE_DIR_4DHUMANS"] = MODEL_DIR
-AI_DEPENDENCY_OK = False
-HAS_MEDIAPIPE = False
-LOADING_ERROR_MSG = ""
-
-try:
-    from ultralytics import YOLO
-    import mediapipe as mp
-    HAS_MEDIAPIPE = True
-    AI_DEPENDENCY_OK = True
-except Exception as e:
-    err_msg = traceback.format_exc()
-    LOADING_ERROR_MSG = str(err_msg)
-    print(f"[Laoli3D] 基础依赖加载失败: {e}")
+# ultralytics / mediapipe 导入很慢：启动时只检查是否已安装，第一次识别 (或预热) 时才真正导入
+YOLO = None
+mp = None
+def _installed(name):
+    try: return name in sys.modules or importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError): return False
+
+_MISSING = [m for m in ("ultralytics", "mediapipe") if not _installed(m)]
+AI_DEPENDENCY_OK = not _MISSING
+HAS_MEDIAPIPE = AI_DEPENDENCY_OK
+LOADING_ERROR_MSG = f"未安装: {', '.join(_MISSING)}" if _MISSING else ""
+if _MISSING: print(f"[Laoli3D] 基础依赖加载失败: {LOADING_ERROR_MSG}")
+_AI_IMPORTED = False
+_AI_IMPORT_LOCK = threading.Lock()
+
+def ensure_ai_dependencies():
+    global YOLO, mp, AI_DEPENDENCY_OK, HAS_MEDIAPIPE, LOADING_ERROR_MSG, _AI_IMPORTED
+    with _AI_IMPORT_LOCK:
+        if _AI_IMPORTED or not AI_DEPENDENCY_OK: return AI_DEPENDENCY_OK
+        try:
+            from ultralytics import YOLO
+            import mediapipe as mp
+        except Exception as e:
+            LOADING_ERROR_MSG = str(traceback.format_exc())
+            AI_DEPENDENCY_OK = HAS_MEDIAPIPE = False
+            print(f"[Laoli3D] 基础依赖加载失败: {e}")
+        _AI_IMPORTED = True
+        return AI_DEPENDENCY_OK
 
 # ================= 工具函数 =================
 def get_model_path(filename, url=""):
@@ -123,79 +148,153 @@ DATA:
         f.write(content)
     return config_path
 
-def yolo_square_crop(image_pil, yolo_model):
-    results = yolo_model(image_pil, verbose=False)
-    target_box = None
-    max_conf = 0.0
-    if results and len(results) > 0:
-        for box in results[0].boxes:
-            if int(box.cls[0]) == 0 and float(box.conf[0]) > max_conf:
-                max_conf = float(box.conf[0])
-                target_box = box.xyxy[0].cpu().numpy()
-    W, H = image_pil.size
-    if target_box is None:
-        short_side = min(W, H); cx, cy = W/2, H/2
-        x1, y1 = cx - short_side/2, cy - short_side/2
-        x2, y2 = cx + short_side/2, cy + short_side/2
-    else:
-        x1, y1, x2, y2 = target_box
-        box_w, box_h = x2 - x1, y2 - y1
-        cx, cy = x1 + box_w/2, y1 + box_h/2
-        side_len = max(box_w, box_h) * 1.2
-        x1 = max(0, cx - side_len/2); y1 = max(0, cy - side_len/2)
-        x2 = min(W, cx + side_len/2); y2 = min(H, cy + side_len/2)
-    
-    crop = image_pil.crop((x1, y1, x2, y2))
-    transform = transforms.Compose([
-        transforms.Resize((256, 256)), 
-        transforms.ToTensor(), 
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
-    
-    # 修复：返回 3 个值，增加了 crop_info (x1, y1, scale_size) 供 HMR2 坐标映射使用
-    return crop, transform(crop).unsqueeze(0), (x1, y1, x2-x1)
-
-MANO_TO_MIXAMO = [["Index1", "Index2", "Index3"], ["Middle1", "Middle2", "Middle3"], ["Pinky1", "Pinky2", "Pinky3"], ["Ring1", "Ring2", "Ring3"], ["Thumb1", "Thumb2", "Thumb3"]]
+# 裁剪归一化参数 (ImageNet)，身体与手部共用
+IMAGE_MEAN = (0.485, 0.456, 0.406)
+IMAGE_STD = (0.229, 0.224, 0.225)
+CROP_SIZE = 256
+# ViT 主干的输入宽高 (与 model_cfg.MODEL.BBOX_SHAPE = [192, 256] 一致)：直接裁出 256x192，不再裁正方形再切掉两侧 32 列
+BBOX_SHAPE = (192, 256)
+CROP_HW = (CROP_SIZE, CROP_SIZE * BBOX_SHAPE[0] // BBOX_SHAPE[1])
+# 推理精度：半精度只作用于 ViT 主干与 Transformer 头 (autocast)，SMPL/MANO 层与旋转转换保持 fp32
+PRECISIONS = { "fp32": None, "bf16": torch.bfloat16, "fp16": torch.float16 }
+# HaMeR 单次前向的最大 batch，手很多时分块推理以限制显存峰值
+HAMER_MAX_BATCH = int(os.environ.get("LAOLI_HAMER_MAX_BATCH", "8"))
+
+def yolo_detect_people(pil_imgs, yolo_model, multi_person=False, conf_threshold=0.5, iou_threshold=0.5):
+    # 批量检测：一次 YOLO 调用处理整个 batch。
+    # 单人模式每帧只保留置信度最高的人；多人模式保留所有超过阈值的人并做 NMS，按置信度排序。
+    # 返回每帧的 [(box, conf), ...]，没检测到人时为 [(None, 0.0)]（退化为中心裁剪）
+    results = yolo_model(pil_imgs, verbose=False)
+    detections = []
+    for res in results:
+        boxes, confs = [], []
+        for box in res.boxes:
+            if int(box.cls[0]) == 0:
+                boxes.append(box.xyxy[0].float().cpu()); confs.append(float(box.conf[0]))
+        if len(boxes) == 0:
+            detections.append([(None, 0.0)]); continue
+        boxes = torch.stack(boxes); confs = torch.tensor(confs)
+        if multi_person:
+            keep = confs >= conf_threshold
+            if not keep.any(): keep = confs == confs.max()
+            boxes, confs = boxes[keep], confs[keep]
+            from torchvision.ops import nms
+            order = nms(boxes, confs, iou_threshold)
+        else:
+            order = confs.argmax().reshape(1)
+        detections.append([(boxes[k].numpy(), float(confs[k])) for k in order.tolist()])
+    return detections
+
+def frames_to_device(image, device):
+    # ComfyUI IMAGE (B, H, W, C) [0,1] -> (B, C, H, W)，整批只上传一次，身体与手部裁剪都从这里采样
+    return image.to(device, non_blocking=True).float().permute(0, 3, 1, 2).contiguous()
+
+def expand_to_aspect(w, h, aspect=BBOX_SHAPE):
+    # 与 datasets/utils.expand_to_aspect_ratio 相同：只放大不缩小，使框的宽高比等于 aspect (w, h)
+    w_t, h_t = aspect
+    if h / w < h_t / w_t: return w, max(w * h_t / w_t, h)
+    return max(h * w_t / h_t, w), h
+
+def square_box(target_box, img_w, img_h, rescale=1.2):
+    # 返回 (cx, cy, side)。side 是按 BBOX_SHAPE 扩展后框的长边，与 ViTDetDataset 的 bbox_size 一致；
+    # HMR2/HaMeR 的 2D 关键点也是以 side 为单位归一化的。
+    # 不再裁到图像范围内：越界部分在 roi_align 中补零，与 generate_image_patch_cv2 的处理一致
+    if target_box is None: return img_w / 2, img_h / 2, float(min(img_w, img_h))
+    x1, y1, x2, y2 = [float(v) for v in target_box]
+    return (x1 + x2) / 2, (y1 + y2) / 2, float(max(expand_to_aspect((x2 - x1) * rescale, (y2 - y1) * rescale)))
+
+def crop_patches(frames, frame_ids, squares, out_hw=CROP_HW):
+    # 所有裁剪一次 roi_align 完成 (双线性采样 + 缩放，sampling_ratio 自适应相当于区域平均)。
+    # 高度覆盖 side，宽度按输出宽高比取中间部分：256x192 时即正方形裁剪的中间 192 列
+    half_w = [s * out_hw[1] / out_hw[0] / 2 for _, _, s in squares]
+    rois = torch.tensor([[i, cx - hw, cy - s / 2, cx + hw, cy + s / 2] for i, (cx, cy, s), hw in zip(frame_ids, squares, half_w)], dtype=frames.dtype).to(frames.device)
+    from torchvision.ops import roi_align
+    return roi_align(frames, rois, output_size=tuple(out_hw), spatial_scale=1.0, sampling_ratio=-1, aligned=True)
+
+def crop_and_normalize(frames, frame_ids, squares, out_hw=CROP_HW):
+    # 归一化用 addcmul 融合：(x - mean) / std = x * (1/std) + (-mean/std)
+    crops = crop_patches(frames, frame_ids, squares, out_hw)
+    mean = torch.tensor(IMAGE_MEAN, dtype=frames.dtype, device=frames.device).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGE_STD, dtype=frames.dtype, device=frames.device).view(1, 3, 1, 1)
+    return torch.addcmul(-mean / std, crops, 1.0 / std)
+
+def resolve_precision(precision, device):
+    # 不支持 bf16 的旧显卡退回 fp16；CPU 上 fp16 算子不全，退回 bf16
+    dtype = PRECISIONS.get(precision)
+    if dtype is torch.bfloat16 and device.type == "cuda" and not torch.cuda.is_bf16_supported(): return torch.float16
+    if dtype is torch.float16 and device.type == "cpu": return torch.bfloat16
+    return dtype
+
+def model_inputs(crops, autocast_dtype=None):
+    # HMR2 / HaMeR 的输入字典；半精度时输入改为 channels_last，与 patch embedding 卷积权重的布局一致
+    # 节点只用关节与参数，return_vertices=False 让 HMR2 的 SMPL 跳过 6890 个顶点的蒙皮 (HaMeR 忽略该键)
+    if autocast_dtype is None: return {'img': crops, 'return_vertices': False}
+    return {'img': crops.contiguous(memory_format=torch.channels_last), 'autocast_dtype': autocast_dtype, 'return_vertices': False}
+
+def assign_hands_to_people(hands_bboxes, people):
+    # 手部框中心落在哪个人的检测框里就归谁；都不在则归中心最近的人
+    assigned = []
+    for info in hands_bboxes:
+        hx = (info['box'][0] + info['box'][2]) / 2; hy = (info['box'][1] + info['box'][3]) / 2
+        best, best_dist = 0, float("inf")
+        for p_idx, person in enumerate(people):
+            x1, y1, x2, y2 = person["bbox"]
+            inside = x1 <= hx <= x2 and y1 <= hy <= y2
+            dist = (0 if inside else 1e9) + ((x1 + x2) / 2 - hx) ** 2 + ((y1 + y2) / 2 - hy) ** 2
+            if dist < best_dist: best, best_dist = p_idx, dist
+        assigned.append((best, info))
+    return assigned
+
+def detect_hands_mediapipe(img_np, mp_hands, force_hand_side="Auto"):
+    hands_bboxes = []
+    mp_res = mp_hands.process(img_np)
+    if mp_res.multi_hand_landmarks:
+        h, w, _ = img_np.shape
+        for idx, hand_landmarks in enumerate(mp_res.multi_hand_landmarks):
+            lbl_obj = mp_res.multi_handedness[idx].classification[0]
+            lbl = lbl_obj.label.lower() 
+            if force_hand_side == "Force Right": lbl = "right"
+            elif force_hand_side == "Force Left": lbl = "left"
+            x_min, y_min, x_max, y_max = w, h, 0, 0
+            for lm in hand_landmarks.landmark:
+                x_min = min(x_min, lm.x * w); y_min = min(y_min, lm.y * h)
+                x_max = max(x_max, lm.x * w); y_max = max(y_max, lm.y * h)
+            margin = max(x_max-x_min, y_max-y_min) * 0.5
+            box = [max(0, x_min-margin), max(0, y_min-margin), min(w, x_max+margin), min(h, y_max+margin)]
+            hands_bboxes.append({'side': lbl, 'box': box})
+    return hands_bboxes
+
+def hmr2_wrist_boxes(hmr2_kps_2d, crop_info, img_w, img_h):
+    # HMR2 辅助回退：利用 HMR2 手腕坐标生成手部框
+    # pred_keypoints_2d 是以裁剪中心为原点、按裁剪边长归一化的坐标 (约 [-0.5, 0.5])
+    hands_bboxes = []
+    cx_crop, cy_crop, scale_crop = crop_info
+    wrist_indices = {'right': 4, 'left': 7}
+    for side, kidx in wrist_indices.items():
+        if hmr2_kps_2d.shape[0] > kidx and (hmr2_kps_2d[kidx].shape[0] < 3 or hmr2_kps_2d[kidx][2] > 0.3):
+            local_x, local_y = hmr2_kps_2d[kidx][:2]
+            global_x = cx_crop + local_x * scale_crop
+            global_y = cy_crop + local_y * scale_crop
+            hand_size = scale_crop * 0.15 # 手部框大小估算
+            x1, y1 = global_x - hand_size, global_y - hand_size
+            x2, y2 = global_x + hand_size, global_y + hand_size
+            box = [max(0, x1), max(0, y1), min(img_w, x2), min(img_h, y2)]
+            hands_bboxes.append({'side': side, 'box': box})
+    return hands_bboxes
+
+def process_hamer_outputs(pred_mano_params, sides):
+    # 批量版本：所有手的关节在设备上一次性转四元数 (见 laoli_pose)
+    try:
+        return mano_to_pose_specs(pred_mano_params['hand_pose'], sides)
+    except Exception as e:
+        print(f"[Laoli3D] Hand pose convert failed: {e}")
+        return [{} for _ in sides]
 
 def process_hamer_output(pred_mano_params, side="right"):
-    pose_data = {}
-    prefix = "RightHand" if side == "right" else "LeftHand"
-    hand_pose = pred_mano_params['hand_pose'][0] 
-    if hasattr(hand_pose, 'cpu'): hand_pose = hand_pose.cpu().numpy()
-    if hand_pose.shape[-1] == 3 and hand_pose.ndim == 2:
-        hand_pose = R.from_rotvec(hand_pose).as_matrix()
-    elif hand_pose.shape[-1] != 3:
-        try:
-            hand_pose = hand_pose.reshape(-1, 3)
-            hand_pose = R.from_rotvec(hand_pose).as_matrix()
-        except: return {}
-    for i in range(5):
-        finger_bones = MANO_TO_MIXAMO[i]
-        for j in range(3):
-            idx = i * 3 + j
-            if idx >= len(hand_pose): break
-            rot_mat = hand_pose[idx]
-            quat = R.from_matrix(rot_mat).as_quat().tolist()
-            pose_data[prefix + finger_bones[j]] = {"q": quat}
-    return pose_data
+    return process_hamer_outputs({'hand_pose': pred_mano_params['hand_pose'][:1]}, [side])[0]
 
 def smpl_to_pose_spec(body_pose, global_orient):
-    if isinstance(body_pose, torch.Tensor): body_pose = body_pose.cpu().numpy()
-    if isinstance(global_orient, torch.Tensor): global_orient = global_orient.cpu().numpy()
-    if global_orient.shape == (3,): global_orient = R.from_rotvec(global_orient).as_matrix()
-    go_mat = global_orient.reshape(1, 3, 3)
-    if body_pose.ndim == 1: body_pose = body_pose.reshape(23, 3); body_pose = R.from_rotvec(body_pose).as_matrix()
-    elif body_pose.shape[-2:] != (3, 3): body_pose = body_pose.reshape(23, 3); body_pose = R.from_rotvec(body_pose).as_matrix()
-    bp_mat = body_pose.reshape(23, 3, 3)
-    full_pose = np.concatenate((go_mat, bp_mat), axis=0)
-    bone_map = { 0: "Hips", 1: "LeftUpLeg", 2: "RightUpLeg", 3: "Spine", 4: "LeftLeg", 5: "RightLeg", 6: "Spine1", 7: "LeftFoot", 8: "RightFoot", 9: "Spine2", 10: "LeftToeBase", 11: "RightToeBase", 12: "Neck", 13: "LeftShoulder", 14: "RightShoulder", 15: "Head", 16: "LeftArm", 17: "RightArm", 18: "LeftForeArm", 19: "RightForeArm", 20: "LeftHand", 21: "RightHand" }
-    body_data = {}
-    for idx, name in bone_map.items():
-        if idx >= len(full_pose): continue
-        rot_mat = full_pose[idx]
-        rot = R.from_matrix(rot_mat)
-        body_data[name] = {"q": rot.as_quat().tolist()}
-    return body_data
+    return smpl_to_pose_specs(body_pose, global_orient)[0]
 
 def calc_root_correction_roll_only(pred_keypoints_3d):
     try:
@@ -206,21 +305,218 @@ def calc_root_correction_roll_only(pred_keypoints_3d):
         if abs(dx) < 1e-6 and abs(dy) < 1e-6:
             return [0, 0, 0, 1]
         angle = np.arctan2(-dx, -dy)
-        r = R.from_euler('z', -angle, degrees=False)
-        return r.as_quat().tolist()
+        # 绕 z 轴旋转 -angle 的四元数 [x, y, z, w] (与 scipy from_euler('z', -angle).as_quat() 相同，免去导入 scipy)
+        return [0.0, 0.0, float(np.sin(-angle / 2)), float(np.cos(-angle / 2))]
     except Exception as e:
         print(f"[Laoli3D] Correction Calc Failed: {e}")
         return [0, 0, 0, 1]
 
+# ================= 模型加载 =================
+YOLO_URL = "https://github.com/ultralytics/assets/releases/download/v8.2.0/yolov8n.pt"
+MP_HANDS_KEY = "mediapipe_hands_conf0.1"
+MP_HANDS_MULTI_KEY = "mediapipe_hands_conf0.1_x8"
+
+def load_yolo_model(path, device):
+    return YOLO(path)
+
+# 注意力实现：默认 sdpa (flash / memory-efficient 内核，旧版 torch 自动退回 math)；
+# 设置 LAOLI_ATTENTION=math 强制使用原始实现作对照
+ATTENTION_IMPL = os.environ.get("LAOLI_ATTENTION", "sdpa")
+
+def to_inference_device(model, device):
+    model = model.to(device).eval()
+    if ATTENTION_IMPL == "math":
+        for m in model.modules():
+            if hasattr(m, "attn_impl"): m.attn_impl = "math"
+    # GPU 上 patch embedding 卷积权重用 channels_last，混合精度时走 Tensor Core 的 NHWC 卷积
+    if torch.device(device).type == "cuda": model.backbone.to(memory_format=torch.channels_last)
+    return model
+
+def finish_model(model, device, compile_mode="none", backend="torch"):
+    # CPU 上可换成 ONNX Runtime 后端；不可用 (未安装 onnxruntime、未走推理模型缓存等) 时退回 PyTorch
+    model = to_inference_device(model, device)
+    if backend == "torch-int8":
+        if getattr(model, "KIND", None) == "hamer":
+            try:
+                from .laoli_quant import load_quantized_model
+                return load_quantized_model(model)
+            except Exception as e:
+                print(f"[Laoli3D] int8 主干不可用，使用 fp32: {e}")
+        backend = "torch"
+    if backend != "torch":
+        try:
+            return load_onnx_model(model, CROP_HW, quantize=backend == "onnx-int8")
+        except Exception as e:
+            print(f"[Laoli3D] ONNX 后端不可用，使用 PyTorch: {e}")
+    return compile_model(model, device, compile_mode)
+
+_CWD_LOCK = threading.Lock()
+
+def load_hmr2_model(path, device, compile_mode="none", backend="torch"):
+    # chdir 是进程级状态，后台预热可能并行加载，需加锁
+    mock_render_modules()
+    with _CWD_LOCK:
+        cwd = os.getcwd(); os.chdir(HMR2_ROOT)
+        try:
+            from hmr2.models import load_hmr2, get_hmr2_config
+            # 优先用推理专用模型 (跳过 Lightning 初始化)，失败时退回原始 LightningModule
+            try:
+                model = load_inference_model(HMR2Inference, path, get_hmr2_config(SMPL_DIR), lambda: load_hmr2(path, smpl_dir=SMPL_DIR)[0], device)
+            except Exception as e:
+                print(f"[Laoli3D] 推理模型加载失败，使用原始 HMR2: {e}")
+                model, _ = load_hmr2(path, smpl_dir=SMPL_DIR)
+        finally:
+            os.chdir(cwd)
+    return finish_model(model, device, compile_mode, backend)
+
+def load_hamer_model(path, device, compile_mode="none", backend="torch"):
+    if not os.path.exists(HAMER_ROOT): return None
+    mock_render_modules()
+    ensure_hamer_config()
+    from hamer.models import load_hamer, get_hamer_config
+    try:
+        model = load_inference_model(HAMERInference, path, get_hamer_config(path), lambda: load_hamer(path)[0], device)
+    except Exception as e:
+        print(f"[Laoli3D] 推理模型加载失败，使用原始 HaMeR: {e}")
+        model, _ = load_hamer(path)
+    return finish_model(model, device, compile_mode, backend)
+
+# 节点的默认编译方式 / CPU 后端；后台预热按同样的默认值加载，模型才能被节点直接复用
+DEFAULT_COMPILE_MODE = "none"
+DEFAULT_CPU_BACKEND = "onnx"
+
+def model_backends(device, cpu_backend=DEFAULT_CPU_BACKEND):
+    # 返回 (HMR2 后端, HaMeR 后端)：cpu_backend 只在 CPU 上生效，torch-int8 只量化 HaMeR
+    backend = cpu_backend if torch.device(device).type == "cpu" else "torch"
+    return ("torch" if backend == "torch-int8" else backend), backend
+
+def model_variant(backend, compile_mode=DEFAULT_COMPILE_MODE):
+    # 注册表 key 的 variant：非 torch 后端按后端区分，torch 后端按编译方式区分 (none 不加后缀)
+    return backend if backend != "torch" else compile_mode
+
+def load_mp_hands(max_num_hands=2):
+    # 修复：降低阈值到 0.1 以适应复杂遮挡
+    return mp.solutions.hands.Hands(static_image_mode=True, max_num_hands=max_num_hands, min_detection_confidence=0.1)
+
+# ================= 后台预热 =================
+# 设置环境变量 LAOLI_WARMUP=1 后，ComfyUI 启动时在后台线程池中加载模型并各跑一次空推理，
+# 首个真实请求即可达到稳态延迟。进度通过 /laoli/status 查询。
+WARMUP_STATUS = { "enabled": False, "state": "idle", "models": {} }
+_WARMUP_LOCK = threading.Lock()
+
+def default_device():
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+def _warmup_one(name, path, device, loader, dummy_forward, variant="none"):
+    info = WARMUP_STATUS["models"][name]
+    t0 = time.time()
+    try:
+        if path is None: raise FileNotFoundError("模型文件不存在")
+        info["state"] = "loading"
+        key = model_key(path, device, variant=variant)
+        model = MODEL_REGISTRY.acquire(key, loader)
+        if model is None: raise RuntimeError("模型加载失败")
+        try:
+            info["state"] = "warming"
+            with torch.no_grad(): dummy_forward(model)
+            if device.type == "cuda": torch.cuda.synchronize(device)
+        finally:
+            MODEL_REGISTRY.release(key)
+        info["state"] = "ready"
+    except Exception as e:
+        info["state"] = "error"; info["error"] = str(e)
+        print(f"[Laoli3D] 预热失败 {name}: {e}")
+    info["seconds"] = round(time.time() - t0, 2)
+
+def start_warmup(device=None):
+    with _WARMUP_LOCK:
+        if WARMUP_STATUS["state"] != "idle" or not AI_DEPENDENCY_OK: return
+        WARMUP_STATUS["enabled"] = True; WARMUP_STATUS["state"] = "warming"
+    device = device or default_device()
+    blank_img = np.zeros((256, 256, 3), dtype=np.uint8)
+    dummy_batch = lambda: {'img': torch.zeros(1, 3, *CROP_HW, device=device)}
+    yolo_path = get_model_path("yolov8n.pt", YOLO_URL)
+    hmr2_path = get_model_path("hmr2a_r50_773975.pth", "")
+    hamer_path = get_model_path("hamer_v1a.pth", "")
+    # 后端与注册表 key 和节点默认参数下的 load_models 一致，预热的模型才能被节点直接复用
+    body_backend, hand_backend = model_backends(device)
+    jobs = [
+        ("yolo", yolo_path, device, lambda: load_yolo_model(yolo_path, device), lambda m: m(Image.fromarray(blank_img), verbose=False)),
+        ("hmr2", hmr2_path, device, lambda: load_hmr2_model(hmr2_path, device, DEFAULT_COMPILE_MODE, body_backend), lambda m: m(dummy_batch()), model_variant(body_backend)),
+        ("hamer", hamer_path, device, lambda: load_hamer_model(hamer_path, device, DEFAULT_COMPILE_MODE, hand_backend), lambda m: m(dummy_batch()), model_variant(hand_backend)),
+    ]
+    if HAS_MEDIAPIPE:
+        jobs.append(("mp_hands", MP_HANDS_KEY, torch.device("cpu"), load_mp_hands, lambda m: m.process(blank_img)))
+    for name, *_ in jobs: WARMUP_STATUS["models"][name] = { "state": "pending" }
+
+    def run():
+        # 依赖的导入也放在后台线程里，不拖慢 ComfyUI 启动
+        if not ensure_ai_dependencies():
+            WARMUP_STATUS["state"] = "error"; return
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="laoli_warmup") as pool:
+            list(pool.map(lambda job: _warmup_one(*job), jobs))
+        failed = [n for n, info in WARMUP_STATUS["models"].items() if info["state"] == "error"]
+        WARMUP_STATUS["state"] = "partial" if failed else "ready"
+        print(f"[Laoli3D] 模型预热完成: {WARMUP_STATUS['state']}")
+    threading.Thread(target=run, name="laoli_warmup", daemon=True).start()
+
+def warmup_status():
+    return { **WARMUP_STATUS, "ai_dependency_ok": AI_DEPENDENCY_OK, "registry": MODEL_REGISTRY.stats() }
+
+# ================= 阶段调度 =================
+class StageGraph:
+    # 节点内的小型 DAG 调度器：每个阶段在独立线程中运行，通过 graph.result(name) 等待上游阶段。
+    # 依赖可以是条件性的（例如只有 MediaPipe 没找到手时才等待 HMR2 做手腕回退）。
+    def __init__(self):
+        self.stages = {}
+        self.futures = {}
+        self.timings = {}
+        self._local = threading.local()
+
+    def add(self, name, fn):
+        self.stages[name] = fn
+
+    def result(self, name):
+        t0 = time.perf_counter()
+        try:
+            return self.futures[name].result()
+        finally:
+            self._local.wait_ms = getattr(self._local, "wait_ms", 0.0) + (time.perf_counter() - t0) * 1000
+
+    def _run_stage(self, name, fn, t_origin):
+        self._local.wait_ms = 0.0
+        t0 = time.perf_counter()
+        try:
+            self.futures[name].set_result(fn(self))
+        except Exception as e:
+            self.futures[name].set_exception(e)
+        t1 = time.perf_counter()
+        self.timings[name] = {
+            "start_ms": round((t0 - t_origin) * 1000, 1), "end_ms": round((t1 - t_origin) * 1000, 1),
+            "wait_ms": round(self._local.wait_ms, 1), "busy_ms": round((t1 - t0) * 1000 - self._local.wait_ms, 1),
+        }
+
+    def run(self):
+        # 所有 Future 先建好，阶段内部 result() 时上游一定已登记
+        self.futures = {name: Future() for name in self.stages}
+        t_origin = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, len(self.stages)), thread_name_prefix="laoli_stage") as pool:
+            for name, fn in self.stages.items():
+                pool.submit(self._run_stage, name, fn, t_origin)
+        self.timings["total"] = { "ms": round((time.perf_counter() - t_origin) * 1000, 1) }
+        return { name: f.result() for name, f in self.futures.items() }
+
 # ================= 节点定义 =================
 
 class Laoli_3DPoseEditor:
     def __init__(self):
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.device = default_device()
         self.hmr2 = None
         self.hamer = None
         self.yolo = None
         self.mp_hands = None
+        self.model_keys = {}
+        self.autocast_dtype = None
 
     @classmethod
     def INPUT_TYPES(s):
@@ -235,8 +531,18 @@ class Laoli_3DPoseEditor:
                 "image": ("IMAGE", ),
                 "enable_recognition": ("BOOLEAN", {"default": True, "label_on": "启用识别", "label_off": "锁定(不识别)"}),
                 "use_hamer": ("BOOLEAN", {"default": True, "label_on": "HaMeR (高精度)", "label_off": "MediaPipe (快速)"}),
-                "force_hand_side": (["Auto", "Force Right", "Force Left", "False"], {"default": "Auto"}),
-                "unload_models": ("BOOLEAN", {"default": False, "label_on": "释放显存", "label_off": "常驻显存(快)"}),
+                "force_hand_side": (["Auto", "Force Right", "Force Left", "False"], {"default": "Auto", "tooltip": "MediaPipe 检测到的手强制视为左 / 右手；批量与视频模式 (关键帧) 都生效"}),
+                "multi_person": ("BOOLEAN", {"default": False, "label_on": "多人识别", "label_off": "单人(最高置信度)"}),
+                "person_threshold": ("FLOAT", {"default": 0.5, "min": 0.05, "max": 1.0, "step": 0.05}),
+                "video_mode": ("BOOLEAN", {"default": False, "label_on": "视频(跟踪+平滑)", "label_off": "逐帧独立"}),
+                "fps": ("FLOAT", {"default": 24.0, "min": 1.0, "max": 120.0, "step": 1.0}),
+                "keyframe_interval": ("INT", {"default": 10, "min": 1, "max": 300, "tooltip": "视频模式下每隔多少帧重新运行 YOLO 检测"}),
+                "motion_threshold": ("FLOAT", {"default": 0.02, "min": 0.0, "max": 1.0, "step": 0.005, "tooltip": "框内画面变化低于此值时复用上一关键帧的姿势，0 = 每帧都推理"}),
+                "smooth_min_cutoff": ("FLOAT", {"default": 1.0, "min": 0.05, "max": 30.0, "step": 0.05, "tooltip": "One-Euro 滤波最小截止频率(Hz)，越小越平滑"}),
+                "precision": (list(PRECISIONS.keys()), {"default": "fp32", "tooltip": "bf16/fp16 只作用于 ViT 主干与 Transformer 头，SMPL/MANO 保持 fp32；精度回归可用 tools/precision_check.py 验证"}),
+                "compile_mode": (COMPILE_MODES, {"default": DEFAULT_COMPILE_MODE, "tooltip": "HMR2/HaMeR 编译方式；首次使用会编译并缓存到 models/cache，torchscript 固定 fp32"}),
+                "cpu_backend": (CPU_BACKENDS, {"default": DEFAULT_CPU_BACKEND, "tooltip": "没有 CUDA 时 HMR2/HaMeR 的推理后端：onnx / onnx-int8 走 ONNX Runtime (需安装 onnxruntime)，torch 为原始 PyTorch，torch-int8 为 HaMeR 主干静态量化 (需先运行 tools/quantize_hamer.py)"}),
+                "model_budget_gb": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 256.0, "step": 0.5, "tooltip": "模型缓存预算(GB)，0 = 常驻不限制；超出预算时按最近最少使用释放空闲模型"}),
             } 
         }
     
@@ -245,127 +551,210 @@ class Laoli_3DPoseEditor:
     FUNCTION = "run_editor"
     CATEGORY = "Laoli3D"
 
-    def load_models(self):
-        if self.yolo is None:
-            self.yolo = YOLO(get_model_path("yolov8n.pt", "https://github.com/ultralytics/assets/releases/download/v8.2.0/yolov8n.pt"))
-        if self.hmr2 is None:
-            hmr2_path = get_model_path("hmr2a_r50_773975.pth", "")
-            if hmr2_path:
-                cwd = os.getcwd(); os.chdir(HMR2_ROOT)
-                from hmr2.models import load_hmr2
-                self.hmr2, _ = load_hmr2(hmr2_path, smpl_dir=SMPL_DIR)
-                self.hmr2 = self.hmr2.to(self.device).eval()
-                os.chdir(cwd)
-        if self.hamer is None:
-            hamer_path = get_model_path("hamer_v1a.pth", "") 
-            if hamer_path and os.path.exists(HAMER_ROOT):
-                sys.modules["pyrender"] = MagicMock()
-                ensure_hamer_config()
-                from hamer.models import load_hamer
-                self.hamer, _ = load_hamer(hamer_path)
-                self.hamer = self.hamer.to(self.device).eval()
-        if self.mp_hands is None and HAS_MEDIAPIPE:
-            # 修复：降低阈值到 0.1 以适应复杂遮挡
-            self.mp_hands = mp.solutions.hands.Hands(static_image_mode=True, max_num_hands=2, min_detection_confidence=0.1)
-
-    def run_editor(self, model_asset, pose_data_json="", light_config_text="", image=None, enable_recognition=True, use_hamer=True, force_hand_side="Auto", unload_models=False):
-        if force_hand_side == "False":
-            force_hand_side = "Auto"
-            
-        ui = { "model": model_asset, "ai_pose": None, "manual_pose": pose_data_json }
-        
-        if image is not None and enable_recognition and AI_DEPENDENCY_OK:
-            self.load_models()
-            img_np = (255. * image.cpu().numpy()[0]).astype(np.uint8)
-            pil_img = Image.fromarray(img_np)
-            final_pose = { "meta": { "version": "2.0", "source": "Laoli_AI", "type": "Body" }, "body": {}, "hands": {} }
-            
-            # 存储 HMR2 的中间结果供手部回退使用
-            hmr2_kps_2d = None 
-            crop_info = None
-
-            try:
-                if self.hmr2:
-                    # 1. 接收修改后 yolo_square_crop 返回的 crop_info
-                    _, batch_input, crop_info = yolo_square_crop(pil_img, self.yolo)
-                    
-                    with torch.no_grad():
-                        out = self.hmr2({'img': batch_input.to(self.device).float()})
-                        bp = out['pred_smpl_params']['body_pose'][0]
-                        go = out['pred_smpl_params']['global_orient'][0]
-                        
-                        # 2. 保存 HMR2 的 2D 关键点
-                        if 'pred_keypoints_2d' in out:
-                            hmr2_kps_2d = out['pred_keypoints_2d'][0].cpu().numpy()
-
-                        if 'pred_keypoints_3d' in out:
-                            kps = out['pred_keypoints_3d'][0].cpu().numpy()
-                            rc = calc_root_correction_roll_only(kps)
-                            final_pose["meta"]["root_correction"] = rc
-                        final_pose["body"] = smpl_to_pose_spec(bp, go)
-            except Exception as e:
-                print(f"[Laoli3D] Body Error: {e}")
-
-            hands_bboxes = []
+    def acquire_model(self, attr, path, device, loader, variant="none"):
+        # 从进程级注册表取模型；同一 (路径, device, dtype, 编译方式) 的模型在所有节点间共享
+        if getattr(self, attr) is not None or path is None: return
+        key = model_key(path, device, variant=variant)
+        model = MODEL_REGISTRY.acquire(key, loader)
+        if model is not None:
+            setattr(self, attr, model)
+            self.model_keys[attr] = key
+
+    def load_models(self, multi_person=False, compile_mode=DEFAULT_COMPILE_MODE, cpu_backend=DEFAULT_CPU_BACKEND):
+        # 注册表按后端 / 编译方式区分同一 checkpoint 的不同版本 (规则见 model_variant，后台预热共用)
+        body_backend, backend = model_backends(self.device, cpu_backend)
+        body_variant, variant = model_variant(body_backend, compile_mode), model_variant(backend, compile_mode)
+        yolo_path = get_model_path("yolov8n.pt", YOLO_URL)
+        self.acquire_model("yolo", yolo_path, self.device, lambda: load_yolo_model(yolo_path, self.device))
+        hmr2_path = get_model_path("hmr2a_r50_773975.pth", "")
+        self.acquire_model("hmr2", hmr2_path, self.device, lambda: load_hmr2_model(hmr2_path, self.device, compile_mode, body_backend), body_variant)
+        hamer_path = get_model_path("hamer_v1a.pth", "")
+        self.acquire_model("hamer", hamer_path, self.device, lambda: load_hamer_model(hamer_path, self.device, compile_mode, backend), variant)
+        if HAS_MEDIAPIPE:
+            if multi_person: self.acquire_model("mp_hands", MP_HANDS_MULTI_KEY, "cpu", lambda: load_mp_hands(8))
+            else: self.acquire_model("mp_hands", MP_HANDS_KEY, "cpu", load_mp_hands)
+
+    def release_models(self):
+        # 归还引用；空闲模型留在注册表里，超出预算时按 LRU 释放
+        for attr, key in self.model_keys.items():
+            setattr(self, attr, None)
+            MODEL_REGISTRY.release(key)
+        self.model_keys = {}
+
+    def regress_bodies(self, frames, frame_ids, squares):
+        # 一次 HMR2 前向，返回每个裁剪的 {root_correction, body, kps_2d, crop_info}
+        with torch.no_grad():
+            out = self.hmr2(model_inputs(crop_and_normalize(frames, frame_ids, squares), self.autocast_dtype))
+        kps_2d = out['pred_keypoints_2d'].cpu().numpy() if 'pred_keypoints_2d' in out else None
+        kps_3d = out['pred_keypoints_3d'].cpu().numpy() if 'pred_keypoints_3d' in out else None
+        bodies = smpl_to_pose_specs(out['pred_smpl_params']['body_pose'], out['pred_smpl_params']['global_orient'])
+        return [{
+            "root_correction": calc_root_correction_roll_only(kps_3d[k]) if kps_3d is not None else None,
+            "body": bodies[k],
+            # 保存 HMR2 的 2D 关键点与裁剪信息供手部回退使用
+            "kps_2d": kps_2d[k] if kps_2d is not None else None,
+            "crop_info": squares[k],
+        } for k in range(len(squares))]
+
+    def run_body_batch(self, frames, pil_imgs, multi_person=False, person_threshold=0.5):
+        # 所有帧、所有人的裁剪拼成一个 batch，HMR2 只做一次前向
+        # 返回每帧的人物列表：[{id, bbox, conf, root_correction, body, kps_2d, crop_info}, ...]
+        people_per_frame = [[] for _ in pil_imgs]
+        if not self.hmr2: return people_per_frame
+        try:
+            detections = yolo_detect_people(pil_imgs, self.yolo, multi_person, person_threshold)
+            jobs = [(i, box, conf) for i, dets in enumerate(detections) for box, conf in dets]
+            squares = [square_box(box, pil_imgs[i].width, pil_imgs[i].height) for i, box, _ in jobs]
+            results = self.regress_bodies(frames, [i for i, _, _ in jobs], squares)
+            for k, (i, box, conf) in enumerate(jobs):
+                cx, cy, size = squares[k]
+                people_per_frame[i].append({
+                    "id": len(people_per_frame[i]),
+                    "bbox": [float(v) for v in box] if box is not None else [cx - size / 2, cy - size / 2, cx + size / 2, cy + size / 2],
+                    "conf": round(conf, 4),
+                    **results[k],
+                })
+        except Exception as e:
+            print(f"[Laoli3D] Body Error: {e}")
+        return people_per_frame
+
+    def run_hands_batch(self, hand_jobs, frames):
+        # hand_jobs: [(帧序号, 人物序号, {'side','box'}), ...]，所有手部裁剪合并为一次 HaMeR 前向
+        # 返回 [(帧序号, 人物序号, 手指骨骼数据), ...]，由调用方在身体结果就绪后合并
+        hand_results = []
+        if len(hand_jobs) == 0: return hand_results
+        try:
+            # 手部框按长边取正方形，不再拉伸变形
+            squares = [square_box(info['box'], 0, 0, rescale=1.0) for _, _, info in hand_jobs]
+            hand_poses = []
+            with torch.no_grad():
+                hand_input = crop_and_normalize(frames, [i for i, _, _ in hand_jobs], squares)
+                for start in range(0, len(hand_jobs), HAMER_MAX_BATCH):
+                    out = self.hamer(model_inputs(hand_input[start:start + HAMER_MAX_BATCH], self.autocast_dtype))
+                    hand_poses.append(out['pred_mano_params']['hand_pose'])
+            pose_datas = process_hamer_outputs({'hand_pose': torch.cat(hand_poses, dim=0)}, [info['side'] for _, _, info in hand_jobs])
+            hand_results = [(i, p, pose_data) for (i, p, _), pose_data in zip(hand_jobs, pose_datas)]
+        except Exception as e:
+            print(f"[Laoli3D] Hand Error: {e}")
+        return hand_results
+
+    def find_hand_boxes(self, graph, pil_imgs, multi_person=False):
+        hand_jobs = []
+        mp_boxes = graph.result("mediapipe")
+        for i, hands_bboxes in enumerate(mp_boxes):
+            if not multi_person:
+                # 如果 MediaPipe 没找到手，才等待 HMR2 结果并利用手腕坐标生成框
+                if len(hands_bboxes) == 0:
+                    people = graph.result("body")[i]
+                    if people and people[0]["kps_2d"] is not None:
+                        print("[Laoli3D] MP failed. Using HMR2 wrist fallback.")
+                        hands_bboxes = hmr2_wrist_boxes(people[0]["kps_2d"], people[0]["crop_info"], pil_imgs[i].width, pil_imgs[i].height)
+                hand_jobs.extend((i, 0, info) for info in hands_bboxes)
+                continue
+            # 多人模式：需要人物框来分配手，没分到手的人再走手腕回退
+            people = graph.result("body")[i]
+            if not people: continue
+            assigned = assign_hands_to_people(hands_bboxes, people)
+            hand_jobs.extend((i, p_idx, info) for p_idx, info in assigned)
+            with_hands = set(p_idx for p_idx, _ in assigned)
+            for p_idx, person in enumerate(people):
+                if p_idx not in with_hands and person["kps_2d"] is not None:
+                    hand_jobs.extend((i, p_idx, info) for info in hmr2_wrist_boxes(person["kps_2d"], person["crop_info"], pil_imgs[i].width, pil_imgs[i].height))
+        return hand_jobs
+
+    def run_video(self, frames, pil_imgs, multi_person=False, person_threshold=0.5, use_hamer=True, fps=24.0, keyframe_interval=10, motion_threshold=0.02, smooth_min_cutoff=1.0, force_hand_side="Auto"):
+        # 视频模式：逐帧跟踪。只在关键帧 (每 keyframe_interval 帧或轨迹丢失) 跑 YOLO，其余帧沿用上一帧的框；
+        # 框内画面或框的位移超过 motion_threshold 才重新跑 HMR2 / HaMeR，否则复用上一关键帧的姿势。
+        # 有人刷新的帧跑一次 MediaPipe 找手 (与批量模式相同：按人物框分配，没分到手的人走 HMR2 手腕回退)。
+        # 返回动画 JSON：{meta: {type: "Animation", fps, ...}, frames: [单帧姿势, ...]}
+        t_start = time.perf_counter()
+        stats = { "frames": len(pil_imgs), "yolo_frames": 0, "mediapipe_frames": 0, "body_refreshes": 0, "body_reused": 0 }
+        # 单人模式只有一条轨迹，不按 IoU 断开
+        tracker = IoUTracker(iou_threshold=0.3 if multi_person else 0.0)
+        people_per_frame, hand_jobs = [], []
+        for i, pil_img in enumerate(pil_imgs):
+            W, H = pil_img.width, pil_img.height
+            if i % max(1, keyframe_interval) == 0 or not tracker.active():
+                dets = yolo_detect_people([pil_img], self.yolo, multi_person, person_threshold)[0]
+                stats["yolo_frames"] += 1
+                dets = [(box if box is not None else [0, 0, W, H], conf) for box, conf in dets]
+                tracks = tracker.update(dets)
+            else:
+                tracks = tracker.active()
+            squares = [square_box(t.box, W, H) for t in tracks]
+            signatures = crop_patches(frames, [i] * len(tracks), squares, (32, 32)).mean(dim=1) if tracks else []
+            refresh = []
+            for k, track in enumerate(tracks):
+                if track.person is None: refresh.append(k); continue
+                motion = max(float((signatures[k] - track.signature).abs().mean()), box_motion(track.key_box, track.box))
+                if motion > motion_threshold: refresh.append(k)
+            if refresh and self.hmr2:
+                results = self.regress_bodies(frames, [i] * len(refresh), [squares[k] for k in refresh])
+                for k, result in zip(refresh, results):
+                    track = tracks[k]
+                    track.person = result
+                    if result["kps_2d"] is not None:
+                        track.box = keypoints_to_box(result["kps_2d"], result["crop_info"], W, H) or track.box
+                    track.key_box = list(track.box)
+                # 以更新后的框重新取参考画面，后续帧在同一区域内比较
+                key_squares = [square_box(tracks[k].box, W, H) for k in refresh]
+                for k, signature in zip(refresh, crop_patches(frames, [i] * len(refresh), key_squares, (32, 32)).mean(dim=1)):
+                    tracks[k].signature = signature
+            stats["body_refreshes"] += len(refresh); stats["body_reused"] += len(tracks) - len(refresh)
+            people = []
+            for k, track in enumerate(tracks):
+                if track.person is None: continue
+                # 复用帧与关键帧共享同一个 body 字典，关键帧的手部结果合并后自动带到后续帧
+                people.append({ "id": track.id, "bbox": list(track.box), "conf": round(track.conf, 4), "keyframe": k in refresh, **track.person })
+            people_per_frame.append(people)
+            refreshed = [p_idx for p_idx, p in enumerate(people) if p["keyframe"]]
+            if not (use_hamer and self.hamer is not None and refreshed): continue
+            mp_boxes = []
             if self.mp_hands:
-                mp_res = self.mp_hands.process(img_np)
-                if mp_res.multi_hand_landmarks:
-                    h, w, _ = img_np.shape
-                    for idx, hand_landmarks in enumerate(mp_res.multi_hand_landmarks):
-                        lbl_obj = mp_res.multi_handedness[idx].classification[0]
-                        lbl = lbl_obj.label.lower() 
-                        if force_hand_side == "Force Right": lbl = "right"
-                        elif force_hand_side == "Force Left": lbl = "left"
-                        x_min, y_min, x_max, y_max = w, h, 0, 0
-                        for lm in hand_landmarks.landmark:
-                            x_min = min(x_min, lm.x * w); y_min = min(y_min, lm.y * h)
-                            x_max = max(x_max, lm.x * w); y_max = max(y_max, lm.y * h)
-                        margin = max(x_max-x_min, y_max-y_min) * 0.5
-                        box = [max(0, x_min-margin), max(0, y_min-margin), min(w, x_max+margin), min(h, y_max+margin)]
-                        hands_bboxes.append({'side': lbl, 'box': box})
-
-            # ==================== 核心修复：HMR2 辅助回退逻辑 ====================
-            # 如果 MediaPipe 没找到手，利用 HMR2 手腕坐标生成框
-            if len(hands_bboxes) == 0 and hmr2_kps_2d is not None and crop_info is not None:
-                print("[Laoli3D] MP failed. Using HMR2 wrist fallback.")
-                cx_crop, cy_crop, scale_crop = crop_info
-                wrist_indices = {'right': 4, 'left': 7}
-                for side, kidx in wrist_indices.items():
-                    if hmr2_kps_2d.shape[0] > kidx and (hmr2_kps_2d[kidx].shape[0] < 3 or hmr2_kps_2d[kidx][2] > 0.3):
-                        local_x, local_y = hmr2_kps_2d[kidx][:2]
-                        global_x = cx_crop + (local_x / 256.0) * scale_crop
-                        global_y = cy_crop + (local_y / 256.0) * scale_crop
-                        hand_size = scale_crop * 0.15 # 手部框大小估算
-                        x1, y1 = global_x - hand_size, global_y - hand_size
-                        x2, y2 = global_x + hand_size, global_y + hand_size
-                        box = [max(0, x1), max(0, y1), min(pil_img.width, x2), min(pil_img.height, y2)]
-                        hands_bboxes.append({'side': side, 'box': box})
-            # ===============================================================
-
-            if use_hamer and self.hamer is not None and len(hands_bboxes) > 0:
-                for hand_info in hands_bboxes:
-                    try:
-                        box = hand_info['box']
-                        hand_crop = pil_img.crop((box[0], box[1], box[2], box[3]))
-                        transform = transforms.Compose([transforms.Resize((256, 256)), transforms.ToTensor(), transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])])
-                        hand_input = transform(hand_crop).unsqueeze(0).to(self.device).float()
-                        with torch.no_grad():
-                            out = self.hamer({'img': hand_input})
-                            hand_pose_data = process_hamer_output(out['pred_mano_params'], hand_info['side'])
-                            if final_pose["body"]: final_pose["body"].update(hand_pose_data)
-                            else: final_pose["body"] = hand_pose_data
-                    except: pass
-            
-            ui["ai_pose"] = final_pose
-
-            try:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                save_dir = os.path.join(CURRENT_DIR, "pose", "Body", "Default")
+                mp_boxes = detect_hands_mediapipe(np.asarray(pil_img), self.mp_hands, force_hand_side)
+                stats["mediapipe_frames"] += 1
+            # 分给未刷新的人的手丢弃：他们沿用上一关键帧的手部结果
+            assigned = [(p_idx, info) for p_idx, info in assign_hands_to_people(mp_boxes, people) if p_idx in refreshed]
+            hand_jobs.extend((i, p_idx, info) for p_idx, info in assigned)
+            with_hands = set(p_idx for p_idx, _ in assigned)
+            for p_idx in refreshed:
+                person = people[p_idx]
+                if p_idx not in with_hands and person["kps_2d"] is not None:
+                    hand_jobs.extend((i, p_idx, info) for info in hmr2_wrist_boxes(person["kps_2d"], person["crop_info"], W, H))
+
+        if use_hamer and self.hamer is not None:
+            for i, p_idx, hand_pose_data in self.run_hands_batch(hand_jobs, frames):
+                people_per_frame[i][p_idx]["body"].update(hand_pose_data)
+
+        smoothers, anim_frames = {}, []
+        for i, people in enumerate(people_per_frame):
+            t = i / max(fps, 1e-3)
+            frame = { "meta": { "version": "2.0", "source": "Laoli_AI", "type": "Body" }, "body": {}, "hands": {} }
+            smoothed = []
+            for p in people:
+                smoother = smoothers.setdefault(p["id"], QuatSmoother(smooth_min_cutoff))
+                rc = smoother.quat("__root_correction__", p["root_correction"], t) if p["root_correction"] is not None else [0, 0, 0, 1]
+                smoothed.append({ "id": p["id"], "bbox": p["bbox"], "conf": p["conf"], "keyframe": p["keyframe"], "meta": { **frame["meta"], "root_correction": rc }, "body": smoother.bones(p["body"], t), "hands": {} })
+            if smoothed:
+                frame["meta"]["root_correction"] = smoothed[0]["meta"]["root_correction"]
+                frame["body"] = smoothed[0]["body"]
+                if multi_person: frame["people"] = smoothed
+            anim_frames.append(frame)
+        stats["ms"] = round((time.perf_counter() - t_start) * 1000, 1)
+        print(f"[Laoli3D] 视频模式: {stats}")
+        anim = { "meta": { "version": "2.0", "source": "Laoli_AI", "type": "Animation", "fps": fps, "frame_count": len(anim_frames) }, "frames": anim_frames }
+        return anim, stats
+
+    def save_ai_pose(self, final_pose, pil_img, name):
+        try:
+            # 写盘期间告知动作库，监视线程不会把这次保存当成外部改动重复通知
+            with LIBRARY.writing("Body", [("Default", name)]):
+                save_dir = LIBRARY.path("Body", "Default")
                 if not os.path.exists(save_dir): os.makedirs(save_dir, exist_ok=True)
-                json_path = os.path.join(save_dir, f"{timestamp}.json")
+                json_path = os.path.join(save_dir, f"{name}.json")
                 with open(json_path, 'w', encoding='utf-8') as f:
                     json.dump(final_pose, f, ensure_ascii=False, indent=2)
-                img_file = os.path.join(save_dir, f"{timestamp}.png")
+                img_file = os.path.join(save_dir, f"{name}.png")
                 tgt_w, tgt_h = 300, 400
                 scale = min(tgt_w/pil_img.width, tgt_h/pil_img.height)
                 new_w, new_h = int(pil_img.width*scale), int(pil_img.height*scale)
@@ -373,16 +762,73 @@ class Laoli_3DPoseEditor:
                 final_thumb = Image.new("RGB", (tgt_w, tgt_h), (0,0,0))
                 final_thumb.paste(thumb, ((tgt_w-new_w)//2, (tgt_h-new_h)//2))
                 final_thumb.save(img_file)
-            except Exception as e:
-                print(f"[Laoli3D] Auto-save failed: {e}")
-
-            if unload_models:
-                if self.hmr2: del self.hmr2
-                if self.hamer: del self.hamer
-                if self.yolo: del self.yolo
-                if self.mp_hands: del self.mp_hands
-                self.hmr2 = None; self.hamer = None; self.yolo = None; self.mp_hands = None
-                gc.collect(); torch.cuda.empty_cache()
+                LIBRARY.add_pose("Body", "Default", name)
+        except Exception as e:
+            print(f"[Laoli3D] Auto-save failed: {e}")
+
+    def run_editor(self, model_asset, pose_data_json="", light_config_text="", image=None, enable_recognition=True, use_hamer=True, force_hand_side="Auto", model_budget_gb=0.0, multi_person=False, person_threshold=0.5, video_mode=False, fps=24.0, keyframe_interval=10, motion_threshold=0.02, smooth_min_cutoff=1.0, precision="fp32", compile_mode=DEFAULT_COMPILE_MODE, cpu_backend=DEFAULT_CPU_BACKEND):
+        if force_hand_side == "False":
+            force_hand_side = "Auto"
+            
+        ui = { "model": model_asset, "ai_pose": None, "manual_pose": pose_data_json }
+        
+        if image is not None and enable_recognition and ensure_ai_dependencies():
+            MODEL_REGISTRY.set_budget(model_budget_gb)
+            self.autocast_dtype = resolve_precision(precision, self.device)
+            # 取模型之后的加载 / 推理 / 自动保存无论是否出错都要归还引用，否则这些模型无法再按预算释放
+            try:
+                self.load_models(multi_person, compile_mode, cpu_backend)
+                # 批量模式：IMAGE 的每一帧都输出一个姿势
+                frames_np = (255. * image.cpu().numpy()).astype(np.uint8)
+                pil_imgs = [Image.fromarray(f) for f in frames_np]
+                frames = frames_to_device(image, self.device)
+                if video_mode and len(pil_imgs) > 1:
+                    # 视频模式只输出一个动画 JSON，前端 retargetPose 逐帧播放
+                    try:
+                        anim, stats = self.run_video(frames, pil_imgs, multi_person, person_threshold, use_hamer, fps, keyframe_interval, motion_threshold, smooth_min_cutoff, force_hand_side)
+                        ui["ai_pose"] = anim; ui["timings"] = { "video": stats }
+                        self.save_ai_pose(anim, pil_imgs[0], datetime.now().strftime("%Y%m%d_%H%M%S") + "_anim")
+                    except Exception as e:
+                        print(f"[Laoli3D] Video Error: {e}")
+                else:
+                    final_poses = [{ "meta": { "version": "2.0", "source": "Laoli_AI", "type": "Body" }, "body": {}, "hands": {} } for _ in pil_imgs]
+                    # 身体分支 (YOLO→HMR2) 与 MediaPipe 手部检测并行；只有手腕回退路径需要等待 HMR2
+                    graph = StageGraph()
+                    graph.add("body", lambda g: self.run_body_batch(frames, pil_imgs, multi_person, person_threshold))
+                    graph.add("mediapipe", lambda g: [detect_hands_mediapipe(f, self.mp_hands, force_hand_side) if self.mp_hands else [] for f in frames_np])
+                    graph.add("hand_boxes", lambda g: self.find_hand_boxes(g, pil_imgs, multi_person))
+                    graph.add("hamer", lambda g: self.run_hands_batch(g.result("hand_boxes"), frames) if use_hamer and self.hamer is not None else [])
+                    try:
+                        stage_results = graph.run()
+                        people_per_frame = stage_results["body"]
+                        for i, p_idx, hand_pose_data in stage_results["hamer"]:
+                            if people_per_frame[i]: people_per_frame[i][p_idx]["body"].update(hand_pose_data)
+                            else: final_poses[i]["body"].update(hand_pose_data)
+                        for final_pose, people in zip(final_poses, people_per_frame):
+                            if not people: continue
+                            # 主姿势取置信度最高的人；多人模式下每个人都带 id 和 bbox，可分别驱动场景里的角色
+                            if people[0]["root_correction"] is not None: final_pose["meta"]["root_correction"] = people[0]["root_correction"]
+                            final_pose["body"] = people[0]["body"]
+                            if multi_person:
+                                final_pose["people"] = [{
+                                    "id": p["id"], "bbox": p["bbox"], "conf": p["conf"],
+                                    "meta": { **final_pose["meta"], "root_correction": p["root_correction"] or [0, 0, 0, 1] },
+                                    "body": p["body"], "hands": {},
+                                } for p in people]
+                    except Exception as e:
+                        print(f"[Laoli3D] Pipeline Error: {e}")
+                    ui["timings"] = graph.timings
+                    print("[Laoli3D] 阶段耗时(ms): " + ", ".join(f"{k}={v.get('busy_ms', v.get('ms'))}" for k, v in graph.timings.items()))
+
+                    ui["ai_pose"] = final_poses[0]
+                    if len(final_poses) > 1: ui["ai_poses"] = final_poses
+
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    for i, (final_pose, pil_img) in enumerate(zip(final_poses, pil_imgs)):
+                        self.save_ai_pose(final_pose, pil_img, timestamp if len(final_poses) == 1 else f"{timestamp}_{i:03d}")
+            finally:
+                self.release_models()
+                MODEL_REGISTRY.set_budget(model_budget_gb)
 
         empty_img = torch.zeros((1, 512, 512, 3))
         empty_mask = torch.zeros((1, 512, 512), dtype=torch.float32)
@@ -0,0 +1,114 @@
+import os
+import shutil
+import inspect
+import importlib.util
+import threading
+import numpy as np
+import torch
+from torch import nn
+from .laoli_export import CACHE_DIR, PARAM_KEYS
+
+# ================= ONNX Runtime CPU 后端 =================
+# 没有 GPU 时 PyTorch 跑 ViT-H 很慢：把 backbone + 回归头导出为 ONNX (可选 int8 动态量化)，交给 ONNX Runtime
+# 多线程执行。SMPL/MANO 层、相机与投影仍在 Python 里走原来的 forward_step，输出格式与 PyTorch 后端一致。
+
+# torch-int8 只作用于 HaMeR 主干 (静态量化，见 laoli_quant.py)，HMR2 仍为 fp32 PyTorch
+CPU_BACKENDS = ["onnx", "onnx-int8", "torch", "torch-int8"]
+# intra-op 线程数，0 = 由 ONNX Runtime 按物理核数决定
+ORT_THREADS = int(os.environ.get("LAOLI_ORT_THREADS", "0") or 0)
+_EXPORT_LOCK = threading.Lock()
+
+# onnxruntime 只在真正创建会话时导入
+HAS_ORT = importlib.util.find_spec("onnxruntime") is not None
+
+class _Regressor(nn.Module):
+    # 导出用：图像 -> (旋转矩阵参数..., pred_cam)，参数顺序同 PARAM_KEYS
+    def __init__(self, model):
+        super().__init__()
+        self.backbone = model.backbone
+        self.head = model.smpl_head if model.KIND == "hmr2" else model.mano_head
+        self.param_names = PARAM_KEYS[model.KIND][1]
+
+    def forward(self, img):
+        params, pred_cam, _ = self.head(self.backbone(img))
+        return tuple(params[k] for k in self.param_names) + (pred_cam,)
+
+class OnnxRegressor(nn.Module):
+    # 顶替 backbone + head：推理模型的 backbone 换成 Identity，forward_step 调用 head(x) 时在这里跑 ONNX Runtime
+    def __init__(self, session, param_names):
+        super().__init__()
+        self.session = session
+        self.param_names = param_names
+        self.per_sample = False
+
+    def run(self, img):
+        return self.session.run(None, {"img": img})
+
+    def forward(self, x):
+        img = x.detach().float().contiguous().cpu().numpy()
+        if not self.per_sample:
+            try:
+                outs = self.run(img)
+            except Exception:
+                # 个别算子导出时把 batch 固化成了常量：退回逐张推理
+                if len(img) == 1: raise
+                print("[Laoli3D] ONNX 图不支持动态 batch，改为逐张推理")
+                self.per_sample = True
+        if self.per_sample:
+            outs = [np.concatenate(o) for o in zip(*(self.run(img[i:i + 1]) for i in range(len(img))))]
+        outs = [torch.from_numpy(o) for o in outs]
+        return dict(zip(self.param_names, outs[:-1])), outs[-1], None
+
+def export_onnx(model, input_hw, quantize=False):
+    # 按 checkpoint 哈希缓存在 models/cache/<kind>-<hash>-onnx/ 下；ViT-H 超过 2GB，权重以外部数据文件存放，
+    # 所以每个模型一个目录，导出到临时目录后整体改名
+    folder = os.path.join(CACHE_DIR, f"{model.KIND}-{model.cache_digest}-onnx")
+    fp32_path = os.path.join(folder, "model.onnx")
+    int8_path = os.path.join(folder, "model-int8.onnx")
+    with _EXPORT_LOCK:
+        if not os.path.exists(fp32_path):
+            tmp = folder + ".tmp"
+            shutil.rmtree(tmp, ignore_errors=True); os.makedirs(tmp)
+            regressor = _Regressor(model).eval()
+            # 导出时注意力走 math 实现 (MatMul + Softmax)，各版本 opset 都支持
+            impls = {m: m.attn_impl for m in regressor.modules() if hasattr(m, "attn_impl")}
+            for m in impls: m.attn_impl = "math"
+            names = list(regressor.param_names) + ["pred_cam"]
+            extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+            try:
+                with torch.no_grad():
+                    torch.onnx.export(regressor, (torch.zeros(1, 3, *input_hw),), os.path.join(tmp, "model.onnx"), input_names=["img"], output_names=names,
+                                      dynamic_axes={n: {0: "batch"} for n in ["img"] + names}, opset_version=17, **extra)
+            finally:
+                for m, impl in impls.items(): m.attn_impl = impl
+            shutil.rmtree(folder, ignore_errors=True)
+            os.replace(tmp, folder)
+            print(f"[Laoli3D] 已导出 ONNX: {os.path.basename(folder)}")
+        if quantize and not os.path.exists(int8_path):
+            # 动态量化：Linear / MatMul 权重离线转 int8，激活在运行时按 batch 量化，不需要校准数据
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            try:
+                quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8, use_external_data_format=True)
+            except Exception:
+                if os.path.exists(int8_path): os.remove(int8_path)
+                raise
+            print(f"[Laoli3D] 已生成 int8 量化模型: {os.path.basename(folder)}")
+    return int8_path if quantize else fp32_path
+
+def create_session(path):
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if ORT_THREADS > 0: opts.intra_op_num_threads = ORT_THREADS
+    return ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+
+def load_onnx_model(model, input_hw, quantize=False):
+    # model: load_inference_model 得到的推理模型 (需要 cache_digest)；返回同类型、backbone + head 换成 ORT 的模型
+    if not HAS_ORT: raise ImportError("未安装 onnxruntime")
+    path = export_onnx(model, input_hw, quantize)
+    regressor = OnnxRegressor(create_session(path), PARAM_KEYS[model.KIND][1])
+    body_model = model.smpl if model.KIND == "hmr2" else model.mano
+    onnx_model = type(model)(model.cfg, nn.Identity(), regressor, body_model).eval()
+    onnx_model.cache_digest = model.cache_digest
+    return onnx_model
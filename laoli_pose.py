@@ -0,0 +1,70 @@
+import torch
+
+# ================= 骨骼名称表 (只构建一次) =================
+SMPL_BONE_NAMES = ["Hips", "LeftUpLeg", "RightUpLeg", "Spine", "LeftLeg", "RightLeg", "Spine1", "LeftFoot", "RightFoot", "Spine2", "LeftToeBase", "RightToeBase", "Neck", "LeftShoulder", "RightShoulder", "Head", "LeftArm", "RightArm", "LeftForeArm", "RightForeArm", "LeftHand", "RightHand"]
+MANO_TO_MIXAMO = [["Index1", "Index2", "Index3"], ["Middle1", "Middle2", "Middle3"], ["Pinky1", "Pinky2", "Pinky3"], ["Ring1", "Ring2", "Ring3"], ["Thumb1", "Thumb2", "Thumb3"]]
+MANO_BONE_NAMES = [bone for finger in MANO_TO_MIXAMO for bone in finger]
+HAND_BONE_NAMES = { "right": ["RightHand" + b for b in MANO_BONE_NAMES], "left": ["LeftHand" + b for b in MANO_BONE_NAMES] }
+
+# ================= 向量化旋转转换 =================
+def axis_angle_to_rotmat(aa):
+    # Rodrigues 公式，(..., 3) -> (..., 3, 3)
+    angle = aa.norm(dim=-1, keepdim=True).clamp(min=1e-8)
+    axis = aa / angle
+    x, y, z = axis.unbind(-1)
+    zero = torch.zeros_like(x)
+    K = torch.stack([zero, -z, y, z, zero, -x, -y, x, zero], dim=-1).reshape(aa.shape[:-1] + (3, 3))
+    s = torch.sin(angle)[..., None]; c = torch.cos(angle)[..., None]
+    eye = torch.eye(3, dtype=aa.dtype, device=aa.device).expand_as(K)
+    return eye + s * K + (1 - c) * (K @ K)
+
+def rotmat_to_quat(mats):
+    # (..., 3, 3) -> (..., 4)，输出 [x, y, z, w] 与 scipy as_quat / three.js toArray 顺序一致。
+    # 按 trace 与对角元中最大者选分支 (同 scipy)，整批一次完成，可直接在 GPU 上计算。
+    m = torch.as_tensor(mats)
+    m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+    m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+    m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+    q_abs = torch.sqrt(torch.clamp(torch.stack([
+        1.0 + m00 + m11 + m22,
+        1.0 + m00 - m11 - m22,
+        1.0 - m00 + m11 - m22,
+        1.0 - m00 - m11 + m22,
+    ], dim=-1), min=0.0))
+    # 每行是一个候选 (w, x, y, z)，按各自最大分量缩放
+    candidates = torch.stack([
+        torch.stack([q_abs[..., 0] ** 2, m21 - m12, m02 - m20, m10 - m01], dim=-1),
+        torch.stack([m21 - m12, q_abs[..., 1] ** 2, m10 + m01, m02 + m20], dim=-1),
+        torch.stack([m02 - m20, m10 + m01, q_abs[..., 2] ** 2, m12 + m21], dim=-1),
+        torch.stack([m10 - m01, m20 + m02, m21 + m12, q_abs[..., 3] ** 2], dim=-1),
+    ], dim=-2) / (2.0 * q_abs[..., None].clamp(min=0.1))
+    best = q_abs.argmax(dim=-1)
+    wxyz = torch.gather(candidates, -2, best[..., None, None].expand(best.shape + (1, 4))).squeeze(-2)
+    wxyz = wxyz / wxyz.norm(dim=-1, keepdim=True).clamp(min=1e-8)
+    return torch.cat([wxyz[..., 1:], wxyz[..., :1]], dim=-1)
+
+def as_rotmats(pose, num_joints):
+    # 接受旋转矩阵或轴角 (numpy / tensor，单帧或批量)，统一为 (N, J, 3, 3)
+    pose = torch.as_tensor(pose)
+    if pose.shape[-2:] != (3, 3):
+        pose = axis_angle_to_rotmat(pose.reshape(-1, 3))
+    return pose.reshape(-1, num_joints, 3, 3)
+
+def quats_to_bone_dicts(quats, names_per_item):
+    # 一次 .cpu()，再按名称表展开成 {bone: {"q": [...]}}
+    quats = quats.detach().cpu().tolist()
+    return [{ name: {"q": q} for name, q in zip(names, item) } for names, item in zip(names_per_item, quats)]
+
+def smpl_to_pose_specs(body_pose, global_orient):
+    # body_pose: (N, 23, 3, 3) 或 (23, 3, 3) / 轴角；global_orient: (N, 1, 3, 3) 或 (3, 3) / (3,)
+    bp_mat = as_rotmats(body_pose, 23)
+    go_mat = as_rotmats(global_orient, 1).to(bp_mat.dtype)
+    full_pose = torch.cat([go_mat, bp_mat], dim=1)[:, :len(SMPL_BONE_NAMES)]
+    quats = rotmat_to_quat(full_pose.float())
+    return quats_to_bone_dicts(quats, [SMPL_BONE_NAMES] * quats.shape[0])
+
+def mano_to_pose_specs(hand_pose, sides):
+    # hand_pose: (N, 15, 3, 3) 或轴角 (N, 45)；sides: 每只手 "right" / "left"
+    hp_mat = as_rotmats(hand_pose, 15)
+    quats = rotmat_to_quat(hp_mat.float())
+    return quats_to_bone_dicts(quats, [HAND_BONE_NAMES["right" if side == "right" else "left"] for side in sides])
@@ -0,0 +1,79 @@
+import os
+import warnings
+import torch
+from torch import nn
+from torch.ao.quantization import QuantStub, DeQuantStub, get_default_qconfig, prepare, convert
+from .laoli_export import CACHE_DIR
+
+# ================= HaMeR 主干 int8 静态量化 (CPU) =================
+# ViT-H 的 32 个 Block 里，Mlp.fc1/fc2 与 Attention.qkv/proj 这四个 Linear 占了绝大部分计算和权重。
+# 每个 Linear 包在 QuantStub / DeQuantStub 之间单独量化：权重 int8 (按通道)，激活 int8 (按张量，
+# 由校准集统计范围)，LayerNorm / GELU / Softmax 等仍为 fp32。校准与评估见 tools/quantize_hamer.py，
+# 结果按 checkpoint 哈希缓存，节点加载时只读缓存。
+
+QUANT_TARGETS = ("mlp.fc1", "mlp.fc2", "attn.qkv", "attn.proj")
+
+def quant_engine():
+    engines = torch.backends.quantized.supported_engines
+    for name in ("x86", "fbgemm", "qnnpack"):
+        if name in engines: return name
+    raise RuntimeError("当前 PyTorch 不支持 int8 量化")
+
+class QuantLinear(nn.Module):
+    # 只有中间的 Linear 走 int8，进出仍是 fp32；.float() 保证 autocast 下也以 fp32 进入量化
+    def __init__(self, linear):
+        super().__init__()
+        self.quant = QuantStub()
+        self.linear = linear
+        self.dequant = DeQuantStub()
+
+    def forward(self, x):
+        return self.dequant(self.linear(self.quant(x.float())))
+
+def prepare_backbone(backbone):
+    # 原地替换目标 Linear 并插入 observer；返回插入的层数
+    torch.backends.quantized.engine = quant_engine()
+    qconfig = get_default_qconfig(torch.backends.quantized.engine)
+    count = 0
+    for block in backbone.blocks:
+        for target in QUANT_TARGETS:
+            parent_name, attr = target.split(".")
+            parent = getattr(block, parent_name)
+            layer = QuantLinear(getattr(parent, attr))
+            layer.qconfig = qconfig
+            setattr(parent, attr, layer)
+            count += 1
+    backbone.eval()  # ViT.train() 没有返回值，不能链式调用
+    prepare(backbone, inplace=True)
+    return count
+
+def quantize_backbone(backbone, batches):
+    # batches: 可迭代的 (N, 3, 256, 192) 归一化裁剪，用于统计激活范围
+    prepare_backbone(backbone)
+    with torch.no_grad():
+        for img in batches: backbone(img)
+    convert(backbone, inplace=True)
+    return backbone
+
+def int8_cache_path(model):
+    return os.path.join(CACHE_DIR, f"{model.KIND}-{model.cache_digest}-int8-{quant_engine()}.pt")
+
+def save_quantized(model):
+    path = int8_cache_path(model)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    torch.save(model.backbone.state_dict(), path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+def load_quantized_model(model):
+    # model: CPU 上的 fp32 推理模型 (需要 cache_digest)；按缓存里的校准结果把主干换成 int8
+    path = int8_cache_path(model)
+    if not os.path.exists(path): raise FileNotFoundError(f"没有量化缓存，请先运行 tools/quantize_hamer.py 校准: {os.path.basename(path)}")
+    # 先搭出与校准后相同的量化结构 (observer 未运行会告警，忽略)，再载入缓存的 scale / zero_point 与 int8 权重
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        prepare_backbone(model.backbone)
+        convert(model.backbone, inplace=True)
+    model.backbone.load_state_dict(torch.load(path, map_location="cpu"))
+    model.eval()
+    return model
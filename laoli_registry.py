@@ -0,0 +1,94 @@
+import os
+import gc
+import threading
+from collections import OrderedDict
+import torch
+
+# ================= 进程级模型注册表 =================
+# 同一工作流里的多个编辑器节点共用同一份 HMR2 / HaMeR / YOLO / MediaPipe，
+# 以 (checkpoint 路径, device, dtype) 为键，引用计数 + LRU 按显存/内存预算淘汰空闲模型。
+
+def model_key(path, device, dtype=torch.float32, variant="none"):
+    # variant 区分同一 checkpoint 的不同形态 (编译方式 / ONNX 后端)
+    name = os.path.abspath(path) if path and os.path.exists(path) else str(path)
+    return (name, str(device), str(dtype).replace("torch.", "")) + (() if variant == "none" else (variant,))
+
+def model_nbytes(model):
+    # 估算模型占用：参数 + buffer；YOLO 这类包装对象取其内部的 nn.Module
+    module = model if isinstance(model, torch.nn.Module) else getattr(model, "model", None)
+    if not isinstance(module, torch.nn.Module): return 0
+    total = sum(p.numel() * p.element_size() for p in module.parameters())
+    total += sum(b.numel() * b.element_size() for b in module.buffers())
+    return total
+
+class _Entry:
+    __slots__ = ("model", "nbytes", "refs")
+    def __init__(self, model, nbytes):
+        self.model = model
+        self.nbytes = nbytes
+        self.refs = 0
+
+class ModelRegistry:
+    def __init__(self, budget_gb=0.0):
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self._entries = OrderedDict()
+        self.budget_bytes = int(budget_gb * (1 << 30))
+
+    def set_budget(self, budget_gb):
+        # 0 表示不限制；预算按 device 分别计算（cuda:0 / cpu 各自一份）
+        with self._lock:
+            self.budget_bytes = int(max(0.0, budget_gb) * (1 << 30))
+        self.evict()
+
+    def acquire(self, key, loader):
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # 加载在 key 级锁内进行：同一模型只加载一次，不同模型可并行加载
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refs += 1
+                    self._entries.move_to_end(key)
+                    return entry.model
+            model = loader()
+            if model is None: return None
+            with self._lock:
+                entry = _Entry(model, model_nbytes(model))
+                entry.refs = 1
+                self._entries[key] = entry
+        self.evict()
+        return model
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refs > 0: entry.refs -= 1
+        self.evict()
+
+    def evict(self):
+        freed = False
+        with self._lock:
+            if self.budget_bytes <= 0: return
+            usage = {}
+            for key, entry in self._entries.items():
+                usage[key[1]] = usage.get(key[1], 0) + entry.nbytes
+            # OrderedDict 头部是最久未使用的模型
+            for key in list(self._entries.keys()):
+                entry = self._entries[key]
+                if usage[key[1]] <= self.budget_bytes: continue
+                if entry.refs > 0: continue
+                usage[key[1]] -= entry.nbytes
+                del self._entries[key]
+                freed = True
+                print(f"[Laoli3D] 模型缓存超出预算，释放: {os.path.basename(key[0])} ({key[1]})")
+        if freed:
+            gc.collect()
+            if torch.cuda.is_available(): torch.cuda.empty_cache()
+
+    def stats(self):
+        with self._lock:
+            return [{"model": os.path.basename(k[0]), "device": k[1], "dtype": k[2], "mb": round(e.nbytes / (1 << 20), 1), "refs": e.refs} for k, e in self._entries.items()]
+
+MODEL_REGISTRY = ModelRegistry(float(os.environ.get("LAOLI_MODEL_BUDGET_GB", "0") or 0))
@@ -0,0 +1,202 @@
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .laoli_pose import SMPL_BONE_NAMES, MANO_BONE_NAMES
+from .laoli_library import LIBRARY, LIB_TYPES, IO_WORKERS
+
+# ================= 动作库相似姿势检索 =================
+# 每个动作按固定骨骼顺序把各骨骼的局部四元数 (body[bone].q) 转成旋转矩阵的前两列 (6 维，与四元数正负号无关)，
+# 拼成 (骨骼数, 6) 的向量；缺失的骨骼用 mask 标出，距离只在查询与候选都有的骨骼上取平均。
+# 索引是常驻内存的 NumPy 数组，动作库变化时 (LIBRARY.listeners) 只重新读取变动分类里 mtime 改变的文件。
+#   body : 全身 22 根骨骼 (同 SMPL 输出)
+#   hands: 手指 15 根骨骼；手势库不区分左右手 (编辑器应用手势时可套到任一只手)，全身库按左右手分别比较
+#   mirror: 查询左右镜像后的姿势；手指按编辑器应用手势时的约定 (换边、四元数不变)，
+#           躯干中轴骨骼关于矢状面镜像 (x, -y, -z, w)
+# AI 识别保存的动作 (source = Laoli_AI) 与编辑器骨骼的局部坐标系不同，只和同来源的动作比较。
+
+FINGER_BONES = [f"Hand{b}" for b in MANO_BONE_NAMES]
+BONES = {
+    "body": SMPL_BONE_NAMES,
+    "hands": [side + b for side in ("Left", "Right") for b in FINGER_BONES],
+    "hands_any": FINGER_BONES,
+}
+CENTER_BONES = {"Hips", "Spine", "Spine1", "Spine2", "Neck", "Head"}
+MAX_K = 100
+_PREFIX = re.compile(r"^mixamorig\d*[_\-:]*", re.IGNORECASE)
+
+def bone_key(name):
+    # "mixamorig:LeftArm" / "mixamorig1LeftArm" -> "LeftArm"
+    return _PREFIX.sub("", str(name).strip().split(":")[-1])
+
+def source_of(pose):
+    meta = pose.get("meta") or {}
+    return "ai" if meta.get("source") == "Laoli_AI" else "native"
+
+def quats_to_6d(q):
+    # (..., 4) [x, y, z, w] -> 旋转矩阵前两列 (..., 6)
+    q = np.asarray(q, dtype=np.float64)
+    x, y, z, w = np.moveaxis(q / np.maximum(np.linalg.norm(q, axis=-1, keepdims=True), 1e-8), -1, 0)
+    return np.stack([1 - 2 * (y * y + z * z), 2 * (x * y + w * z), 2 * (x * z - w * y),
+                     2 * (x * y - w * z), 1 - 2 * (x * x + z * z), 2 * (y * z + w * x)], axis=-1).astype(np.float32)
+
+def bone_quats(pose):
+    out = {}
+    for name, value in (pose.get("body") or {}).items():
+        q = value.get("q") if isinstance(value, dict) else None
+        if q is not None and len(q) == 4: out[bone_key(name)] = q
+    return out
+
+def mirror_quats(quats, source):
+    # 左右骨骼互换；中轴骨骼 (AI 来源的坐标系下全部骨骼) 关于矢状面镜像
+    out = {}
+    for name, (x, y, z, w) in quats.items():
+        swapped = name.replace("Left", "\0").replace("Right", "Left").replace("\0", "Right")
+        out[swapped] = [x, -y, -z, w] if source == "ai" or name in CENTER_BONES else [x, y, z, w]
+    return out
+
+def side_fingers(quats, side):
+    # 取一只手的手指，去掉 Left / Right 前缀
+    return {name[len(side):]: q for name, q in quats.items() if name.startswith(side + "Hand")}
+
+def embed(quats, bones):
+    mask = np.array([bone in quats for bone in bones], dtype=bool)
+    q = np.array([quats.get(bone, (0.0, 0.0, 0.0, 1.0)) for bone in bones], dtype=np.float64)
+    return quats_to_6d(q), mask
+
+class _Table:
+    # 一种骨骼组合的嵌入表：按容量倍增的数组 + 键到行号的映射，删除时与最后一行交换
+    def __init__(self, num_bones):
+        self.keys, self.rows = [], {}
+        self.sources = np.zeros(0, dtype=bool)
+        self.emb = np.zeros((0, num_bones, 6), dtype=np.float32)
+        self.mask = np.zeros((0, num_bones), dtype=bool)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def put(self, key, is_ai, emb, mask):
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.emb):
+                grow = max(64, row)
+                self.emb = np.concatenate([self.emb, np.zeros((grow,) + self.emb.shape[1:], np.float32)])
+                self.mask = np.concatenate([self.mask, np.zeros((grow,) + self.mask.shape[1:], bool)])
+                self.sources = np.concatenate([self.sources, np.zeros(grow, bool)])
+            self.keys.append(key); self.rows[key] = row
+        self.emb[row], self.mask[row], self.sources[row] = emb, mask, is_ai
+
+    def remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is None: return
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self.keys[row] = moved; self.rows[moved] = row
+            self.emb[row], self.mask[row], self.sources[row] = self.emb[last], self.mask[last], self.sources[last]
+        self.keys.pop()
+
+    def search(self, emb, mask, is_ai, k):
+        n = len(self.keys)
+        both = self.mask[:n] & mask & (self.sources[:n] == is_ai)[:, None]
+        count = both.sum(axis=1)
+        dist = (((self.emb[:n] - emb) ** 2).sum(axis=-1) * both).sum(axis=1) / np.maximum(count, 1)
+        # 与查询共有的骨骼不到一半的动作不参与排序
+        dist[count * 2 < mask.sum()] = np.inf
+        k = min(k, int(np.isfinite(dist).sum()))
+        if k <= 0: return []
+        top = np.argpartition(dist, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(dist[top])][:k]
+        return [(self.keys[i], float(dist[i])) for i in top]
+
+class PoseSearchIndex:
+    def __init__(self, library=LIBRARY):
+        self.library = library
+        self._lock = threading.Lock()
+        # 变化通知可能在对账时 (update 持有 _lock 期间) 到来，脏标记单独加锁
+        self._dirty_lock = threading.Lock()
+        self._tables = {}       # (lib_type, 骨骼组合) -> _Table
+        self._meta = {}         # (lib_type, 分类, 名称) -> (json mtime, png mtime)
+        self._dirty = {t: None for t in LIB_TYPES}   # None = 整个库待建；set = 待更新的分类
+        library.listeners.append(self.on_library_changed)
+
+    def on_library_changed(self, lib_type, categories):
+        with self._dirty_lock:
+            if self._dirty.get(lib_type, ()) is not None: self._dirty.setdefault(lib_type, set()).update(categories)
+
+    def table(self, lib_type, bones):
+        key = (lib_type, bones)
+        if key not in self._tables: self._tables[key] = _Table(len(BONES[bones]))
+        return self._tables[key]
+
+    def _load(self, lib_type, category, name):
+        try:
+            with open(self.library.path(lib_type, category, name, ".json"), "r", encoding="utf-8") as f: pose = json.load(f)
+        except Exception:
+            return None
+        return pose if isinstance(pose, dict) else None
+
+    def _add(self, lib_type, key, pose):
+        quats, is_ai = bone_quats(pose), source_of(pose) == "ai"
+        if lib_type == "Hands":
+            side = (pose.get("meta") or {}).get("side", "Right")
+            self.table(lib_type, "hands_any").put(key, is_ai, *embed(side_fingers(quats, side), BONES["hands_any"]))
+        else:
+            for bones in ("body", "hands"):
+                self.table(lib_type, bones).put(key, is_ai, *embed(quats, BONES[bones]))
+
+    def _remove(self, lib_type, key):
+        for (t, _), table in self._tables.items():
+            if t == lib_type: table.remove(key)
+        self._meta.pop((lib_type,) + key, None)
+
+    def update(self, lib_type):
+        # 在调用线程里完成增量更新：只读取新增或 mtime 变化的文件 (各文件并行读取)
+        with self._lock:
+            with self._dirty_lock:
+                dirty = self._dirty.get(lib_type, set())
+                self._dirty[lib_type] = set()
+            if dirty is not None and not dirty: return
+            rows = self.library.entries(lib_type, dirty)
+            current = {(c, n): (m, t) for c, n, m, t in rows}
+            stale = [k for k in self._meta if k[0] == lib_type and (dirty is None or k[1] in dirty) and k[1:] not in current]
+            for k in stale: self._remove(lib_type, k[1:])
+            todo = [k for k, v in current.items() if self._meta.get((lib_type,) + k) != v]
+            with ThreadPoolExecutor(max_workers=IO_WORKERS) as pool:
+                poses = list(pool.map(lambda k: self._load(lib_type, *k), todo))
+            for key, pose in zip(todo, poses):
+                if pose is None: self._remove(lib_type, key); continue
+                self._add(lib_type, key, pose)
+                self._meta[(lib_type,) + key] = current[key]
+
+    def search(self, lib_type, pose, mode="body", mirror=False, side=None, k=12):
+        # 返回 {"results": [...], "ms": ...}；结果带缩略图 / 动作数据 URL (同 get_library) 与平均 6D 距离
+        t = time.perf_counter()
+        if lib_type not in LIB_TYPES: raise ValueError(f"未知的动作库: {lib_type!r}")
+        if mode not in ("body", "hands"): raise ValueError(f"未知的检索模式: {mode!r}")
+        if not isinstance(pose, dict): raise ValueError("缺少查询姿势")
+        self.update(lib_type)
+        quats, source = bone_quats(pose), source_of(pose)
+        if mirror: quats = mirror_quats(quats, source)
+        if lib_type == "Hands":
+            # 手势库只按手指比较；镜像时上面已左右互换，取到的是另一只手
+            side = side or (pose.get("meta") or {}).get("side") or "Right"
+            bones, quats = "hands_any", side_fingers(quats, side)
+        else:
+            bones = mode
+        emb, mask = embed(quats, BONES[bones])
+        if not mask.any(): raise ValueError("查询姿势里没有可比较的骨骼")
+        with self._lock:
+            hits = self.table(lib_type, bones).search(emb, mask, source == "ai", max(1, min(int(k), MAX_K)))
+            meta = {key: self._meta[(lib_type,) + key] for key, _ in hits}
+        results = []
+        for (category, name), dist in hits:
+            item = self.library.entry(lib_type, category, name, *meta[(category, name)])
+            item.update({"category": category, "distance": round(dist, 5)})
+            results.append(item)
+        return {"results": results, "ms": round((time.perf_counter() - t) * 1000, 2)}
+
+SEARCH_INDEX = PoseSearchIndex()
@@ -0,0 +1,121 @@
+import math
+import numpy as np
+
+# ================= 视频模式：跟踪 + 平滑 =================
+# 逐帧保持人物轨迹：大部分帧沿用上一帧的框跳过 YOLO，画面变化不大时直接复用上一关键帧的姿势，
+# 输出前对每根骨骼的四元数做 One-Euro 滤波。
+
+def box_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def box_motion(prev_box, box):
+    # 框中心位移与尺度变化，按框的大小归一化
+    pw, ph = prev_box[2] - prev_box[0], prev_box[3] - prev_box[1]
+    w, h = box[2] - box[0], box[3] - box[1]
+    size = max(pw, ph, 1e-6)
+    shift = math.hypot((box[0] + box[2] - prev_box[0] - prev_box[2]) / 2, (box[1] + box[3] - prev_box[1] - prev_box[3]) / 2) / size
+    scale = abs(math.log(max(w, h, 1e-6) / size))
+    return max(shift, scale)
+
+def keypoints_to_box(kps_2d, crop_info, img_w, img_h, pad=0.15):
+    # HMR2 关键点 (裁剪中心为原点、按边长归一化) 映射回原图，外扩后作为下一帧的跟踪框
+    cx, cy, size = crop_info
+    pts = np.asarray(kps_2d)[:, :2] * size + np.array([cx, cy])
+    x1, y1 = pts.min(axis=0); x2, y2 = pts.max(axis=0)
+    w, h = x2 - x1, y2 - y1
+    if w < 2 or h < 2: return None
+    x1, y1, x2, y2 = x1 - w * pad, y1 - h * pad, x2 + w * pad, y2 + h * pad
+    return [float(max(0, x1)), float(max(0, y1)), float(min(img_w, x2)), float(min(img_h, y2))]
+
+class Track:
+    __slots__ = ("id", "box", "conf", "misses", "person", "key_box", "signature")
+    def __init__(self, track_id, box, conf):
+        self.id = track_id
+        self.box = [float(v) for v in box]
+        self.conf = conf
+        self.misses = 0
+        self.person = None     # 最近一次 HMR2 结果 (关键帧)
+        self.key_box = None    # 关键帧时的框
+        self.signature = None  # 关键帧时框内的低分辨率画面，用于判断是否需要重新推理
+
+class IoUTracker:
+    def __init__(self, iou_threshold=0.3, max_misses=2):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self.next_id = 0
+
+    def update(self, detections):
+        # detections: [(box, conf), ...]；按 IoU 从大到小贪心匹配，未匹配的检测新建轨迹
+        pairs = sorted(((box_iou(t.box, box), ti, di) for ti, t in enumerate(self.tracks) for di, (box, _) in enumerate(detections)), reverse=True)
+        used_t, used_d, matched = set(), set(), {}
+        for iou, ti, di in pairs:
+            if iou < self.iou_threshold: break
+            if ti in used_t or di in used_d: continue
+            used_t.add(ti); used_d.add(di); matched[di] = self.tracks[ti]
+        for ti, track in enumerate(self.tracks):
+            track.misses = 0 if ti in used_t else track.misses + 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        assigned = []
+        for di, (box, conf) in enumerate(detections):
+            track = matched.get(di)
+            if track is None:
+                track = Track(self.next_id, box, conf); self.next_id += 1
+                self.tracks.append(track)
+            track.box = [float(v) for v in box]; track.conf = conf
+            assigned.append(track)
+        return assigned
+
+    def active(self):
+        return [t for t in self.tracks if t.misses == 0]
+
+# ================= One-Euro 滤波 =================
+class OneEuroFilter:
+    # Casiez et al. 2012：低速时截止频率低 (去抖)，高速时随速度升高 (减少拖影)
+    def __init__(self, min_cutoff=1.0, beta=0.3, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.x_prev = None
+        self.dx_prev = None
+        self.t_prev = None
+
+    @staticmethod
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        x = np.asarray(x, dtype=np.float64)
+        if self.x_prev is None:
+            self.x_prev, self.dx_prev, self.t_prev = x, np.zeros_like(x), t
+            return x
+        dt = max(t - self.t_prev, 1e-6)
+        a_d = self.alpha(self.d_cutoff, dt)
+        dx_hat = a_d * (x - self.x_prev) / dt + (1 - a_d) * self.dx_prev
+        a = self.alpha(self.min_cutoff + self.beta * float(np.linalg.norm(dx_hat)), dt)
+        x_hat = a * x + (1 - a) * self.x_prev
+        self.x_prev, self.dx_prev, self.t_prev = x_hat, dx_hat, t
+        return x_hat
+
+class QuatSmoother:
+    # 每根骨骼一个滤波器；q 与 -q 是同一旋转，滤波前先对齐到上一帧的半球，滤波后重新归一化
+    def __init__(self, min_cutoff=1.0, beta=0.3):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.filters = {}
+
+    def quat(self, name, q, t):
+        f = self.filters.get(name)
+        if f is None: f = self.filters[name] = OneEuroFilter(self.min_cutoff, self.beta)
+        q = np.asarray(q, dtype=np.float64)
+        if f.x_prev is not None and np.dot(q, f.x_prev) < 0: q = -q
+        q = f(q, t)
+        return (q / max(np.linalg.norm(q), 1e-8)).tolist()
+
+    def bones(self, bones, t):
+        return { name: { **val, "q": self.quat(name, val["q"], t) } for name, val in bones.items() if "q" in val }
@@ -29,7 +29,7 @@ def download_models(folder=CACHE_DIR_HAMER):
                 os.system("tar -xvf " + output_path)
 
 DEFAULT_CHECKPOINT=f'{CACHE_DIR_HAMER}/hamer_ckpts/checkpoints/hamer.ckpt'
-def load_hamer(checkpoint_path=DEFAULT_CHECKPOINT):
+def get_hamer_config(checkpoint_path=DEFAULT_CHECKPOINT):
     from pathlib import Path
     from ..configs import get_config
     model_cfg = str(Path(checkpoint_path).parent.parent / 'model_config.yaml')
@@ -47,6 +47,9 @@ def load_hamer(checkpoint_path=DEFAULT_CHECKPOINT):
         model_cfg.defrost()
         model_cfg.MODEL.BACKBONE.pop('PRETRAINED_WEIGHTS')
         model_cfg.freeze()
+    return model_cfg
 
+def load_hamer(checkpoint_path=DEFAULT_CHECKPOINT):
+    model_cfg = get_hamer_config(checkpoint_path)
     model = HAMER.load_from_checkpoint(checkpoint_path, strict=False, cfg=model_cfg)
     return model, model_cfg
@@ -0,0 +1,85 @@
+"""
+Chumpy-free loading of SMPL / MANO model files.
+
+The official .pkl files store their arrays as chumpy objects and scipy sparse matrices, so
+unpickling them imports chumpy (and dill for converted SMPL files). The first load converts
+every numeric field to a plain numpy array and writes it next to the source file as
+<name>-<sha256[:16]>.safetensors. Later loads read that file and never touch chumpy; an
+updated source file hashes differently and is converted again.
+"""
+import os
+import pickle
+import hashlib
+import numpy as np
+from safetensors import safe_open
+from safetensors.numpy import save_file
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 24), b''):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def _to_array(value):
+    if hasattr(value, 'toarray'):   # scipy.sparse (J_regressor)
+        value = value.toarray()
+    elif hasattr(value, 'r'):       # chumpy.Ch
+        value = value.r
+    try:
+        array = np.asarray(value)
+    except Exception:
+        return None
+    return array if array.dtype.kind in 'biuf' else None
+
+
+def _unpickle(path: str):
+    with open(path, 'rb') as f:
+        try:
+            return pickle.load(f, encoding='latin1')
+        except Exception:
+            # Same workaround as convert_pkl for pickles written through dill
+            import dill
+            dill._dill._reverse_typemap["ObjectType"] = object
+            f.seek(0)
+            return pickle.load(f, encoding='latin1')
+
+
+def load_arrays(path: str) -> dict:
+    """
+    Load the numeric fields of a SMPL / MANO style pickle as numpy arrays, converting and caching on first use.
+    A pickle that holds a bare array (e.g. an extra joint regressor) is returned as {'array': ...}.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(os.path.dirname(path), f'{stem}-{file_digest(path)}.safetensors')
+    if not os.path.exists(cache_path):
+        data = _unpickle(path)
+        if not isinstance(data, dict):
+            data = {'array': data}
+        arrays = {}
+        for k, v in data.items():
+            array = _to_array(v)
+            if array is not None:
+                arrays[k] = np.ascontiguousarray(array)
+        save_file(arrays, cache_path + '.tmp')
+        os.replace(cache_path + '.tmp', cache_path)
+    with safe_open(cache_path, framework='np') as f:
+        return {k: f.get_tensor(k) for k in f.keys()}
+
+
+def model_file(model_path, candidates):
+    """
+    Resolve the model file the same way smplx does: model_path is either the file itself or a folder
+    holding one of the candidate file names. Returns None if nothing exists (smplx then reports the error).
+    """
+    if model_path is None:
+        return None
+    if not os.path.isdir(model_path):
+        return model_path if os.path.exists(model_path) else None
+    for name in candidates:
+        path = os.path.join(model_path, name)
+        if os.path.exists(path):
+            return path
+    return None
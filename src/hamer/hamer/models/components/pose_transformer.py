@@ -2,7 +2,7 @@ from inspect import isfunction
 from typing import Callable, Optional
 
 import torch
-from einops import rearrange
+import torch.nn.functional as F
 from einops.layers.torch import Rearrange
 from torch import nn
 
@@ -24,6 +24,27 @@ def default(val, d):
     return d() if isfunction(d) else d
 
 
+def split_heads(t, heads):
+    # (b, n, h*d) -> (b, h, n, d)
+    return t.unflatten(-1, (heads, -1)).transpose(1, 2)
+
+
+def merge_heads(t):
+    # (b, h, n, d) -> (b, n, h*d)
+    return t.transpose(1, 2).flatten(2)
+
+
+def attend(module, q, k, v):
+    # 'sdpa': fused F.scaled_dot_product_attention (its default scale is dim_head**-0.5 == module.scale)
+    # 'math': the original explicit matmul + softmax path, kept as the reference implementation
+    if module.attn_impl == 'sdpa':
+        return F.scaled_dot_product_attention(q, k, v, dropout_p=module.dropout.p if module.training else 0.0)
+    dots = torch.matmul(q, k.transpose(-1, -2)) * module.scale
+    attn = module.attend(dots)
+    attn = module.dropout(attn)
+    return torch.matmul(attn, v)
+
+
 class PreNorm(nn.Module):
     def __init__(self, dim: int, fn: Callable, norm: str = "layer", norm_cond_dim: int = -1):
         super().__init__()
@@ -71,19 +92,13 @@ class Attention(nn.Module):
             if project_out
             else nn.Identity()
         )
+        self.attn_impl = 'sdpa' if hasattr(F, 'scaled_dot_product_attention') else 'math'
 
     def forward(self, x):
         qkv = self.to_qkv(x).chunk(3, dim=-1)
-        q, k, v = map(lambda t: rearrange(t, "b n (h d) -> b h n d", h=self.heads), qkv)
-
-        dots = torch.matmul(q, k.transpose(-1, -2)) * self.scale
-
-        attn = self.attend(dots)
-        attn = self.dropout(attn)
-
-        out = torch.matmul(attn, v)
-        out = rearrange(out, "b h n d -> b n (h d)")
-        return self.to_out(out)
+        q, k, v = [split_heads(t, self.heads) for t in qkv]
+        out = attend(self, q, k, v)
+        return self.to_out(merge_heads(out))
 
 
 class CrossAttention(nn.Module):
@@ -107,21 +122,22 @@ class CrossAttention(nn.Module):
             if project_out
             else nn.Identity()
         )
-
-    def forward(self, x, context=None):
-        context = default(context, x)
-        k, v = self.to_kv(context).chunk(2, dim=-1)
-        q = self.to_q(x)
-        q, k, v = map(lambda t: rearrange(t, "b n (h d) -> b h n d", h=self.heads), [q, k, v])
-
-        dots = torch.matmul(q, k.transpose(-1, -2)) * self.scale
-
-        attn = self.attend(dots)
-        attn = self.dropout(attn)
-
-        out = torch.matmul(attn, v)
-        out = rearrange(out, "b h n d -> b n (h d)")
-        return self.to_out(out)
+        self.attn_impl = 'sdpa' if hasattr(F, 'scaled_dot_product_attention') else 'math'
+
+    def forward(self, x, context=None, kv_cache=None):
+        # kv_cache: optional dict shared by the caller across calls with the same context
+        # (e.g. the IEF iterations of a regression head); the context K/V projection is
+        # then computed once per layer instead of once per call.
+        if kv_cache is not None and self in kv_cache:
+            k, v = kv_cache[self]
+        else:
+            context = default(context, x)
+            k, v = [split_heads(t, self.heads) for t in self.to_kv(context).chunk(2, dim=-1)]
+            if kv_cache is not None:
+                kv_cache[self] = (k, v)
+        q = split_heads(self.to_q(x), self.heads)
+        out = attend(self, q, k, v)
+        return self.to_out(merge_heads(out))
 
 
 class Transformer(nn.Module):
@@ -188,7 +204,7 @@ class TransformerCrossAttn(nn.Module):
                 )
             )
 
-    def forward(self, x: torch.Tensor, *args, context=None, context_list=None):
+    def forward(self, x: torch.Tensor, *args, context=None, context_list=None, kv_cache=None):
         if context_list is None:
             context_list = [context] * len(self.layers)
         if len(context_list) != len(self.layers):
@@ -196,7 +212,7 @@ class TransformerCrossAttn(nn.Module):
 
         for i, (self_attn, cross_attn, ff) in enumerate(self.layers):
             x = self_attn(x, *args) + x
-            x = cross_attn(x, *args, context=context_list[i]) + x
+            x = cross_attn(x, *args, context=context_list[i], kv_cache=kv_cache) + x
             x = ff(x, *args) + x
         return x
 
@@ -346,13 +362,13 @@ class TransformerDecoder(nn.Module):
             context_dim=context_dim,
         )
 
-    def forward(self, inp: torch.Tensor, *args, context=None, context_list=None):
+    def forward(self, inp: torch.Tensor, *args, context=None, context_list=None, kv_cache=None):
         x = self.to_token_embedding(inp)
         b, n, _ = x.shape
 
         x = self.dropout(x)
         x += self.pos_embedding[:, :n]
 
-        x = self.transformer(x, *args, context=context, context_list=context_list)
+        x = self.transformer(x, *args, context=context, context_list=context_list, kv_cache=kv_cache)
         return x
 
@@ -1,5 +1,6 @@
 import torch
 import pytorch_lightning as pl
+from contextlib import nullcontext
 from typing import Any, Dict, Mapping, Tuple
 
 from yacs.config import CfgNode
@@ -100,11 +101,22 @@ class HAMER(pl.LightningModule):
         x = batch['img']
         batch_size = x.shape[0]
 
-        # Compute conditioning features using the backbone
-        # if using ViT backbone, we need to use a different aspect ratio
-        conditioning_feats = self.backbone(x[:,:,:,32:-32])
-
-        pred_mano_params, pred_cam, _ = self.mano_head(conditioning_feats)
+        # Optional mixed precision ('autocast_dtype' in the batch): only the backbone and the
+        # transformer head run under autocast. The head accumulates its predictions on fp32 mean
+        # buffers, so the rotation conversion and everything below stay in fp32.
+        autocast_dtype = batch.get('autocast_dtype', None)
+        amp = torch.autocast(device_type=x.device.type, dtype=autocast_dtype) if autocast_dtype is not None else nullcontext()
+        with amp:
+            # Compute conditioning features using the backbone
+            # if using ViT backbone, we need to use a different aspect ratio:
+            # square 256x256 crops are cut to 256x192 here, crops already at BBOX_SHAPE pass through
+            if x.shape[-1] == x.shape[-2]:
+                x = x[:,:,:,32:-32]
+            conditioning_feats = self.backbone(x)
+
+            pred_mano_params, pred_cam, _ = self.mano_head(conditioning_feats)
+        pred_mano_params = {k: v.float() for k,v in pred_mano_params.items()}
+        pred_cam = pred_cam.float()
 
         # Store useful regression outputs to the output dict
         output = {}
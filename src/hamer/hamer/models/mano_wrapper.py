@@ -1,11 +1,12 @@
+import os
 import torch
 import numpy as np
-import pickle
 from typing import Optional
 import smplx
 from smplx.lbs import vertices2joints
-from smplx.utils import MANOOutput, to_tensor
+from smplx.utils import MANOOutput, Struct, to_tensor
 from smplx.vertex_ids import vertex_ids
+from .asset_cache import load_arrays, model_file
 
 
 class MANO(smplx.MANOLayer):
@@ -16,12 +17,22 @@ class MANO(smplx.MANOLayer):
             Same as MANOLayer.
             joint_regressor_extra (str): Path to extra joint regressor.
         """
+        # Read the model file through the asset cache instead of letting smplx unpickle it with chumpy
+        if kwargs.get('data_struct') is None:
+            model_path = kwargs.get('model_path', args[0] if args else None)
+            is_rhand = kwargs.get('is_rhand', True)
+            mano_path = model_file(model_path, ['MANO_{}.pkl'.format('RIGHT' if is_rhand else 'LEFT')])
+            if mano_path is not None:
+                if not os.path.isdir(model_path):
+                    # smplx infers the side from the file name when given a file
+                    kwargs['is_rhand'] = 'RIGHT' in os.path.basename(model_path)
+                kwargs['data_struct'] = Struct(**load_arrays(mano_path))
         super(MANO, self).__init__(*args, **kwargs)
         mano_to_openpose = [0, 13, 14, 15, 16, 1, 2, 3, 17, 4, 5, 6, 18, 10, 11, 12, 19, 7, 8, 9, 20]
 
         #2, 3, 5, 4, 1
         if joint_regressor_extra is not None:
-            self.register_buffer('joint_regressor_extra', torch.tensor(pickle.load(open(joint_regressor_extra, 'rb'), encoding='latin1'), dtype=torch.float32))
+            self.register_buffer('joint_regressor_extra', torch.tensor(load_arrays(joint_regressor_extra)['array'], dtype=torch.float32))
         self.register_buffer('extra_joints_idxs', to_tensor(list(vertex_ids['mano'].values()), dtype=torch.long))
         self.register_buffer('joint_map', torch.tensor(mano_to_openpose, dtype=torch.long))
 
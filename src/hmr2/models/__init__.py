@@ -63,8 +63,7 @@ def convert_pkl(old_pkl, new_pkl):
     with open(new_pkl, "wb") as outfile:
         pickle.dump(loaded, outfile)
 
-def load_hmr2(checkpoint_path, smpl_dir):
-    from pathlib import Path
+def get_hmr2_config(smpl_dir):
     from ..configs import get_config
     
     # 确保 smpl_dir 是绝对路径
@@ -84,6 +83,10 @@ def load_hmr2(checkpoint_path, smpl_dir):
         model_cfg.defrost()
         model_cfg.MODEL.BBOX_SHAPE = [192,256]
         model_cfg.freeze()
+    return model_cfg
+
+def load_hmr2(checkpoint_path, smpl_dir):
+    model_cfg = get_hmr2_config(smpl_dir)
 
     # check_smpl_exists(smpl_dir) # 暂时注释掉严格检查，依靠外层逻辑
 
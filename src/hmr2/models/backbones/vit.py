@@ -107,19 +107,32 @@ class Attention(nn.Module):
         self.proj = nn.Linear(all_head_dim, dim)
         self.proj_drop = nn.Dropout(proj_drop)
 
+        # 'sdpa': F.scaled_dot_product_attention (flash / memory-efficient kernels where available)
+        # 'math': explicit q @ k^T -> softmax -> @ v, kept as the reference implementation
+        # Both use the same parameters, so checkpoints load either way.
+        self.attn_impl = 'sdpa' if hasattr(F, 'scaled_dot_product_attention') else 'math'
+
     def forward(self, x):
         B, N, C = x.shape
         qkv = self.qkv(x)
         qkv = qkv.reshape(B, N, 3, self.num_heads, -1).permute(2, 0, 3, 1, 4)
         q, k, v = qkv[0], qkv[1], qkv[2]   # make torchscript happy (cannot use tensor as tuple)
 
-        q = q * self.scale
-        attn = (q @ k.transpose(-2, -1))
+        if self.attn_impl == 'sdpa':
+            # SDPA scales by 1/sqrt(head_dim) itself; fold in a custom qk_scale if one was given
+            head_dim = q.shape[-1]
+            if self.scale != head_dim ** -0.5:
+                q = q * (self.scale * head_dim ** 0.5)
+            x = F.scaled_dot_product_attention(q, k, v, dropout_p=self.attn_drop.p if self.training else 0.)
+        else:
+            q = q * self.scale
+            attn = (q @ k.transpose(-2, -1))
 
-        attn = attn.softmax(dim=-1)
-        attn = self.attn_drop(attn)
+            attn = attn.softmax(dim=-1)
+            attn = self.attn_drop(attn)
+            x = attn @ v
 
-        x = (attn @ v).transpose(1, 2).reshape(B, N, -1)
+        x = x.transpose(1, 2).reshape(B, N, -1)
         x = self.proj(x)
         x = self.proj_drop(x)
 
@@ -74,6 +74,8 @@ class SMPLTransformerDecoderHead(nn.Module):
         pred_body_pose_list = []
         pred_betas_list = []
         pred_cam_list = []
+        # The context is the same for every IEF iteration: project its K/V once per layer
+        kv_cache = {}
         for i in range(self.cfg.MODEL.SMPL_HEAD.get('IEF_ITERS', 1)):
             # Input token to transformer is zero token
             if self.input_is_mean_shape:
@@ -82,7 +84,7 @@ class SMPLTransformerDecoderHead(nn.Module):
                 token = torch.zeros(batch_size, 1, 1).to(x.device)
 
             # Pass through transformer
-            token_out = self.transformer(token, context=x)
+            token_out = self.transformer(token, context=x, kv_cache=kv_cache)
             token_out = token_out.squeeze(1) # (B, C)
 
             # Readout from token_out
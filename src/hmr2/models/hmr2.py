@@ -1,5 +1,6 @@
 import torch
 import pytorch_lightning as pl
+from contextlib import nullcontext
 from typing import Any, Dict, Mapping, Tuple
 
 from yacs.config import CfgNode
@@ -100,11 +101,22 @@ class HMR2(pl.LightningModule):
         x = batch['img']
         batch_size = x.shape[0]
 
-        # Compute conditioning features using the backbone
-        # if using ViT backbone, we need to use a different aspect ratio
-        conditioning_feats = self.backbone(x[:,:,:,32:-32])
-
-        pred_smpl_params, pred_cam, _ = self.smpl_head(conditioning_feats)
+        # Optional mixed precision ('autocast_dtype' in the batch): only the backbone and the
+        # transformer head run under autocast. The head accumulates its predictions on fp32 mean
+        # buffers, so the rotation conversion and everything below stay in fp32.
+        autocast_dtype = batch.get('autocast_dtype', None)
+        amp = torch.autocast(device_type=x.device.type, dtype=autocast_dtype) if autocast_dtype is not None else nullcontext()
+        with amp:
+            # Compute conditioning features using the backbone
+            # if using ViT backbone, we need to use a different aspect ratio:
+            # square 256x256 crops are cut to 256x192 here, crops already at BBOX_SHAPE pass through
+            if x.shape[-1] == x.shape[-2]:
+                x = x[:,:,:,32:-32]
+            conditioning_feats = self.backbone(x)
+
+            pred_smpl_params, pred_cam, _ = self.smpl_head(conditioning_feats)
+        pred_smpl_params = {k: v.float() for k,v in pred_smpl_params.items()}
+        pred_cam = pred_cam.float()
 
         # Store useful regression outputs to the output dict
         output = {}
@@ -125,11 +137,13 @@ class HMR2(pl.LightningModule):
         pred_smpl_params['global_orient'] = pred_smpl_params['global_orient'].reshape(batch_size, -1, 3, 3)
         pred_smpl_params['body_pose'] = pred_smpl_params['body_pose'].reshape(batch_size, -1, 3, 3)
         pred_smpl_params['betas'] = pred_smpl_params['betas'].reshape(batch_size, -1)
-        smpl_output = self.smpl(**{k: v.float() for k,v in pred_smpl_params.items()}, pose2rot=False)
+        # 'return_vertices': False in the batch skips the full mesh (joints-only SMPL path, no 'pred_vertices')
+        return_vertices = batch.get('return_vertices', True)
+        smpl_output = self.smpl(**{k: v.float() for k,v in pred_smpl_params.items()}, pose2rot=False, return_verts=return_vertices)
         pred_keypoints_3d = smpl_output.joints
-        pred_vertices = smpl_output.vertices
         output['pred_keypoints_3d'] = pred_keypoints_3d.reshape(batch_size, -1, 3)
-        output['pred_vertices'] = pred_vertices.reshape(batch_size, -1, 3)
+        if return_vertices:
+            output['pred_vertices'] = smpl_output.vertices.reshape(batch_size, -1, 3)
         pred_cam_t = pred_cam_t.reshape(-1, 3)
         focal_length = focal_length.reshape(-1, 2)
         pred_keypoints_2d = perspective_projection(pred_keypoints_3d,
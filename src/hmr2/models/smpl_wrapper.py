@@ -1,10 +1,10 @@
 import torch
 import numpy as np
-import pickle
 from typing import Optional
 import smplx
-from smplx.lbs import vertices2joints
-from smplx.utils import SMPLOutput
+from smplx.lbs import vertices2joints, batch_rigid_transform
+from smplx.utils import SMPLOutput, Struct
+from .asset_cache import load_arrays, model_file
 
 
 class SMPL(smplx.SMPLLayer):
@@ -15,27 +15,94 @@ class SMPL(smplx.SMPLLayer):
             Same as SMPLLayer.
             joint_regressor_extra (str): Path to extra joint regressor.
         """
+        # Read the model file through the asset cache instead of letting smplx unpickle it with chumpy
+        if kwargs.get('data_struct') is None:
+            gender = kwargs.get('gender', 'neutral')
+            candidates = [f'SMPL_{gender.upper()}.pkl']
+            if gender == 'neutral':
+                candidates.append('basicModel_neutral_lbs_10_207_0_v1.0.0.pkl')
+            smpl_path = model_file(kwargs.get('model_path', args[0] if args else None), candidates)
+            if smpl_path is not None:
+                kwargs['data_struct'] = Struct(**load_arrays(smpl_path))
         super(SMPL, self).__init__(*args, **kwargs)
         smpl_to_openpose = [24, 12, 17, 19, 21, 16, 18, 20, 0, 2, 5, 8, 1, 4,
                             7, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34]
             
         if joint_regressor_extra is not None:
-            self.register_buffer('joint_regressor_extra', torch.tensor(pickle.load(open(joint_regressor_extra, 'rb'), encoding='latin1'), dtype=torch.float32))
+            self.register_buffer('joint_regressor_extra', torch.tensor(load_arrays(joint_regressor_extra)['array'], dtype=torch.float32))
         self.register_buffer('joint_map', torch.tensor(smpl_to_openpose, dtype=torch.long))
         self.update_hips = update_hips
+        self._init_joints_only()
 
-    def forward(self, *args, **kwargs) -> SMPLOutput:
+    def _init_joints_only(self):
+        """
+        Precompute the buffers used by forward_joints (non-persistent, so checkpoints are unaffected):
+        the joint regressor folded into the template and shape blend shapes, and the template, blend shapes
+        and skinning weights of the few vertices that are used as keypoints (vertex joints + extra regressor).
+        """
+        self.register_buffer('joint_template', self.J_regressor @ self.v_template, persistent=False)
+        self.register_buffer('joint_shapedirs', torch.einsum('jv,vcl->jcl', self.J_regressor, self.shapedirs), persistent=False)
+        selector_idxs = self.vertex_joint_selector.extra_joints_idxs
+        idxs = selector_idxs
+        if hasattr(self, 'joint_regressor_extra'):
+            idxs = torch.cat([idxs, (self.joint_regressor_extra != 0).any(dim=0).nonzero().flatten()])
+        sparse_idxs, inverse = torch.unique(idxs, return_inverse=True)
+        self.register_buffer('sparse_selector_idxs', inverse[:len(selector_idxs)], persistent=False)
+        if hasattr(self, 'joint_regressor_extra'):
+            self.register_buffer('sparse_regressor_extra', self.joint_regressor_extra[:, sparse_idxs], persistent=False)
+        self.register_buffer('sparse_v_template', self.v_template[sparse_idxs], persistent=False)
+        self.register_buffer('sparse_shapedirs', self.shapedirs[sparse_idxs], persistent=False)
+        num_pose_basis = self.posedirs.shape[0]
+        self.register_buffer('sparse_posedirs', self.posedirs.reshape(num_pose_basis, -1, 3)[:, sparse_idxs].reshape(num_pose_basis, -1), persistent=False)
+        self.register_buffer('sparse_lbs_weights', self.lbs_weights[sparse_idxs], persistent=False)
+
+    def forward_joints(self, betas: torch.Tensor, body_pose: torch.Tensor, global_orient: torch.Tensor,
+                       transl: Optional[torch.Tensor] = None, **kwargs):
+        """
+        Joints-only SMPL forward (rotation matrix inputs, like SMPLLayer). The kinematic joints come from the
+        precomputed regressor applied to the shape blend plus forward kinematics; only the vertices needed for
+        the vertex joints and the extra regressor are posed and skinned, instead of all 6890.
+        Returns:
+            (SMPLOutput without vertices, posed sparse vertices)
+        """
+        full_pose = torch.cat([global_orient.reshape(-1, 1, 3, 3), body_pose.reshape(-1, self.NUM_BODY_JOINTS, 3, 3)], dim=1)
+        batch_size = full_pose.shape[0]
+        betas = betas.reshape(batch_size, -1)
+        joints_rest = self.joint_template + torch.einsum('bl,jcl->bjc', betas, self.joint_shapedirs)
+        joints, A = batch_rigid_transform(full_pose, joints_rest, self.parents, dtype=self.dtype)
+        ident = torch.eye(3, dtype=full_pose.dtype, device=full_pose.device)
+        pose_feature = (full_pose[:, 1:] - ident).reshape(batch_size, -1)
+        v_posed = self.sparse_v_template + torch.einsum('bl,vcl->bvc', betas, self.sparse_shapedirs) \
+            + torch.matmul(pose_feature, self.sparse_posedirs).view(batch_size, -1, 3)
+        T = torch.matmul(self.sparse_lbs_weights, A.view(batch_size, -1, 16)).view(batch_size, -1, 4, 4)
+        vertices = torch.matmul(T[:, :, :3, :3], v_posed.unsqueeze(-1)).squeeze(-1) + T[:, :, :3, 3]
+        joints = torch.cat([joints, vertices[:, self.sparse_selector_idxs]], dim=1)
+        if self.joint_mapper is not None:
+            joints = self.joint_mapper(joints)
+        if transl is not None:
+            joints = joints + transl.unsqueeze(dim=1)
+            vertices = vertices + transl.unsqueeze(dim=1)
+        return SMPLOutput(vertices=None, joints=joints, betas=betas, global_orient=global_orient, body_pose=body_pose), vertices
+
+    def forward(self, *args, return_verts: bool = True, **kwargs) -> SMPLOutput:
         """
         Run forward pass. Same as SMPL and also append an extra set of joints if joint_regressor_extra is specified.
+        With return_verts=False (keyword inputs) only the joints are computed and vertices is None.
         """
-        smpl_output = super(SMPL, self).forward(*args, **kwargs)
+        if return_verts or args:
+            smpl_output = super(SMPL, self).forward(*args, return_verts=return_verts, **kwargs)
+            vertices = smpl_output.vertices
+            regressor_extra = getattr(self, 'joint_regressor_extra', None)
+        else:
+            smpl_output, vertices = self.forward_joints(**kwargs)
+            regressor_extra = getattr(self, 'sparse_regressor_extra', None)
         joints = smpl_output.joints[:, self.joint_map, :]
         if self.update_hips:
             joints[:,[9,12]] = joints[:,[9,12]] + \
                 0.25*(joints[:,[9,12]]-joints[:,[12,9]]) + \
                 0.5*(joints[:,[8]] - 0.5*(joints[:,[9,12]] + joints[:,[12,9]]))
-        if hasattr(self, 'joint_regressor_extra'):
-            extra_joints = vertices2joints(self.joint_regressor_extra, smpl_output.vertices)
+        if regressor_extra is not None:
+            extra_joints = vertices2joints(regressor_extra, vertices)
             joints = torch.cat([joints, extra_joints], dim=1)
         smpl_output.joints = joints
         return smpl_output
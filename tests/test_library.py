@@ -0,0 +1,116 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+from _laoli import load_module
+
+# 动作库：路径校验 (分类名 / 动作名不能跳出 pose 目录，校验失败时不能留下任何文件) 与对账时的并发写入
+#
+#   python -m unittest discover -s tests
+
+laoli_library = load_module("laoli_library")
+
+BAD_NAMES = ["../../escaped", "..", "a/b", "a\\b", "", None]
+
+class TestSavePoseNames(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, "pose")
+        self.library = laoli_library.PoseLibrary(root=self.root, index_path=os.path.join(self.root, "library.sqlite"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def written(self):
+        return sorted(os.path.relpath(os.path.join(d, f), self.tmp) for d, _, files in os.walk(self.tmp) for f in files)
+
+    def test_bad_pose_name_writes_nothing(self):
+        for name in BAD_NAMES:
+            with self.subTest(name=name):
+                with self.assertRaises(ValueError):
+                    self.library.save_pose("Body", "Default", name, {"body": {}})
+                self.assertEqual(self.written(), [])
+                self.assertFalse(os.path.exists(self.root))
+
+    def test_bad_category_writes_nothing(self):
+        for category in BAD_NAMES:
+            with self.subTest(category=category):
+                with self.assertRaises(ValueError):
+                    self.library.save_pose("Body", category, "pose", {"body": {}})
+                self.assertEqual(self.written(), [])
+
+    def test_bad_lib_type_writes_nothing(self):
+        with self.assertRaises(ValueError):
+            self.library.save_pose("../Body", "Default", "pose", {"body": {}})
+        self.assertEqual(self.written(), [])
+
+    def test_valid_name_is_saved_and_indexed(self):
+        self.library.save_pose("Body", "Default", "pose", {"body": {}})
+        self.assertTrue(os.path.isfile(os.path.join(self.root, "Body", "Default", "pose.json")))
+        self.assertEqual([p["name"] for p in self.library.page("Body", "Default")["poses"]], ["pose"])
+
+class TestSyncRace(unittest.TestCase):
+    # 对账的目录扫描不持锁：扫描期间本进程保存的动作不能被扫描结果覆盖掉，也不能被当成外部改动再通知一次
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, "pose")
+        self.library = laoli_library.PoseLibrary(root=self.root, index_path=os.path.join(self.root, "library.sqlite"))
+        self.library.save_pose("Body", "Default", "old", {"body": {}})
+        self.library.ensure_synced("Body")
+        self.events = []
+        self.library.listeners.append(lambda lib_type, cats: self.events.append((lib_type, cats)))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def names(self, category="Default"):
+        return sorted(p["name"] for p in self.library.page("Body", category)["poses"])
+
+    def save_during_scan(self, category):
+        scan = self.library.scan
+        def racing_scan(lib_type):
+            tree = scan(lib_type)
+            self.library.save_pose("Body", category, "new", {"body": {}})
+            return tree
+        self.library.scan = racing_scan
+        try:
+            self.library.ensure_synced("Body", force=True)
+        finally:
+            self.library.scan = scan
+
+    def test_save_during_scan_is_kept(self):
+        self.save_during_scan("Default")
+        self.assertEqual(self.names(), ["new", "old"])
+        self.library.ensure_synced("Body", force=True)
+        self.assertEqual(self.names(), ["new", "old"])
+        self.assertEqual(self.events, [("Body", ["Default"])])
+
+    def test_new_category_during_scan_is_kept(self):
+        self.save_during_scan("Fresh")
+        self.assertIn("Fresh", [c["name"] for c in self.library.categories("Body")])
+        self.assertEqual(self.names("Fresh"), ["new"])
+        self.library.ensure_synced("Body", force=True)
+        self.assertEqual(self.events, [("Body", ["Fresh"])])
+
+    def test_sync_during_write_does_not_notify(self):
+        # 文件已写、索引未更新时监视线程来对账：跳过这个动作，保存完成后只有一次通知
+        with self.library.writing("Body", [("Default", "half")]):
+            with open(self.library.path("Body", "Default", "half", ".json"), "w", encoding="utf-8") as f: f.write("{}")
+            self.library.ensure_synced("Body", force=True)
+            self.assertEqual(self.events, [])
+            self.library.add_pose("Body", "Default", "half")
+        self.library.ensure_synced("Body", force=True)
+        self.assertEqual(self.events, [("Body", ["Default"])])
+        self.assertEqual(self.names(), ["half", "old"])
+
+    def test_external_change_still_detected(self):
+        os.remove(self.library.path("Body", "Default", "old", ".json"))
+        self.library.ensure_synced("Body", force=True)
+        self.assertEqual(self.names(), [])
+        self.assertEqual(self.events, [("Body", ["Default"])])
+
+if __name__ == "__main__":
+    unittest.main()
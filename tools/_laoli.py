@@ -0,0 +1,23 @@
+import os
+import sys
+import types
+import importlib
+
+# 工具脚本在 ComfyUI 之外运行：把仓库注册成一个包再导入 laoli_node 等模块，
+# 不执行 __init__.py (它依赖 ComfyUI 的 server 模块)
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "laoli3d"
+
+def register_package():
+    if PACKAGE_NAME not in sys.modules:
+        pkg = types.ModuleType(PACKAGE_NAME)
+        pkg.__path__ = [REPO_DIR]
+        sys.modules[PACKAGE_NAME] = pkg
+
+def load_module(name="laoli_node"):
+    register_package()
+    return importlib.import_module(f"{PACKAGE_NAME}.{name}")
+
+def list_images(folder):
+    if not os.path.isdir(folder): return []
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith((".png", ".jpg", ".jpeg", ".webp")))
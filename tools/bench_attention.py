@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import argparse
+import importlib.util
+from contextlib import nullcontext
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _laoli import REPO_DIR
+
+# ViT-H 单个 Block 的注意力实现对比 (math 原始实现 vs sdpa)：
+# 每个 batch 输出单次前向延迟、峰值显存增量，以及两种实现的最大输出差异。
+#
+#   python tools/bench_attention.py --batch 1 8 32 --dtype bf16
+
+DTYPES = { "fp32": None, "bf16": torch.bfloat16, "fp16": torch.float16 }
+
+def load_vit_module(which):
+    # 直接按文件加载 vit.py，避免导入 hmr2 / hamer 包时引入 Lightning 等训练依赖
+    path = {
+        "hmr2": os.path.join(REPO_DIR, "src", "hmr2", "models", "backbones", "vit.py"),
+        "hamer": os.path.join(REPO_DIR, "src", "hamer", "hamer", "models", "backbones", "vit.py"),
+    }[which]
+    spec = importlib.util.spec_from_file_location(f"laoli_bench_vit_{which}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def bench(block, x, impl, dtype, iters, warmup):
+    block.attn.attn_impl = impl
+    amp = torch.autocast(device_type=x.device.type, dtype=dtype) if dtype is not None else nullcontext()
+    cuda = x.device.type == "cuda"
+    with torch.no_grad(), amp:
+        for _ in range(warmup): out = block(x)
+        if cuda:
+            torch.cuda.synchronize(x.device)
+            torch.cuda.reset_peak_memory_stats(x.device)
+            base = torch.cuda.memory_allocated(x.device)
+        t0 = time.perf_counter()
+        for _ in range(iters): out = block(x)
+        if cuda: torch.cuda.synchronize(x.device)
+        ms = (time.perf_counter() - t0) * 1000 / iters
+        peak_mb = (torch.cuda.max_memory_allocated(x.device) - base) / (1 << 20) if cuda else None
+    return out.float(), ms, peak_mb
+
+def main():
+    parser = argparse.ArgumentParser(description="ViT Block 注意力实现基准 (math vs sdpa)")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--dtype", choices=list(DTYPES.keys()), default="fp32")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--model", choices=["hmr2", "hamer"], default="hmr2")
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    args = parser.parse_args()
+
+    vit = load_vit_module(args.model)
+    device = torch.device(args.device)
+    # 与 vit(cfg) 相同的 ViT-H 配置：256x192 输入、16x16 patch -> 192 个 token
+    block = vit.Block(dim=1280, num_heads=16, mlp_ratio=4, qkv_bias=True).to(device).eval()
+    tokens = (256 // 16) * (192 // 16)
+    print(f"ViT-H Block ({args.model}), tokens={tokens}, dtype={args.dtype}, device={device}")
+    print(f"{'batch':>5s} {'impl':>5s} {'ms/block':>10s} {'peak MB':>10s} {'max |diff|':>11s}")
+    for batch in args.batch:
+        x = torch.randn(batch, tokens, 1280, device=device)
+        ref, ms, peak = bench(block, x, "math", DTYPES[args.dtype], args.iters, args.warmup)
+        print(f"{batch:5d} {'math':>5s} {ms:10.3f} {peak if peak is not None else float('nan'):10.1f} {'-':>11s}")
+        out, ms, peak = bench(block, x, "sdpa", DTYPES[args.dtype], args.iters, args.warmup)
+        print(f"{batch:5d} {'sdpa':>5s} {ms:10.3f} {peak if peak is not None else float('nan'):10.1f} {(out - ref).abs().max().item():11.2e}")
+        del x, ref, out
+        if device.type == "cuda": torch.cuda.empty_cache()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _laoli import REPO_DIR, PACKAGE_NAME
+
+# 插件导入耗时基准 (python -X importtime)：在子进程里先导入 ComfyUI 启动时本来就会加载的模块
+# (torch / numpy / PIL)，再导入 laoli_node，只统计插件自己带来的导入耗时。
+# 同时检查识别相关的重依赖没有在导入阶段被加载；超出 --max-ms 或出现重依赖时以返回码 1 退出。
+#
+#   python tools/import_time.py --top 15 --max-ms 300
+
+MARKER = "laoli-import-start"
+BASELINE = ["torch", "numpy", "PIL.Image"]
+# 这些只应在第一次识别 / 加载模型时导入
+HEAVY = ["ultralytics", "mediapipe", "hmr2", "hamer", "scipy", "smplx", "onnxruntime", "torch.ao.quantization", "pyrender"]
+
+def run_import(module):
+    code = "; ".join([
+        *(f"import {m}" for m in BASELINE),
+        f"import sys; sys.path.insert(0, {os.path.join(REPO_DIR, 'tools')!r})",
+        "from _laoli import PACKAGE_NAME, register_package",
+        "register_package()",
+        f"sys.stderr.write({MARKER!r} + '\\n')",
+        # 用 import 语句导入 (importlib.import_module 不会出现在 -X importtime 的输出里)
+        f"import {PACKAGE_NAME}.{module}",
+    ])
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=REPO_DIR)
+    if proc.returncode != 0:
+        print(proc.stderr); sys.exit(proc.returncode)
+    return proc.stderr.split(MARKER + "\n", 1)[1]
+
+def parse(stderr):
+    # 每行: "import time: self [us] | cumulative | imported package"，按导入层级缩进
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line: continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Laoli3D 插件导入耗时 (python -X importtime)")
+    parser.add_argument("--module", default="laoli_node")
+    parser.add_argument("--top", type=int, default=15, help="列出自身耗时最多的前 N 个模块")
+    parser.add_argument("--max-ms", type=float, default=0.0, help="总导入耗时上限 (ms)，0 = 不检查")
+    args = parser.parse_args()
+
+    rows = parse(run_import(args.module))
+    total_ms = sum(r[2] for r in rows if r[3] == 0) / 1000
+    print(f"导入 {args.module}: 共 {total_ms:.1f} ms，新加载 {len(rows)} 个模块 (不含 {', '.join(BASELINE)})")
+    print(f"{'self ms':>9s} {'cumul ms':>9s}  module")
+    for name, self_us, cumulative_us, _ in sorted(rows, key=lambda r: -r[1])[:args.top]:
+        print(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}")
+
+    names = {r[0] for r in rows}
+    heavy = [h for h in HEAVY if any(n == h or n.startswith(h + ".") for n in names)]
+    failed = False
+    if heavy:
+        print(f"导入阶段加载了重依赖: {', '.join(heavy)}"); failed = True
+    if args.max_ms and total_ms > args.max_ms:
+        print(f"导入耗时 {total_ms:.1f} ms 超过上限 {args.max_ms} ms"); failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
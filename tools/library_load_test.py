@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import urllib.request
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _laoli import REPO_DIR
+
+# 动作库接口负载测试 (需要正在运行的 ComfyUI)：在 pose/<库>/<分类> 下生成 N 个动作 (默认 5000)，
+# 强制对账后分页取完整个分类、并发拉取全部 WebP 缩略图 (首次请求会现场生成)；同时另一个线程每隔
+# --interval ms 请求一次 /laoli/status，统计事件循环的响应延迟。ping 的最大延迟超过 --max-stall-ms
+# 时以返回码 1 退出。测试分类结束后通过 manage_library 删除 (--keep 保留)。
+#
+#   python tools/library_load_test.py --url http://127.0.0.1:8188 --poses 5000
+
+def fetch(url, data=None):
+    req = urllib.request.Request(url, data=None if data is None else json.dumps(data).encode("utf-8"))
+    with urllib.request.urlopen(req, timeout=120) as r: return r.read()
+
+def fetch_json(url, data=None):
+    return json.loads(fetch(url, data))
+
+class Pinger(threading.Thread):
+    def __init__(self, url, interval):
+        super().__init__(daemon=True)
+        self.url, self.interval = url, interval
+        self.latencies = []
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.is_set():
+            t = time.perf_counter()
+            fetch(self.url)
+            self.latencies.append((time.perf_counter() - t) * 1000)
+            self.stop.wait(self.interval / 1000)
+
+def ping_stats(latencies):
+    values = sorted(latencies)
+    if not values: return "无数据"
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return f"{len(values)} 次, p50 {pick(0.5):.1f} ms, p95 {pick(0.95):.1f} ms, 最大 {values[-1]:.1f} ms"
+
+def make_poses(folder, count):
+    os.makedirs(folder, exist_ok=True)
+    pose = {"meta": {"source": "Laoli_Native", "version": "2.0", "type": "Body"}, "body": {"mixamorigHips": {"q": [0, 0, 0, 1]}}, "hands": {}}
+    thumb = os.path.join(folder, "_thumb.png")
+    Image.linear_gradient("L").resize((768, 1024)).convert("RGB").save(thumb)
+    for i in range(count):
+        name = f"load_{i:05d}"
+        with open(os.path.join(folder, f"{name}.json"), "w", encoding="utf-8") as f: json.dump(pose, f)
+        shutil.copyfile(thumb, os.path.join(folder, f"{name}.png"))
+    os.remove(thumb)
+
+def main():
+    parser = argparse.ArgumentParser(description="Laoli3D 动作库接口负载测试 (事件循环响应性)")
+    parser.add_argument("--url", default="http://127.0.0.1:8188")
+    parser.add_argument("--lib", default="Body", choices=["Body", "Hands"])
+    parser.add_argument("--category", default="__loadtest__")
+    parser.add_argument("--poses", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=16, help="并发拉取缩略图的连接数")
+    parser.add_argument("--interval", type=float, default=10.0, help="ping 间隔 (ms)")
+    parser.add_argument("--max-stall-ms", type=float, default=100.0)
+    parser.add_argument("--keep", action="store_true", help="测试后保留生成的分类")
+    args = parser.parse_args()
+
+    base = args.url.rstrip("/")
+    folder = os.path.join(REPO_DIR, "pose", args.lib, args.category)
+    if os.path.exists(folder):
+        print(f"分类已存在，请换一个 --category: {folder}"); sys.exit(1)
+    t = time.perf_counter()
+    make_poses(folder, args.poses)
+    print(f"已生成 {args.poses} 个动作: {time.perf_counter() - t:.1f} s")
+
+    pinger = Pinger(f"{base}/laoli/status", args.interval)
+    pinger.start()
+    try:
+        time.sleep(1.0)
+        idle = list(pinger.latencies)
+        t = time.perf_counter()
+        cats = fetch_json(f"{base}/laoli/get_library?libType={args.lib}&refresh=1")["categories"]
+        t_sync = time.perf_counter() - t
+        total = next((c["count"] for c in cats if c["name"] == args.category), 0)
+        poses = []
+        while len(poses) < total:
+            page = fetch_json(f"{base}/laoli/get_library?libType={args.lib}&category={quote(args.category)}&offset={len(poses)}&limit=500")
+            if not page["poses"]: break
+            poses.extend(page["poses"])
+        t_list = time.perf_counter() - t
+        urls = [p["srcset"].split(",")[0].split(" ")[0] if p.get("srcset") else p["thumbnail"] for p in poses if p["thumbnail"]]
+        with ThreadPoolExecutor(args.clients) as pool:
+            thumb_bytes = sum(len(b) for b in pool.map(lambda u: fetch(base + u), urls))
+        t_all = time.perf_counter() - t
+        busy = pinger.latencies[len(idle):]
+    finally:
+        pinger.stop.set(); pinger.join()
+        if not args.keep:
+            fetch_json(f"{base}/laoli/manage_library", {"action": "del_cat", "libType": args.lib, "category": args.category})
+            shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"对账 + 分类列表 {t_sync * 1000:.0f} ms；分页取完 {len(poses)}/{args.poses} 个动作 {t_list * 1000:.0f} ms；"
+          f"缩略图 {len(urls)} 张 {thumb_bytes / (1 << 20):.1f} MB，合计 {t_all:.1f} s")
+    print(f"空闲时 ping: {ping_stats(idle)}")
+    print(f"负载时 ping: {ping_stats(busy)}")
+    failed = len(poses) != args.poses
+    if failed: print("FAIL: 列表中的动作数与生成的不一致")
+    if busy and max(busy) > args.max_stall_ms:
+        print(f"FAIL: 事件循环最长卡顿 {max(busy):.1f} ms > {args.max_stall_ms} ms"); failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _laoli import REPO_DIR, load_module, list_images
+
+# 混合精度回归检查：在固定样本集上比较 fp32 / bf16 / fp16 的 HMR2、HaMeR 输出。
+# 样本集与 fp32 参考结果随仓库提交在 tools/precision_samples/ (body/ 与 hands/ 下每张图整体作为一个裁剪，
+# 参考为 reference_fp32.npz，目录说明见其中的 README.md)。每次都与提交的参考比较，
+# 因此也能发现代码改动带来的 fp32 漂移。超出阈值时以返回码 1 退出；
+# 缺少样本 / 模型 / 参考，或样本与参考记录的文件不一致时以返回码 2 退出，不会自动记录参考。
+# 只有确认当前代码的 fp32 结果正确后才用 --record 重新记录，并把 reference_fp32.npz 一起提交。
+#
+#   python tools/precision_check.py --precision bf16 fp16
+#   python tools/precision_check.py --record
+
+MODELS = {
+    "body": ("hmr2a_r50_773975.pth", "load_hmr2_model", "pred_smpl_params", "body_pose"),
+    "hands": ("hamer_v1a.pth", "load_hamer_model", "pred_mano_params", "hand_pose"),
+}
+
+def load_crops(ln, paths, device):
+    crops = []
+    for p in paths:
+        img = torch.from_numpy(np.asarray(Image.open(p).convert("RGB"), dtype=np.float32) / 255.0)[None]
+        frames = ln.frames_to_device(img, device)
+        crops.append(ln.crop_and_normalize(frames, [0], [ln.square_box(None, img.shape[2], img.shape[1])]))
+    return torch.cat(crops)
+
+def run_model(ln, model, crops, params_key, pose_key, autocast_dtype, batch_size):
+    # 返回 (根节点+关节旋转矩阵 (N, J, 3, 3), 2D 关键点 (N, K, 2), 每张耗时 ms)
+    def forward(start):
+        out = model(ln.model_inputs(crops[start:start + batch_size], autocast_dtype))
+        params = out[params_key]
+        return torch.cat([params['global_orient'], params[pose_key]], dim=1), out['pred_keypoints_2d']
+    def sync():
+        if crops.device.type == "cuda": torch.cuda.synchronize(crops.device)
+    rotmats, kps = [], []
+    with torch.no_grad():
+        forward(0); sync()  # 预热一次，不计时
+        t0 = time.perf_counter()
+        for start in range(0, len(crops), batch_size):
+            r, k = forward(start)
+            rotmats.append(r.float().cpu()); kps.append(k.float().cpu())
+        sync()
+    ms = (time.perf_counter() - t0) * 1000 / len(crops)
+    return torch.cat(rotmats).numpy(), torch.cat(kps).numpy(), ms
+
+def sample_digest(paths):
+    # 样本文件名 + 内容哈希，参考结果只对记录时的那组样本有效
+    return np.array([f"{os.path.basename(p)}:{hashlib.sha256(open(p, 'rb').read()).hexdigest()}" for p in paths])
+
+def abort(msg):
+    print(f"ERROR: {msg}"); sys.exit(2)
+
+def rotation_error_deg(a, b):
+    # 测地距离：angle = arccos((trace(Ra^T Rb) - 1) / 2)
+    rel = np.einsum('...ji,...jk->...ik', a, b)
+    cos = np.clip((np.trace(rel, axis1=-2, axis2=-1) - 1) / 2, -1.0, 1.0)
+    return np.degrees(np.arccos(cos))
+
+def main():
+    parser = argparse.ArgumentParser(description="比较 bf16/fp16 与 fp32 的推理结果 (HMR2 + HaMeR)")
+    parser.add_argument("--samples", default=os.path.join(REPO_DIR, "tools", "precision_samples"))
+    parser.add_argument("--precision", nargs="+", default=["bf16", "fp16"], choices=["bf16", "fp16"])
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--record", action="store_true", help="用当前代码重新记录 fp32 参考结果 (记录后需提交)")
+    parser.add_argument("--max-deg", type=float, default=2.0, help="允许的平均关节旋转误差 (度)")
+    parser.add_argument("--max-px", type=float, default=2.0, help="允许的平均 2D 关键点误差 (256 像素裁剪)")
+    args = parser.parse_args()
+
+    ref_path = os.path.join(args.samples, "reference_fp32.npz")
+    if not os.path.exists(ref_path) and not args.record:
+        abort(f"没有 fp32 参考结果: {ref_path}\n  参考结果需随样本集提交；确认当前代码的 fp32 输出正确后，用 --record 记录并提交。")
+    reference = {} if args.record else dict(np.load(ref_path))
+    samples = {name: list_images(os.path.join(args.samples, name)) for name in MODELS}
+    for name, paths in samples.items():
+        if not paths: abort(f"[{name}] 样本集为空: {os.path.join(args.samples, name)}")
+        if not args.record and f"{name}_files" not in reference: abort(f"[{name}] 参考结果里没有这组样本，需要 --record 重新记录")
+        if not args.record and not np.array_equal(reference[f"{name}_files"], sample_digest(paths)):
+            abort(f"[{name}] 样本文件与参考结果记录的不一致 (增删或改动过样本)，需要 --record 重新记录")
+
+    ln = load_module()
+    device = torch.device(args.device) if args.device else ln.default_device()
+    ckpts = {name: ln.get_model_path(ckpt, "") for name, (ckpt, *_) in MODELS.items()}
+    for name, path in ckpts.items():
+        if path is None: abort(f"[{name}] 模型不存在: {MODELS[name][0]}")
+    failed = False
+    for name, (_, loader_name, params_key, pose_key) in MODELS.items():
+        paths = samples[name]
+        model = getattr(ln, loader_name)(ckpts[name], device)
+        crops = load_crops(ln, paths, device)
+
+        if args.record:
+            rot, kps, _ = run_model(ln, model, crops, params_key, pose_key, None, args.batch_size)
+            reference.update({f"{name}_rotmats": rot, f"{name}_kps2d": kps, f"{name}_files": sample_digest(paths)})
+            np.savez(ref_path, **reference)
+            print(f"[{name}] 已记录 fp32 参考结果: {ref_path} (请提交)")
+
+        print(f"[{name}] {len(paths)} 张样本, device={device}")
+        base_ms = None
+        for precision in ["fp32"] + args.precision:
+            dtype = ln.resolve_precision(precision, device)
+            rot, kps, ms = run_model(ln, model, crops, params_key, pose_key, dtype, args.batch_size)
+            base_ms = base_ms or ms
+            deg = rotation_error_deg(reference[f"{name}_rotmats"], rot)
+            px = np.linalg.norm(reference[f"{name}_kps2d"] - kps, axis=-1) * ln.CROP_SIZE
+            ok = deg.mean() <= args.max_deg and px.mean() <= args.max_px
+            failed |= not ok
+            label = precision if dtype is ln.PRECISIONS[precision] else f"{precision}->{str(dtype).replace('torch.', '')}"
+            print(f"  {label:14s} {ms:8.2f} ms/张 ({base_ms / ms:4.2f}x)  旋转误差 平均 {deg.mean():.3f}° 最大 {deg.max():.3f}°"
+                  f"  2D 误差 平均 {px.mean():.3f}px 最大 {px.max():.3f}px  {'OK' if ok else 'FAIL'}")
+        del model, crops
+        if device.type == "cuda": torch.cuda.empty_cache()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import io
+import os
+import sys
+import json
+import argparse
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _laoli import REPO_DIR, load_module, list_images
+from precision_check import load_crops, run_model, rotation_error_deg
+
+# HaMeR ViT-H 主干的 int8 静态量化：用一小组手部裁剪校准激活范围，把量化结果按 checkpoint 哈希缓存到
+# models/cache (节点 cpu_backend = torch-int8 时读取)，并在同一组样本上对比 fp32 与 int8 的
+# 延迟、主干权重大小、关键点指标 (EvaluatorPCK) 与关节旋转误差。
+# 样本目录与 precision_check 共用 (tools/precision_samples/hands)。精度验收需要真值标注
+# <samples>/hands/keypoints.json ({文件名: [[x, y, conf] * 21]}，原图像素坐标)，仓库不附带，需自行准备：
+#   有标注时指标为 PCK，PCK@0.1 比 fp32 下降不超过 --max-drop 才写入缓存；
+#   没有标注时只能以 fp32 的预测为参照，指标是与 fp32 的一致率 (AGR，不代表精度)，
+#   默认不写入缓存，加 --allow-no-gt 才按 AGR@0.1 >= 1 - --max-drop 写入。
+#
+#   python tools/quantize_hamer.py --calib 32 --threads 8
+
+THRESHOLDS = [0.05, 0.1, 0.2]
+
+def weights_mb(module):
+    buf = io.BytesIO()
+    torch.save(module.state_dict(), buf)
+    return buf.tell() / (1 << 20)
+
+def keypoint_batch(ln, paths, gt):
+    # EvaluatorPCK 需要的框信息：与 load_crops 相同的整图裁剪；阈值按裁剪边长计算
+    boxes = [ln.square_box(None, *Image.open(p).size) for p in paths]
+    batch = {
+        "right": torch.ones(len(paths)),
+        "box_center": torch.tensor([[cx, cy] for cx, cy, _ in boxes], dtype=torch.float32),
+        "box_size": torch.tensor([side for _, _, side in boxes], dtype=torch.float32),
+        "bbox_expand_factor": torch.ones(len(paths)),
+    }
+    if gt is not None:
+        batch["orig_keypoints_2d"] = torch.tensor([gt[os.path.basename(p)] for p in paths], dtype=torch.float32)
+    return batch
+
+def pck(evaluator_cls, kps, batch):
+    evaluator = evaluator_cls(thresholds=THRESHOLDS)
+    evaluator({"pred_keypoints_2d": torch.from_numpy(kps).clone()}, batch)
+    metrics = evaluator.get_metrics_dict()
+    return [metrics[f"kpAvg_pck_{thr}"] for thr in THRESHOLDS]
+
+def main():
+    parser = argparse.ArgumentParser(description="HaMeR ViT-H 主干 int8 量化校准与评估 (CPU)")
+    parser.add_argument("--samples", default=os.path.join(REPO_DIR, "tools", "precision_samples"))
+    parser.add_argument("--calib", type=int, default=32, help="用于校准的样本数 (取前 N 张)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op 线程数，0 = 默认")
+    parser.add_argument("--max-drop", type=float, default=0.02, help="允许的 PCK@0.1 下降 (无标注时为 AGR@0.1 与 1 的差)")
+    parser.add_argument("--allow-no-gt", action="store_true", help="没有 keypoints.json 时也写入缓存 (只检查与 fp32 的一致率)")
+    parser.add_argument("--no-save", action="store_true", help="只评估，不写入量化缓存")
+    args = parser.parse_args()
+
+    if args.threads > 0: torch.set_num_threads(args.threads)
+    ln = load_module()
+    lq = load_module("laoli_quant")
+    # hamer.utils 会连带导入 renderer (pyrender / OpenGL)；laoli_node 只在加载模型时才 mock，这里要先 mock 再导入
+    ln.mock_render_modules()
+    from hamer.utils.pose_utils import EvaluatorPCK
+
+    folder = os.path.join(args.samples, "hands")
+    paths = list_images(folder)
+    if not paths:
+        print(f"没有样本: {folder} (见 tools/precision_samples/README.md)"); sys.exit(1)
+    path = ln.get_model_path("hamer_v1a.pth", "")
+    if path is None:
+        print("模型不存在: hamer_v1a.pth"); sys.exit(1)
+    device = torch.device("cpu")
+    model = ln.load_hamer_model(path, device)
+    if not hasattr(model, "cache_digest"):
+        print("HaMeR 未能以推理模型加载，无法缓存量化结果"); sys.exit(1)
+
+    gt_path = os.path.join(folder, "keypoints.json")
+    gt = None
+    if os.path.exists(gt_path):
+        with open(gt_path, "r", encoding="utf-8") as f: gt = json.load(f)
+    crops = load_crops(ln, paths, device)
+    batch = keypoint_batch(ln, paths, gt)
+    calib = crops[:args.calib]
+    metric = "PCK" if gt is not None else "AGR"
+    print(f"[hands] {len(paths)} 张样本 (校准 {len(calib)} 张), engine={lq.quant_engine()}, threads={torch.get_num_threads()}, "
+          f"{'PCK 以 keypoints.json 为真值' if gt is not None else '没有 keypoints.json：AGR 为与 fp32 预测的一致率，不代表精度'}")
+
+    ref_rot, ref_kps, base_ms = run_model(ln, model, crops, "pred_mano_params", "hand_pose", None, args.batch_size)
+    base_mb = weights_mb(model.backbone)
+    if gt is None:
+        # 没有标注时以 fp32 的预测作参照 (置信度 1)，得到的是一致率，fp32 自身恒为 1
+        batch["orig_keypoints_2d"] = torch.cat([torch.from_numpy(ref_kps) * batch["box_size"][:, None, None] + batch["box_center"][:, None], torch.ones(len(paths), ref_kps.shape[1], 1)], dim=-1)
+    base_pck = pck(EvaluatorPCK, ref_kps, batch)
+
+    # 原地量化，避免同时保留两份 ViT-H
+    lq.quantize_backbone(model.backbone, calib.split(args.batch_size))
+    rot, kps, ms = run_model(ln, model, crops, "pred_mano_params", "hand_pose", None, args.batch_size)
+    q_mb = weights_mb(model.backbone)
+    q_pck = pck(EvaluatorPCK, kps, batch)
+    deg = rotation_error_deg(ref_rot, rot)
+
+    header = "  ".join(f"{metric}@{thr}" for thr in THRESHOLDS)
+    print(f"  {'':5s} {'ms/张':>9s} {'主干MB':>8s}  {header}")
+    print(f"  {'fp32':5s} {base_ms:9.2f} {base_mb:8.1f}  " + "  ".join(f"{v:8.4f}" for v in base_pck))
+    print(f"  {'int8':5s} {ms:9.2f} {q_mb:8.1f}  " + "  ".join(f"{v:8.4f}" for v in q_pck))
+    print(f"  {'Δ':5s} {base_ms / ms:8.2f}x {q_mb / base_mb:7.2f}x  " + "  ".join(f"{q - b:+8.4f}" for q, b in zip(q_pck, base_pck)))
+    print(f"  量化 Linear {len(model.backbone.blocks) * len(lq.QUANT_TARGETS)} 层；关节旋转误差 平均 {deg.mean():.3f}° 最大 {deg.max():.3f}°")
+
+    drop = base_pck[THRESHOLDS.index(0.1)] - q_pck[THRESHOLDS.index(0.1)]
+    if drop > args.max_drop:
+        print(f"  FAIL: {metric}@0.1 下降 {drop:.4f} > {args.max_drop}，未写入缓存"); sys.exit(1)
+    if gt is None and not args.allow_no_gt:
+        print("  没有 keypoints.json 真值，无法验收 int8 精度，未写入缓存 (确需使用时加 --allow-no-gt，只保证与 fp32 的一致率)"); sys.exit(1)
+    if not args.no_save:
+        print(f"  已保存量化缓存: {lq.save_quantized(model)}")
+
+if __name__ == "__main__":
+    main()